@@ -1,7 +1,16 @@
 import React from 'react'
 import ReactDOM from 'react-dom/client'
+import axios from 'axios'
 import App from './App.jsx'
 
+// After a write the server names a window in which reads must go to the primary
+// database; echo it, since cross-origin requests don't send the server's cookie.
+axios.interceptors.response.use(response => {
+  const until = response.headers['read-primary-until']
+  if (until) axios.defaults.headers.common['Read-Primary-Until'] = until
+  return response
+})
+
 ReactDOM.createRoot(document.getElementById('root')).render(
   <React.StrictMode>
     <App />
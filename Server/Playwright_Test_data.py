@@ -1,6 +1,8 @@
+import random
 import time
 import psycopg2
-from psycopg2.extras import RealDictCursor
+
+import book_queries
 
 db_config = {
     'host': 'localhost',
@@ -16,42 +18,232 @@ sample_books = [
     ("To Kill a Mockingbird", "J.B. Lippincott & Co.", "1960-07-11", 12.5)
 ]
 
-# Retry until DB is ready (GitHub Actions sometimes start PostgreSQL slowly)
-max_retries = 10
-for attempt in range(max_retries):
-    try:
-        conn = psycopg2.connect(**db_config)
-        break
-    except Exception as e:
-        print(f"Database not ready, retrying... ({attempt+1}/{max_retries})")
-        time.sleep(5)
-else:
+
+def connect_with_retry(config=db_config, max_retries=10, delay=0.5, max_delay=30):
+    # Retry until DB is ready (GitHub Actions sometimes start PostgreSQL slowly).
+    # Waits grow exponentially from `delay` up to `max_delay`, with jitter so
+    # parallel loaders do not reconnect in lockstep.
+    for attempt in range(max_retries):
+        try:
+            return psycopg2.connect(**config)
+        except psycopg2.OperationalError:
+            if attempt == max_retries - 1:
+                break
+            wait = min(max_delay, delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"Database not ready, retrying in {wait:.1f}s... ({attempt+1}/{max_retries})")
+            time.sleep(wait)
     raise Exception("Database connection failed after retries")
 
-cur = conn.cursor(cursor_factory=RealDictCursor)
-
-# Create table if not exists
-cur.execute("""
-    CREATE TABLE IF NOT EXISTS book (
-        id SERIAL PRIMARY KEY,
-        name TEXT NOT NULL,
-        publisher TEXT NOT NULL,
-        date DATE NOT NULL,
-        cost NUMERIC NOT NULL
-    )
-""")
-
-# Insert sample books
-for book in sample_books:
-    cur.execute("""
-        INSERT INTO book (name, publisher, date, cost)
-        SELECT %s, %s, %s, %s
-        WHERE NOT EXISTS (
-            SELECT 1 FROM book WHERE name=%s AND publisher=%s
+
+def create_schema(cur):
+    # Create table if not exists
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS book (
+            id SERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            publisher TEXT NOT NULL,
+            date DATE NOT NULL,
+            cost NUMERIC NOT NULL
         )
-    """, (book[0], book[1], book[2], book[3], book[0], book[1]))
+    """)
+
+    # Row version for optimistic concurrency (If-Match on PUT/PATCH /update/<id>)
+    cur.execute("ALTER TABLE book ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1")
+
+    # One row per (name, publisher): the conflict target for upserts
+    try:
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS book_name_publisher_key ON book (name, publisher)")
+    except psycopg2.errors.UniqueViolation:
+        print("Duplicate (name, publisher) rows found; remove them before creating book_name_publisher_key")
+        raise
+
+    # Responses of POST /create calls made with an Idempotency-Key header
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency_key (
+            key TEXT PRIMARY KEY,
+            request_hash TEXT NOT NULL,
+            status_code INTEGER,
+            response JSONB,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idempotency_key_created_at_idx ON idempotency_key (created_at)")
+
+    # Indexes backing keyset pagination, filtering and sorting on GET /books
+    cur.execute("CREATE INDEX IF NOT EXISTS book_publisher_id_idx ON book (publisher, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS book_date_id_idx ON book (date, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS book_cost_id_idx ON book (cost, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS book_name_id_idx ON book (name, id)")
+
+    # Full-text document for GET /search, kept up to date by Postgres on every write
+    cur.execute("""
+        ALTER TABLE book ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', name), 'A') ||
+            setweight(to_tsvector('english', publisher), 'B')
+        ) STORED
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS book_search_idx ON book USING GIN (search_vector)")
+
+    # Trigram indexes for typo-tolerant search; pg_trgm ships with contrib and may be missing
+    cur.execute("SAVEPOINT trigram")
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except psycopg2.Error:
+        cur.execute("ROLLBACK TO SAVEPOINT trigram")
+        print("pg_trgm not available, search will be full-text only")
+    else:
+        cur.execute("CREATE INDEX IF NOT EXISTS book_name_trgm_idx ON book USING GIN (name gin_trgm_ops)")
+        cur.execute("CREATE INDEX IF NOT EXISTS book_publisher_trgm_idx ON book USING GIN (publisher gin_trgm_ops)")
+        cur.execute("RELEASE SAVEPOINT trigram")
+
+    create_stats_rollup(cur)
+    create_change_log(cur)
+
+
+def create_stats_rollup(cur):
+    """
+    book_stats holds count and total cost per (publisher, year) so GET /stats
+    reads O(publishers) rows. Statement-level triggers apply each write's
+    delta in the same transaction, covering single-row and bulk writes alike.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS book_stats (
+            publisher TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            book_count BIGINT NOT NULL,
+            total_cost NUMERIC NOT NULL,
+            PRIMARY KEY (publisher, year)
+        )
+    """)
+    # Only groups emptied by the current statement are in here, so pruning them is
+    # an index scan (transition tables have no statistics to plan a join with).
+    cur.execute("CREATE INDEX IF NOT EXISTS book_stats_empty_idx ON book_stats (book_count) WHERE book_count <= 0")
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION book_stats_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE book_stats s
+                SET book_count = s.book_count - delta.book_count,
+                    total_cost = s.total_cost - delta.total_cost
+                FROM (
+                    SELECT publisher, extract(year FROM date)::int AS year,
+                           count(*) AS book_count, sum(cost) AS total_cost
+                    FROM old_rows GROUP BY 1, 2
+                ) AS delta
+                WHERE s.publisher = delta.publisher AND s.year = delta.year;
+                DELETE FROM book_stats WHERE book_count <= 0;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO book_stats AS s (publisher, year, book_count, total_cost)
+                SELECT publisher, extract(year FROM date)::int, count(*), sum(cost)
+                FROM new_rows GROUP BY 1, 2
+                ON CONFLICT (publisher, year) DO UPDATE
+                SET book_count = s.book_count + EXCLUDED.book_count,
+                    total_cost = s.total_cost + EXCLUDED.total_cost;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    for event, transition in (('INSERT', 'NEW TABLE AS new_rows'),
+                              ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+                              ('DELETE', 'OLD TABLE AS old_rows')):
+        trigger = f"book_stats_{event.lower()}"
+        cur.execute(f"DROP TRIGGER IF EXISTS {trigger} ON book")
+        cur.execute(f"""
+            CREATE TRIGGER {trigger} AFTER {event} ON book
+            REFERENCING {transition}
+            FOR EACH STATEMENT EXECUTE FUNCTION book_stats_apply()
+        """)
+    rebuild_stats_rollup(cur)
+
+
+def create_change_log(cur):
+    """
+    book_change records every write to book for GET /changes, in the writing
+    transaction, and NOTIFYs book_changes on commit for the SSE stream.
+    txid orders changes by transaction so readers can hold back those that
+    are not yet safe to serve.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS book_change (
+            seq BIGSERIAL,
+            txid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+            book_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (txid, seq)
+        )
+    """)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION book_change_log() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO book_change (book_id, op) SELECT id, 'delete' FROM old_rows ORDER BY id;
+            ELSE
+                INSERT INTO book_change (book_id, op) SELECT id, lower(TG_OP) FROM new_rows ORDER BY id;
+            END IF;
+            PERFORM pg_notify('book_changes', '');
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    for event, transition in (('INSERT', 'NEW TABLE AS new_rows'),
+                              ('UPDATE', 'NEW TABLE AS new_rows'),
+                              ('DELETE', 'OLD TABLE AS old_rows')):
+        trigger = f"book_change_{event.lower()}"
+        cur.execute(f"DROP TRIGGER IF EXISTS {trigger} ON book")
+        cur.execute(f"""
+            CREATE TRIGGER {trigger} AFTER {event} ON book
+            REFERENCING {transition}
+            FOR EACH STATEMENT EXECUTE FUNCTION book_change_log()
+        """)
+
+
+def rebuild_stats_rollup(cur):
+    # Recompute from scratch; blocks writers so no delta is lost or counted twice
+    cur.execute("LOCK TABLE book IN SHARE MODE")
+    cur.execute("DELETE FROM book_stats")
+    cur.execute("""
+        INSERT INTO book_stats (publisher, year, book_count, total_cost)
+        SELECT publisher, extract(year FROM date)::int, count(*), sum(cost)
+        FROM book GROUP BY 1, 2
+    """)
+
+
+def _by_publisher(books):
+    # Seed data is (name, publisher, ...); book_queries takes BOOK_FIELDS order.
+    return [(publisher, name, date, cost) for name, publisher, date, cost in books]
+
+
+def seed_sample_books(cur, books=sample_books, on_conflict="ignore"):
+    """
+    Insert (name, publisher, date, cost) tuples in one statement. Books whose
+    (name, publisher) already exists are skipped, or with on_conflict="update"
+    get their date and cost overwritten.
+    """
+    book_queries.insert_books(cur, _by_publisher(books), on_conflict=on_conflict)
+
+
+def insert_books(cur, books, page_size=1000):
+    """
+    Bulk-insert (name, publisher, date, cost) tuples for load-test datasets.
+    Returns the new ids; a duplicate (name, publisher) raises UniqueViolation.
+    """
+    ids = []
+    for start in range(0, len(books), page_size):
+        rows = book_queries.insert_books(cur, _by_publisher(books[start:start + page_size]))
+        ids.extend(row[0] for row in rows)
+    return ids
+
 
-conn.commit()
-cur.close()
-conn.close()
-print("Sample books added to database successfully!")
+if __name__ == '__main__':
+    conn = connect_with_retry()
+    cur = conn.cursor()
+    create_schema(cur)
+    seed_sample_books(cur)
+    conn.commit()
+    cur.close()
+    conn.close()
+    print("Sample books added to database successfully!")
@@ -1,11 +1,34 @@
 
-from flask import Flask, jsonify, request
+import base64
+import csv
+import functools
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+
+from flask import Flask, Response, jsonify, make_response, request, stream_with_context
 from flask_cors import CORS
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import DataError, IntegrityError, OperationalError
+
+import book_queries as queries
+import compression
+import metrics
+from change_feed import ChangeListener
+from db_pool import ConnectionPool, PoolTimeout
+from db_router import ReplicaRouter
+from json_provider import FastJSONProvider, fetch_dicts
+from memory_storage import MemoryStorage
+from response_cache import ResponseCache
+from storage import ConstraintViolation, InvalidValue, ListQuery, PostgresStorage
 
 app = Flask(__name__)
-CORS(app)
+app.json = FastJSONProvider(app)
 
 db_config = {
     'host': 'localhost',
@@ -14,51 +37,1089 @@ db_config = {
     'dbname': 'demo_flask'
 }
 
+# --- Connection pool ---
+# Sizes and timeouts (seconds) can be overridden per deployment via DB_POOL_* env vars.
+pool_config = {
+    'minconn': int(os.environ.get('DB_POOL_MIN', 1)),
+    'maxconn': int(os.environ.get('DB_POOL_MAX', 10)),
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+    'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+    'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+    'health_check_interval': float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 5)),
+}
+
+HEALTH_CHECK_TIMEOUT = 1.0
+
+# --- Read replicas ---
+# DB_REPLICA_HOSTS="replica1,replica2:5433" adds read replicas of db_config's
+# database. List, lookup, search, stats and export reads go to them; writes
+# and the change feed stay on the primary. After a client writes, its reads
+# go to the primary for DB_READ_YOUR_WRITES seconds so it sees its own change
+# despite replication lag. The window is set both as a cookie and as a
+# Read-Primary-Until response header; cross-origin clients, which do not send
+# cookies without credentials, echo the header on their next requests.
+def parse_replica_hosts(raw):
+    configs = []
+    for item in filter(None, (part.strip() for part in raw.split(','))):
+        host, _, port = item.partition(':')
+        configs.append(dict(db_config, host=host, **({'port': int(port)} if port else {})))
+    return configs
+
+replica_configs = parse_replica_hosts(os.environ.get('DB_REPLICA_HOSTS', ''))
+replica_config = {
+    'strategy': os.environ.get('DB_REPLICA_STRATEGY', 'least_loaded'),
+    'retry_after': float(os.environ.get('DB_REPLICA_RETRY_AFTER', 5)),
+}
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('DB_READ_YOUR_WRITES', 5))
+READ_PRIMARY_COOKIE = 'read_primary_until'
+READ_PRIMARY_HEADER = 'Read-Primary-Until'
+
+CORS(app, expose_headers=[READ_PRIMARY_HEADER])
+
+# --- Instrumentation (opt-in) ---
+# METRICS_ENABLED=1 times every request phase and serves Prometheus text at /metrics.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+
+# --- Response compression ---
+# gzip (or brotli, if installed) for bodies of at least COMPRESS_MIN_SIZE bytes.
+COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+compression_config = {
+    'min_size': int(os.environ.get('COMPRESS_MIN_SIZE', 1024)),
+    'gzip_level': int(os.environ.get('COMPRESS_GZIP_LEVEL', 6)),
+    'brotli_quality': int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4)),
+}
+
+_pool = None
+_router = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def _replace_pool():
+    # Caller holds _pool_lock.
+    global _pool, _router, _pool_pid
+    connect_options = {'cursor_factory': metrics.InstrumentedCursor} if METRICS_ENABLED else {}
+    _pool = ConnectionPool(**pool_config, **db_config, **connect_options)
+    replicas = [ConnectionPool(**pool_config, **config, **connect_options) for config in replica_configs]
+    _router = ReplicaRouter(_pool, replicas, **replica_config)
+    _pool_pid = os.getpid()
+    return _pool
+
+def init_pool(prefill=False):
+    """
+    (Re)create this process's pool, e.g. in a freshly forked worker. An
+    inherited pool is dropped without closing it: its sockets still belong
+    to the parent process.
+    """
+    with _pool_lock:
+        pool = _replace_pool()
+    if prefill:
+        pool.prefill()
+    return pool
+
+def close_pool():
+    global _pool, _router
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+            _router.closeall()
+        _pool = _router = None
+
+def get_pool():
+    pool = _pool
+    if pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            pool = _pool
+            if pool is None or _pool_pid != os.getpid():
+                pool = _replace_pool()
+    return pool
+
+def get_router():
+    get_pool()
+    return _router
+
 def get_db_connection():
-    connection = psycopg2.connect(**db_config)
-    return connection
+    # Pooled connection: close() hands it back to the pool instead of disconnecting.
+    if not METRICS_ENABLED:
+        return get_pool().getconn()
+    started = time.perf_counter()
+    try:
+        return get_pool().getconn()
+    finally:
+        metrics.record_phase('connect', time.perf_counter() - started)
+
+def reads_from_primary():
+    """True while the client is inside its read-your-writes window."""
+    raw = request.headers.get(READ_PRIMARY_HEADER) or request.cookies.get(READ_PRIMARY_COOKIE)
+    try:
+        until = float(raw or 0)
+    except ValueError:
+        return False
+    # A value further out than one window was not set by us; don't pin on it.
+    now = time.time()
+    return now < until <= now + READ_YOUR_WRITES_SECONDS
+
+def get_read_connection():
+    """Connection for read-only queries: a replica unless the client just wrote."""
+    router = get_router()
+    if not router.replicas:
+        return get_db_connection()
+    if not METRICS_ENABLED:
+        return router.getconn(primary=reads_from_primary())
+    started = time.perf_counter()
+    try:
+        return router.getconn(primary=reads_from_primary())
+    finally:
+        metrics.record_phase('connect', time.perf_counter() - started)
+
+# --- Storage backend ---
+# The book routes go through a storage session (storage.py). STORAGE_BACKEND=memory
+# serves them from an in-process engine instead of Postgres, for CI, demos and
+# as a load-test stand-in; it is per process, so run a single worker. Search,
+# the change feed and pool stats need Postgres and answer 501 there.
+STORAGE_BACKENDS = ('postgres', 'memory')
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'postgres').lower()
+
+def create_storage(backend):
+    if backend == 'memory':
+        return MemoryStorage()
+    if backend == 'postgres':
+        # Resolved per call, so a replaced get_db_connection is picked up.
+        return PostgresStorage(lambda: get_db_connection(), lambda: get_read_connection())
+    raise ValueError(f"Invalid STORAGE_BACKEND. Use one of: {', '.join(STORAGE_BACKENDS)}.")
+
+storage = create_storage(STORAGE_BACKEND)
+
+def requires_postgres(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if storage.name != 'postgres':
+            return jsonify({"error": f"Not available with the {storage.name} storage backend"}), 501
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.after_request
+def pin_reads_after_write(response):
+    if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and get_router().replicas:
+        until = f"{time.time() + READ_YOUR_WRITES_SECONDS:.3f}"
+        response.set_cookie(READ_PRIMARY_COOKIE, until, max_age=math.ceil(READ_YOUR_WRITES_SECONDS),
+                            httponly=True, samesite='Lax')
+        response.headers[READ_PRIMARY_HEADER] = until
+    return response
+
+@app.errorhandler(OperationalError)
+def database_unavailable(e):
+    # Covers both an unreachable database and pool exhaustion (PoolTimeout).
+    return jsonify({"error": "Database unavailable", "details": str(e)}), 503
+
+@app.errorhandler(IntegrityError)
+@app.errorhandler(ConstraintViolation)
+def constraint_violation(e):
+    return jsonify({"error": "Constraint violation", "details": str(e)}), 400
+
+@app.errorhandler(DataError)
+@app.errorhandler(InvalidValue)
+def invalid_data(e):
+    # e.g. a value that does not fit its column; the whole transaction is rolled back.
+    return jsonify({"error": "Invalid data type or value", "details": str(e)}), 400
+
+@app.errorhandler(404)
+def not_found(e):
+    return jsonify({"error": "Resource not found"}), 404
+
+# --- Response cache ---
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 256)),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', 30)),
+)
+
+def cached_response(view):
+    """
+    Serve a GET view from response_cache, answering If-None-Match /
+    If-Modified-Since with 304 without touching the database. An ETag set
+    by the view is kept; otherwise one is derived from the body.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.full_path
+        # A replica-filled entry may predate the client's own write.
+        pinned = reads_from_primary()
+        entry = None if pinned else response_cache.get(key)
+        if entry is None:
+            generation = response_cache.generation
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            etag, _ = response.get_etag()
+            # Shortly after a write a replica may not have it yet; such a body
+            # is served but not cached, or it would outlive the writer's window.
+            store = (pinned or time.time() - response_cache.invalidated_at >= READ_YOUR_WRITES_SECONDS
+                     or not get_router().replicas)
+            entry = response_cache.set(key, response.get_data(), response.mimetype, generation, etag, store=store)
+        response = Response(entry.body, mimetype=entry.mimetype)
+        response.encoded = entry.encoded
+        response.set_etag(entry.etag)
+        response.last_modified = entry.last_modified
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    return wrapper
+
+def invalidates_cache(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            return view(*args, **kwargs)
+        finally:
+            response_cache.invalidate()
+    return wrapper
+
+# --- Validation Helper ---
+BOOK_FIELDS = queries.BOOK_FIELDS
+BOOK_COLUMNS = queries.BOOK_COLUMNS
+
+DATE_FORMAT = "%Y-%m-%d"
+
+def parse_date(value):
+    """A book date as validate_book_data() accepts it (also e.g. 2025-1-1)."""
+    return datetime.strptime(value, DATE_FORMAT).date()
+
+def validate_book_data(data, partial=False):
+    """
+    Return an error message for a book payload, or None. With partial=True
+    (PATCH) fields may be omitted but at least one must be present.
+    """
+    if not data:
+        return "Missing request body"
+    if not isinstance(data, dict):
+        return "Book must be a JSON object"
+    if partial:
+        if not any(field in data for field in BOOK_FIELDS):
+            return f"No fields to update. Use any of: {', '.join(BOOK_FIELDS)}."
+    else:
+        for field in BOOK_FIELDS:
+            if field not in data:
+                return f"Missing field: {field}"
+    for field in ('publisher', 'name'):
+        # Numbers are stored as their text; lists and objects cannot be.
+        if isinstance(data.get(field), (dict, list)):
+            return f"Invalid {field}. Must be a string."
+    if 'date' in data:
+        try:
+            parse_date(data['date'])
+        except (ValueError, TypeError):
+            return "Invalid date format. Use YYYY-MM-DD."
+    if 'cost' in data:
+        # float() takes True, "nan" and "inf"; numeric would store NaN/Infinity
+        # and carry them into the stats rollup, and a boolean fails in SQL.
+        try:
+            valid = not isinstance(data['cost'], bool) and math.isfinite(float(data['cost']))
+        except (ValueError, TypeError):
+            valid = False
+        if not valid:
+            return "Invalid cost. Must be a numeric value."
+    return None
+
+def parse_ids(raw):
+    try:
+        ids = [int(part) for part in raw.split(',') if part.strip()]
+    except ValueError:
+        raise ValueError("Invalid ids. Use a comma-separated list of integers.")
+    if not ids:
+        raise ValueError("Invalid ids. Use a comma-separated list of integers.")
+    if len(ids) > MAX_PAGE_SIZE:
+        raise ValueError(f"Too many ids. Maximum is {MAX_PAGE_SIZE}.")
+    return ids
+
+# --- Listing helpers ---
+# Sortable columns; each has a (column, id) index so keyset pages are index range scans.
+SORT_COLUMNS = ('id', 'name', 'publisher', 'date', 'cost')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(sort, order, row):
+    value = row[sort]
+    if isinstance(value, date):
+        value = value.isoformat()
+    elif value is not None and not isinstance(value, (int, str)):
+        value = str(value)
+    raw = json.dumps([sort, order, value, row['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, sort, order):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, cursor_order, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if (cursor_sort, cursor_order) != (sort, order) or not isinstance(last_id, int):
+        raise ValueError("Cursor does not match the requested sort order")
+    # encode_cursor writes ids as numbers and every other sort value as a
+    # string; anything else (a list, an object) would reach SQL as a parameter.
+    expected = int if sort == 'id' else str
+    if not isinstance(value, expected) or isinstance(value, bool) or isinstance(last_id, bool):
+        raise ValueError("Invalid cursor")
+    return value, last_id
+
+def parse_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("Invalid limit. Must be an integer.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"Invalid limit. Must be between 1 and {MAX_PAGE_SIZE}.")
+    return limit
+
+def parse_fields(args):
+    """
+    fields=name,cost -> the requested columns in table order, or None for
+    all of them.
+    """
+    if 'fields' not in args:
+        return None
+    fields = {field.strip() for field in args['fields'].split(',') if field.strip()}
+    unknown = fields.difference(queries.COLUMNS)
+    if not fields or unknown:
+        raise ValueError(f"Invalid fields. Use any of: {', '.join(queries.COLUMNS)}.")
+    return tuple(column for column in queries.COLUMNS if column in fields)
+
+def project(rows, fields):
+    # Drop columns that were only selected for ordering or the cursor.
+    return [{field: row[field] for field in fields} for row in rows]
+
+def parse_list_query(args):
+    """
+    Turn /books query parameters into a ListQuery.
+    Raises ValueError with a client-facing message on bad input.
+    """
+    limit = parse_limit(args)
+    fields = parse_fields(args)
+    sort = args.get('sort', 'id')
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Invalid sort. Use one of: {', '.join(SORT_COLUMNS)}.")
+    order = args.get('order', 'asc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("Invalid order. Use asc or desc.")
+
+    filters = {}
+    for arg in ('date_from', 'date_to'):
+        if arg in args:
+            try:
+                filters[arg] = date.fromisoformat(args[arg])
+            except ValueError:
+                raise ValueError(f"Invalid {arg}. Use YYYY-MM-DD.")
+    for arg in ('cost_min', 'cost_max'):
+        if arg in args:
+            try:
+                filters[arg] = float(args[arg])
+            except ValueError:
+                raise ValueError(f"Invalid {arg}. Must be a numeric value.")
+    after = decode_cursor(args['after'], sort, order) if args.get('after') else None
+    return ListQuery(limit, sort, order, fields, args.getlist('publisher'), after=after, **filters)
 
 @app.route('/', methods=['GET'])
+@cached_response
 def get_books():
-    connection = get_db_connection()
-    cursor = connection.cursor(cursor_factory=RealDictCursor)
-    cursor.execute("SELECT * FROM book")
-    result = cursor.fetchall()
-    cursor.close()
-    connection.close()
+    """Every book. fields=name,cost limits the columns returned."""
+    try:
+        fields = parse_fields(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with storage.read() as books:
+        result = books.all_books(fields)
     return jsonify(result)
 
+@app.route('/books', methods=['GET'])
+@cached_response
+def list_books():
+    """
+    Keyset-paginated listing.
+    Query params: limit, after (next_cursor from the previous page), sort, order,
+    publisher (repeatable), date_from, date_to, cost_min, cost_max, fields.
+    With ids=1,2,3 it instead returns exactly those books in one query.
+    """
+    if 'ids' in request.args:
+        return get_books_by_ids(request.args['ids'])
+    try:
+        query = parse_list_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with storage.read() as books:
+        rows = books.list_books(query)
+
+    next_cursor = None
+    if len(rows) > query.limit:
+        rows = rows[:query.limit]
+        next_cursor = encode_cursor(query.sort, query.order, rows[-1])
+    if query.fields is not None:
+        rows = project(rows, query.fields)
+    return jsonify({"data": rows, "next_cursor": next_cursor, "limit": query.limit})
+
+def get_books_by_ids(raw_ids):
+    try:
+        ids = parse_ids(raw_ids)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with storage.read() as books:
+        found = {row['id']: row for row in books.get_books(ids)}
+
+    # Keep the caller's order; report ids that do not exist instead of failing.
+    return jsonify({
+        "data": [found[book_id] for book_id in dict.fromkeys(ids) if book_id in found],
+        "missing": [book_id for book_id in dict.fromkeys(ids) if book_id not in found],
+    })
+
+@app.route(f'/book/<int(max={queries.MAX_BOOK_ID}):id>', methods=['GET'])
+@cached_response
+def get_book(id):
+    with storage.read() as books:
+        book = books.get_book(id)
+    if book is None:
+        return jsonify({"error": "Book not found"}), 404
+    response = jsonify(book)
+    response.set_etag(str(book['version']))
+    return response
+
+# --- Search ---
+# search_vector is a stored generated column (name weighted A, publisher B)
+# indexed by book_search_idx; see Playwright_Test_data.create_schema.
+MAX_QUERY_LENGTH = 200
+
+_trigram_available = None
+
+def trigram_available(connection):
+    """pg_trgm is optional; without it search is full-text only."""
+    global _trigram_available
+    if _trigram_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available = cursor.fetchone() is not None
+    return _trigram_available
+
+def build_search_query(args, trigram):
+    """
+    Turn /search query parameters into (sql, params, limit).
+    Results are ordered by rank, then id, both descending.
+    """
+    q = args.get('q', '').strip()
+    if not q:
+        raise ValueError("Missing search query. Use ?q=.")
+    if len(q) > MAX_QUERY_LENGTH:
+        raise ValueError(f"Search query too long. Maximum is {MAX_QUERY_LENGTH} characters.")
+    limit = parse_limit(args)
+
+    if trigram:
+        # Typo tolerance: trigram matches (pg_trgm.similarity_threshold) on either column.
+        rank = "ts_rank(search_vector, query) + GREATEST(similarity(name, %s), similarity(publisher, %s))"
+        match = "search_vector @@ query OR name %% %s OR publisher %% %s"
+        params = [q] * 5     # similarity x2, websearch_to_tsquery, % x2
+    else:
+        rank = "ts_rank(search_vector, query)"
+        match = "search_vector @@ query"
+        params = [q]
+    sql = (f"SELECT * FROM (SELECT {BOOK_COLUMNS}, {rank} AS rank "
+           f"FROM book, websearch_to_tsquery('english', %s) AS query WHERE {match}) AS hits")
+
+    if args.get('after'):
+        value, last_id = decode_cursor(args['after'], 'rank', 'desc')
+        sql += " WHERE (rank, id) < (%s::real, %s)"
+        params.extend([value, last_id])
+    sql += " ORDER BY rank DESC, id DESC LIMIT %s"
+    params.append(limit + 1)
+    return sql, params, limit
+
+@app.route('/search', methods=['GET'])
+@requires_postgres
+@cached_response
+def search_books():
+    """
+    Ranked search over name and publisher.
+    Query params: q (web-search syntax: words, "phrases", -exclusions), limit, after.
+    """
+    connection = get_read_connection()
+    try:
+        try:
+            sql, params, limit = build_search_query(request.args, trigram_available(connection))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = fetch_dicts(cursor)
+    finally:
+        connection.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor('rank', 'desc', rows[-1])
+    return jsonify({"data": rows, "next_cursor": next_cursor, "limit": limit})
+
+# --- Statistics ---
+# Postgres serves these from the book_stats rollup, the memory backend from
+# its own; either way O(publishers x years), not O(books).
+
+@app.route('/stats', methods=['GET'])
+@cached_response
+def get_stats():
+    """Catalog totals: books, publishers, total and average cost, year range."""
+    with storage.read() as books:
+        return jsonify(books.stats())
+
+@app.route('/stats/publishers', methods=['GET'])
+@cached_response
+def get_publisher_stats():
+    """Book count and average cost per publisher, largest first."""
+    with storage.read() as books:
+        return jsonify(books.publisher_stats())
+
+@app.route('/stats/yearly', methods=['GET'])
+@cached_response
+def get_yearly_stats():
+    """Books per publisher per year. Query params: publisher (repeatable)."""
+    with storage.read() as books:
+        return jsonify(books.yearly_stats(request.args.getlist('publisher')))
+
+# --- Streaming export ---
+EXPORT_BATCH_SIZE = 2000
+EXPORT_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+def generate_export(batches, fmt):
+    # Batches of row tuples come from storage.export(), e.g. one FETCH of a
+    # server-side cursor each, so memory stays flat whatever the table size.
+    if fmt == 'json':
+        yield '['
+    first = True
+    for rows in batches:
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if first:
+                writer.writerow(queries.COLUMNS)
+            writer.writerows(rows)
+            chunk = buffer.getvalue()
+        elif fmt == 'ndjson':
+            chunk = ''.join(app.json.dumps(dict(zip(queries.COLUMNS, row))) + '\n' for row in rows)
+        else:
+            chunk = ','.join(app.json.dumps(dict(zip(queries.COLUMNS, row))) for row in rows)
+            if not first:
+                chunk = ',' + chunk
+        first = False
+        yield chunk
+    if fmt == 'json':
+        yield ']'
+
+@app.route('/export', methods=['GET'])
+def export_books():
+    """
+    Stream the whole book table. Query param format: json (default), ndjson or csv.
+    """
+    fmt = request.args.get('format', 'json').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}."}), 400
+
+    batches = storage.export(EXPORT_BATCH_SIZE)
+    response = Response(
+        stream_with_context(generate_export(batches, fmt)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=books.{fmt}'},
+    )
+    # Releases the connection also for a client that disconnects before the stream starts.
+    response.call_on_close(batches.close)
+    return response
+
+# --- Upsert and idempotency ---
+# (name, publisher) is unique (book_name_publisher_key). /create?on_conflict= picks
+# what a duplicate does: error -> 409, ignore -> return the existing book,
+# update -> overwrite its date and cost.
+CONFLICT_MODES = ('error', 'ignore', 'update')
+# Retried POSTs carrying the same Idempotency-Key replay the stored response. Keys
+# are kept by the storage backend (in Postgres every worker process sees them)
+# and expire after the TTL.
+IDEMPOTENCY_KEY_TTL = float(os.environ.get('IDEMPOTENCY_KEY_TTL', 86400))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+def create_book(books, book, on_conflict):
+    """Insert one validated book; returns (status_code, body)."""
+    return create_response(*books.insert_book(book, on_conflict), on_conflict)
+
+def create_response(row, created, on_conflict):
+    """(status_code, body) for the row an insert wrote or found."""
+    if created:
+        return 201, {"message": "Book created successfully", "data": row}
+    if on_conflict == 'update':
+        return 200, {"message": "Book updated successfully", "data": row}
+    if on_conflict == 'ignore':
+        return 200, {"message": "Book already exists", "data": row}
+    return 409, {"error": "Book already exists", "data": row}
+
+def claim_idempotency_key(books, key, fingerprint):
+    """
+    Reserve key for this request inside the current write session. Returns
+    None when the caller should do the work, else the stored (status_code, body).
+    """
+    return replay_response(books.claim_idempotency_key(key, fingerprint, IDEMPOTENCY_KEY_TTL), fingerprint)
+
+def request_fingerprint(book, on_conflict):
+    return hashlib.sha256(json.dumps([book, on_conflict], sort_keys=True).encode()).hexdigest()
+
+def idempotency_key_error(key):
+    if key is not None and not 0 < len(key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+        return f"Idempotency-Key must be 1-{MAX_IDEMPOTENCY_KEY_LENGTH} characters."
+    return None
+
+def replay_response(stored, fingerprint):
+    """None for a freshly claimed key, else what to answer: 422 or the stored response."""
+    if stored is None:
+        return None
+    request_hash, status_code, body = stored
+    if request_hash != fingerprint:
+        return 422, {"error": "Idempotency-Key was already used with a different request"}
+    return status_code, body
+
 @app.route('/create', methods=['POST'])
+@invalidates_cache
 def create_books():
-    new_book = request.get_json()
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    cursor.execute("INSERT INTO book (publisher, name, date, cost) VALUES (%s, %s, %s, %s)", (new_book['publisher'], new_book['name'], new_book['date'],new_book['cost']))
-    connection.commit()
-    cursor.close()
-    connection.close()
-    return jsonify(new_book), 201
-
-@app.route('/update/<int:id>', methods=['PUT'])
+    """
+    Create one book. Query params: on_conflict (error | ignore | update).
+    Headers: Idempotency-Key makes retries return the first response.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+    new_book = request.get_json(silent=True)
+    validation_error = validate_book_data(new_book)
+    if validation_error:
+        return jsonify({"error": validation_error}), 400
+    on_conflict = request.args.get('on_conflict', 'error')
+    if on_conflict not in CONFLICT_MODES:
+        return jsonify({"error": f"Invalid on_conflict. Use one of: {', '.join(CONFLICT_MODES)}."}), 400
+    key = request.headers.get('Idempotency-Key')
+    key_error = idempotency_key_error(key)
+    if key_error:
+        return jsonify({"error": key_error}), 400
+
+    with storage.write() as books:
+        replay = None
+        if key is not None:
+            fingerprint = request_fingerprint(new_book, on_conflict)
+            replay = claim_idempotency_key(books, key, fingerprint)
+        if replay is None:
+            status_code, body = create_book(books, new_book, on_conflict)
+            if key is not None:
+                books.store_idempotent_response(key, status_code, body)
+        else:
+            status_code, body = replay
+    response = jsonify(body)
+    response.status_code = status_code
+    if replay is not None:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+# --- Conditional updates ---
+# Every write bumps book.version; GET /book/<id> and update responses carry it
+# as the ETag. Sending it back in If-Match makes the update conditional, so a
+# concurrent edit turns into 412 instead of being silently overwritten.
+
+def if_match_versions(req=request):
+    """
+    None when no If-Match precondition applies, else the acceptable versions.
+    ``req`` is Flask's request or, from async_app, Quart's.
+    """
+    if 'If-Match' not in req.headers or req.if_match.star_tag:
+        return None
+    return [int(tag) for tag in req.if_match.as_set() if tag.isdigit()]
+
+def write_book(id, changes):
+    """
+    Apply changes (column -> value) to book `id` in one UPDATE ... RETURNING,
+    honouring If-Match. Returns the response.
+    """
+    versions = if_match_versions()
+    with storage.write() as books:
+        book = books.update_book(id, changes, versions)
+        if book is None and versions is not None:
+            current = books.get_book(id)
+            if current is not None:
+                response = jsonify({"error": "Book was modified by another request", "data": current})
+                response.status_code = 412
+                response.set_etag(str(current['version']))
+                return response
+    if book is None:
+        return jsonify({"error": "Book not found"}), 404
+    response = jsonify({"message": "Book updated successfully", "data": book})
+    response.set_etag(str(book['version']))
+    return response
+
+@app.route(f'/update/<int(max={queries.MAX_BOOK_ID}):id>', methods=['PUT'])
+@invalidates_cache
 def update_book(id):
-    updated_book = request.get_json()
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    cursor.execute("UPDATE book SET publisher=%s, name=%s, date=%s , cost=%s WHERE id=%s", (updated_book['publisher'], updated_book['name'], updated_book['date'], updated_book['cost'],id))
-    connection.commit()
-    cursor.close()
-    connection.close()
-    return jsonify(updated_book)
-
-@app.route('/delete/<int:id>', methods=['DELETE'])
+    """Replace all fields of a book. Headers: If-Match (version ETag)."""
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+    updated_book = request.get_json(silent=True)
+    validation_error = validate_book_data(updated_book)
+    if validation_error:
+        return jsonify({"error": validation_error}), 400
+    return write_book(id, {field: updated_book[field] for field in BOOK_FIELDS})
+
+@app.route(f'/update/<int(max={queries.MAX_BOOK_ID}):id>', methods=['PATCH'])
+@invalidates_cache
+def patch_book(id):
+    """Write only the fields present in the body. Headers: If-Match (version ETag)."""
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+    changes = request.get_json(silent=True)
+    validation_error = validate_book_data(changes, partial=True)
+    if validation_error:
+        return jsonify({"error": validation_error}), 400
+    return write_book(id, {field: changes[field] for field in BOOK_FIELDS if field in changes})
+
+@app.route(f'/delete/<int(max={queries.MAX_BOOK_ID}):id>', methods=['DELETE'])
+@invalidates_cache
 def delete_book(id):
+    with storage.write() as books:
+        deleted = books.delete_book(id)
+    if not deleted:
+        return jsonify({"error": "Book not found"}), 404
+    return jsonify({"message": "Book deleted successfully"})
+
+# --- Bulk endpoints ---
+# Each call is one transaction and a handful of statements regardless of the
+# item count; invalid items are reported per index and skipped.
+MAX_BULK_ITEMS = 10000
+
+def read_bulk_items():
+    if not request.is_json:
+        return None, (jsonify({"error": "Request must be JSON"}), 400)
+    items = request.get_json(silent=True)
+    if items is None:
+        return None, (jsonify({"error": "Invalid JSON body"}), 400)
+    if not isinstance(items, list):
+        return None, (jsonify({"error": "Request body must be a JSON array"}), 400)
+    if len(items) > MAX_BULK_ITEMS:
+        return None, (jsonify({"error": f"Too many items. Maximum is {MAX_BULK_ITEMS}."}), 400)
+    return items, None
+
+def bulk_response(results):
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    failed = sum(count for status, count in summary.items() if status in ('error', 'not_found'))
+    if not results or failed == 0:
+        status_code = 200
+    elif failed == len(results):
+        status_code = 400
+    else:
+        status_code = 207
+    return jsonify({"summary": summary, "results": results}), status_code
+
+@app.route('/bulk/create', methods=['POST'])
+@invalidates_cache
+def bulk_create_books():
+    """
+    Insert an array of books with one INSERT ... SELECT FROM unnest() ... RETURNING id.
+    Items whose (name, publisher) already exists are reported as errors.
+    """
+    items, error = read_bulk_items()
+    if error:
+        return error
+
+    results = [None] * len(items)
+    valid = []
+    for index, book in enumerate(items):
+        validation_error = validate_book_data(book)
+        if validation_error:
+            results[index] = {"index": index, "status": "error", "error": validation_error}
+        else:
+            valid.append(index)
+
+    if valid:
+        with storage.write() as books:
+            # Duplicates (of existing rows or earlier items) are skipped, so
+            # match the returned rows back to items by their unique key, which
+            # comes back as text: {"name": 2001} is stored as '2001'.
+            created = books.insert_books(
+                [tuple(items[i][field] for field in BOOK_FIELDS) for i in valid], on_conflict='ignore'
+            )
+        ids = {(name, publisher): book_id for book_id, name, publisher in created}
+        for index in valid:
+            book_id = ids.pop((str(items[index]['name']), str(items[index]['publisher'])), None)
+            if book_id is None:
+                results[index] = {"index": index, "status": "error", "error": "Book already exists"}
+            else:
+                results[index] = {"index": index, "status": "created", "id": book_id}
+    return bulk_response(results)
+
+@app.route('/bulk/update', methods=['PUT'])
+@invalidates_cache
+def bulk_update_books():
+    """
+    Update an array of books (each with an id) with one UPDATE ... FROM unnest(...).
+    """
+    items, error = read_bulk_items()
+    if error:
+        return error
+
+    results = [None] * len(items)
+    valid, seen_ids = [], set()
+    for index, book in enumerate(items):
+        validation_error = validate_book_data(book)
+        if not validation_error and (not isinstance(book.get('id'), int) or isinstance(book['id'], bool)):
+            validation_error = "Missing field: id"
+        elif not validation_error and book['id'] in seen_ids:
+            validation_error = "Duplicate id in request"
+        if validation_error:
+            results[index] = {"index": index, "status": "error", "error": validation_error}
+        else:
+            seen_ids.add(book['id'])
+            valid.append(index)
+
+    updated_ids = set()
+    if valid:
+        with storage.write() as books:
+            updated_ids = books.update_books(
+                [(items[i]['id'],) + tuple(items[i][field] for field in BOOK_FIELDS) for i in valid]
+            )
+    for index in valid:
+        book_id = items[index]['id']
+        if book_id in updated_ids:
+            results[index] = {"index": index, "status": "updated", "id": book_id}
+        else:
+            results[index] = {"index": index, "status": "not_found", "id": book_id, "error": "Book not found"}
+    return bulk_response(results)
+
+@app.route('/bulk/delete', methods=['DELETE'])
+@invalidates_cache
+def bulk_delete_books():
+    """
+    Delete an array of book ids with one DELETE ... WHERE id = ANY(...).
+    """
+    items, error = read_bulk_items()
+    if error:
+        return error
+
+    ids = [item for item in items if isinstance(item, int) and not isinstance(item, bool)]
+    deleted_ids = set()
+    if ids:
+        with storage.write() as books:
+            deleted_ids = books.delete_books(ids)
+
+    results = []
+    for index, item in enumerate(items):
+        if not isinstance(item, int) or isinstance(item, bool):
+            results.append({"index": index, "status": "error", "error": "Invalid id. Must be an integer."})
+        elif item in deleted_ids:
+            results.append({"index": index, "status": "deleted", "id": item})
+        else:
+            results.append({"index": index, "status": "not_found", "id": item, "error": "Book not found"})
+    return bulk_response(results)
+
+# --- Change feed ---
+# Triggers on book append to book_change and NOTIFY book_changes in the writing
+# transaction. Cursors are "<txid>-<seq>" and only transactions older than every
+# one still running are served (txid < snapshot xmin), so a slow writer can never
+# commit a change behind a cursor a client already holds. Entries older than
+# CHANGE_RETENTION_DAYS (0 keeps them forever) are pruned by each process's
+# change listener; a client that falls further behind should reload the catalog.
+CHANGE_CHANNEL = 'book_changes'
+SSE_KEEPALIVE = 15
+CHANGE_FENCE_POLL = 0.1         # first re-check of a fence holding changes back...
+CHANGE_FENCE_POLL_MAX = 1.0     # ...doubling up to this while it does not move
+CHANGE_RETENTION_DAYS = float(os.environ.get('CHANGE_RETENTION_DAYS', 7))
+CHANGE_PRUNE_INTERVAL = 300
+CHANGE_CURSOR = re.compile(r'^(\d+)-(\d+)$')
+
+# Changes are withheld while a transaction older than them is still open. The
+# fence is cluster-wide, and every stream's position is below it, so one check
+# serves all streams.
+CHANGE_FENCE_SQL = """
+    SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint,
+           EXISTS (SELECT 1 FROM book_change WHERE txid >= pg_snapshot_xmin(pg_current_snapshot()))
+"""
+CHANGE_PRUNE_SQL = "DELETE FROM book_change WHERE changed_at < now() - %s * interval '1 day'"
+
+_change_listener = None
+_change_listener_pid = None
+_change_listener_lock = threading.Lock()
+
+def create_change_listener():
+    prune = {'prune_query': CHANGE_PRUNE_SQL, 'prune_params': (CHANGE_RETENTION_DAYS,)} if CHANGE_RETENTION_DAYS else {}
+    return ChangeListener(CHANGE_CHANNEL, fence_query=CHANGE_FENCE_SQL, fence_poll=CHANGE_FENCE_POLL,
+                          fence_poll_max=CHANGE_FENCE_POLL_MAX, prune_interval=CHANGE_PRUNE_INTERVAL,
+                          **prune, **db_config)
+
+def get_change_listener():
+    # One LISTEN connection per process, started after any fork: by serve.py's
+    # post_fork, or else by the first stream.
+    global _change_listener, _change_listener_pid
+    with _change_listener_lock:
+        if _change_listener is None or _change_listener_pid != os.getpid():
+            _change_listener = create_change_listener()
+            _change_listener_pid = os.getpid()
+    return _change_listener
+
+def parse_change_cursor(raw):
+    match = CHANGE_CURSOR.match(raw)
+    if not match:
+        raise ValueError("Invalid since. Use a cursor from a previous response, or 0.")
+    return int(match.group(1)), int(match.group(2))
+
+def read_change_head():
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT txid::text::bigint, seq FROM book_change
+                WHERE txid < pg_snapshot_xmin(pg_current_snapshot())
+                ORDER BY txid DESC, seq DESC LIMIT 1
+            """)
+            return cursor.fetchone() or (0, 0)
+    finally:
+        connection.close()
+
+def read_changes(position, limit):
+    """Changes after position (txid, seq); returns (changes, new position, has_more)."""
     connection = get_db_connection()
-    cursor = connection.cursor()
-    cursor.execute("DELETE FROM book WHERE id=%s", (id,))
-    connection.commit()
-    cursor.close()
-    connection.close()
-    return jsonify({'result': 'Book deleted'})
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.txid::text::bigint, c.seq, c.op, c.book_id,
+                       b.id, b.publisher, b.name, b.date, b.cost, b.version
+                FROM book_change c LEFT JOIN book b ON b.id = c.book_id
+                WHERE (c.txid, c.seq) > (%s::text::xid8, %s)
+                  AND c.txid < pg_snapshot_xmin(pg_current_snapshot())
+                ORDER BY c.txid, c.seq
+                LIMIT %s
+            """, (position[0], position[1], limit + 1))
+            rows = cursor.fetchall()
+    finally:
+        connection.close()
+
+    has_more = len(rows) > limit
+    changes = []
+    for txid, seq, op, book_id, *book in rows[:limit]:
+        position = (txid, seq)
+        # The current row, not a snapshot: None once the book is gone.
+        current = dict(zip(('id', 'publisher', 'name', 'date', 'cost', 'version'), book)) if book[0] else None
+        changes.append({"cursor": f"{txid}-{seq}", "op": op, "id": book_id, "book": current})
+    return changes, position, has_more
+
+@app.route('/changes', methods=['GET'])
+@requires_postgres
+def list_changes():
+    """
+    Incremental sync. Query params: since (cursor; 0 = from the beginning), limit.
+    Without since only the current head cursor is returned: take it before
+    loading the catalog, then poll or stream from it.
+    """
+    try:
+        limit = parse_limit(request.args)
+        if 'since' not in request.args:
+            txid, seq = read_change_head()
+            return jsonify({"data": [], "next_cursor": f"{txid}-{seq}", "has_more": False})
+        since = request.args['since']
+        position = (0, 0) if since == '0' else parse_change_cursor(since)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    changes, position, has_more = read_changes(position, limit)
+    return jsonify({"data": changes, "next_cursor": f"{position[0]}-{position[1]}", "has_more": has_more})
+
+@app.route('/changes/stream', methods=['GET'])
+@requires_postgres
+def stream_changes():
+    """
+    Server-Sent Events push of the same changes. Resumes from the Last-Event-ID
+    header (sent automatically by EventSource on reconnect) or ?since=.
+    """
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        if since is None:
+            position = read_change_head()
+        else:
+            position = (0, 0) if since == '0' else parse_change_cursor(since)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    listener = get_change_listener()
+
+    def generate(position):
+        yield "retry: 3000\n\n"
+        while True:
+            # Read the sequence first so a NOTIFY landing mid-read is not lost.
+            seen = listener.sequence
+            changes, position, has_more = read_changes(position, MAX_PAGE_SIZE)
+            for change in changes:
+                yield f"id: {change['cursor']}\nevent: change\ndata: {app.json.dumps(change)}\n\n"
+            if has_more:
+                continue
+            # Changes held back by the fence wake us too, once the listener sees it move.
+            if listener.wait(seen, SSE_KEEPALIVE) == seen:
+                yield ": keepalive\n\n"
+
+    return Response(
+        stream_with_context(generate(position)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """
+    Readiness probe: 200 only if a pooled connection can be checked out
+    quickly and answers SELECT 1 (always 200 with the memory backend).
+    """
+    if storage.name != 'postgres':
+        return jsonify({"status": "healthy", "storage": storage.name}), 200
+    pool = get_pool()
+    try:
+        connection = pool.getconn(timeout=HEALTH_CHECK_TIMEOUT)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        finally:
+            connection.close()
+    except PoolTimeout:
+        return jsonify({"status": "unhealthy", "reason": "Connection pool exhausted", "pool": pool.stats()}), 503
+    except OperationalError:
+        return jsonify({"status": "unhealthy", "reason": "Database unreachable", "pool": pool.stats()}), 503
+    return jsonify({"status": "healthy", "pool": pool.stats()}), 200
+
+@app.route('/pool/stats', methods=['GET'])
+@requires_postgres
+def pool_stats():
+    # In-use/idle counts and checkout wait times, for sizing DB_POOL_MIN/MAX.
+    stats = get_pool().stats()
+    router = get_router()
+    if router.replicas:
+        stats['read_routing'] = router.stats()
+    return jsonify(stats)
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+def collect_runtime_gauges():
+    cache_stats = response_cache.stats()
+    lines = []
+    if storage.name == 'postgres':
+        pool_stats = get_pool().stats()
+        for key in ('size', 'in_use', 'idle', 'waiting'):
+            lines += metrics.gauge_lines(f"book_api_db_pool_{key}", f"Connection pool {key.replace('_', ' ')}.", pool_stats[key])
+        lines += metrics.gauge_lines("book_api_db_pool_timeouts", "Checkouts that hit the pool timeout.", pool_stats['timeouts'])
+        lines += metrics.gauge_lines("book_api_db_pool_wait_seconds_total", "Total time spent waiting for a connection.",
+                                     pool_stats['wait_time_total_ms'] / 1000)
+    for key in ('hits', 'misses', 'entries'):
+        lines += metrics.gauge_lines(f"book_api_response_cache_{key}", f"Response cache {key}.", cache_stats[key])
+    return lines
+
+if METRICS_ENABLED:
+    metrics.instrument(app, collectors=[collect_runtime_gauges], slow_query_ms=SLOW_QUERY_MS)
+
+if COMPRESS_ENABLED:
+    compression.install(app, **compression_config)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
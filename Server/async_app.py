@@ -0,0 +1,264 @@
+"""
+Async serving mode for the Book API: Quart + asyncpg.
+
+Exposes the same routes and JSON contracts as app.py (/, /create with
+on_conflict and Idempotency-Key, PUT/PATCH /update/<id> with If-Match,
+/delete/<id>, /health) and runs the same SQL (book_queries statements), but
+never blocks the event loop on the database, so a single process can keep
+hundreds of requests in flight.
+
+    hypercorn async_app:app --bind 0.0.0.0:5000
+"""
+import asyncio
+import contextlib
+import json
+import os
+import time
+from decimal import Decimal
+
+import asyncpg
+from quart import Quart, jsonify, request
+from quart_cors import cors
+
+import book_queries as queries
+from app import (BOOK_FIELDS, CONFLICT_MODES, IDEMPOTENCY_KEY_TTL, create_response, db_config,
+                 idempotency_key_error, if_match_versions, parse_date, pool_config, replay_response,
+                 request_fingerprint, validate_book_data)
+from json_provider import FastJSONProvider, json_default
+from storage import IDEMPOTENCY_PRUNE_INTERVAL
+
+app = cors(Quart(__name__))
+# Quart's JSON provider API is Flask's, so both apps serialize rows identically.
+app.json = FastJSONProvider(app)
+
+# Same settings as the sync pool; asyncpg names the database 'database'.
+async_db_config = {
+    'host': db_config['host'],
+    'user': db_config['user'],
+    'password': db_config['password'],
+    'database': db_config['dbname'],
+}
+async_pool_config = {
+    'min_size': pool_config['minconn'],
+    'max_size': int(os.environ.get('ASYNC_DB_POOL_MAX', 50)),
+    'max_inactive_connection_lifetime': pool_config['max_idle'],
+}
+ACQUIRE_TIMEOUT = pool_config['timeout']
+
+# Raised by the driver/pool when Postgres cannot be reached in time.
+DB_UNAVAILABLE_ERRORS = (OSError, asyncio.TimeoutError, asyncpg.PostgresConnectionError,
+                         asyncpg.CannotConnectNowError, asyncpg.TooManyConnectionsError)
+
+_pool = None
+_idempotency_pruned_at = 0.0
+
+
+async def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(**async_db_config, **async_pool_config)
+    return _pool
+
+
+@contextlib.asynccontextmanager
+async def acquire():
+    # Bounded wait for a pooled connection, like the sync pool's PoolTimeout.
+    pool = await get_pool()
+    async with pool.acquire(timeout=ACQUIRE_TIMEOUT) as conn:
+        yield conn
+
+
+@app.before_serving
+async def open_pool():
+    await get_pool()
+
+
+@app.after_serving
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def _text(value):
+    # psycopg2 sends {"name": 2001} as 2001 and Postgres stores '2001'.
+    return None if value is None else str(value)
+
+
+# asyncpg binds typed values, so convert what validate_book_data() accepted.
+CONVERT = {'publisher': _text, 'name': _text, 'date': parse_date, 'cost': lambda value: Decimal(str(value))}
+
+
+def book_changes(data):
+    """The book fields present in data, in BOOK_FIELDS order, as asyncpg parameters."""
+    return {field: CONVERT[field](data[field]) for field in BOOK_FIELDS if field in data}
+
+
+# --- Queries (the SQL of book_queries' prepared statements) ---
+async def insert_book(conn, book, on_conflict):
+    """Same contract as book_queries.insert_book: (row, created)."""
+    if on_conflict == 'update':
+        row = dict(await conn.fetchrow(queries.UPSERT_BOOK.sql, *book.values()))
+        return row, row.pop('inserted')
+    row = await conn.fetchrow(queries.INSERT_BOOK.sql, *book.values())
+    if row is not None:
+        return dict(row), True
+    return dict(await conn.fetchrow(queries.BOOK_BY_KEY.sql, book['name'], book['publisher'])), False
+
+
+async def claim_idempotency_key(conn, key, fingerprint):
+    """Same contract as storage.PostgresBooks.claim_idempotency_key."""
+    global _idempotency_pruned_at
+    now = time.monotonic()
+    if now - _idempotency_pruned_at > IDEMPOTENCY_PRUNE_INTERVAL:
+        _idempotency_pruned_at = now
+        await conn.execute(queries.PRUNE_IDEMPOTENCY_KEYS.sql, IDEMPOTENCY_KEY_TTL)
+    else:
+        await conn.execute(queries.PRUNE_IDEMPOTENCY_KEY.sql, key, IDEMPOTENCY_KEY_TTL)
+    if await conn.fetchval(queries.CLAIM_IDEMPOTENCY_KEY.sql, key, fingerprint) is not None:
+        return None
+    request_hash, status_code, body = await conn.fetchrow(queries.IDEMPOTENT_RESPONSE.sql, key)
+    # asyncpg returns jsonb as text.
+    return request_hash, status_code, json.loads(body)
+
+
+# --- Global Error Handlers ---
+@app.errorhandler(404)
+async def not_found_error(e):
+    return jsonify({"error": "Resource not found"}), 404
+
+
+@app.errorhandler(405)
+async def method_not_allowed_error(e):
+    return jsonify({"error": "Method not allowed"}), 405
+
+
+@app.errorhandler(asyncpg.DataError)
+async def invalid_data(e):
+    return jsonify({"error": "Invalid data type or value", "details": str(e)}), 400
+
+
+@app.errorhandler(asyncpg.IntegrityConstraintViolationError)
+async def constraint_violation(e):
+    return jsonify({"error": "Constraint violation", "details": str(e)}), 400
+
+
+async def database_unavailable(e):
+    # Postgres unreachable, or no pooled connection free within the acquire timeout.
+    return jsonify({"error": "Database unavailable", "details": str(e)}), 503
+
+for _error in DB_UNAVAILABLE_ERRORS:
+    app.register_error_handler(_error, database_unavailable)
+
+
+# --- Routes ---
+@app.route('/', methods=['GET'])
+async def get_books():
+    async with acquire() as conn:
+        rows = await conn.fetch(queries.ALL_BOOKS.sql)
+    return jsonify([dict(row) for row in rows])
+
+
+@app.route('/create', methods=['POST'])
+async def create_books():
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+    new_book = await request.get_json()
+    validation_error = validate_book_data(new_book)
+    if validation_error:
+        return jsonify({"error": validation_error}), 400
+    on_conflict = request.args.get('on_conflict', 'error')
+    if on_conflict not in CONFLICT_MODES:
+        return jsonify({"error": f"Invalid on_conflict. Use one of: {', '.join(CONFLICT_MODES)}."}), 400
+    key = request.headers.get('Idempotency-Key')
+    key_error = idempotency_key_error(key)
+    if key_error:
+        return jsonify({"error": key_error}), 400
+
+    async with acquire() as conn:
+        async with conn.transaction():
+            replay = None
+            if key is not None:
+                fingerprint = request_fingerprint(new_book, on_conflict)
+                replay = replay_response(await claim_idempotency_key(conn, key, fingerprint), fingerprint)
+            if replay is None:
+                row, created = await insert_book(conn, book_changes(new_book), on_conflict)
+                status_code, body = create_response(row, created, on_conflict)
+                if key is not None:
+                    await conn.execute(queries.STORE_IDEMPOTENT_RESPONSE.sql, status_code,
+                                       json.dumps(body, default=json_default), key)
+            else:
+                status_code, body = replay
+    response = jsonify(body)
+    response.status_code = status_code
+    if replay is not None:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+async def write_book(id, changes):
+    """Same contract as app.write_book: one UPDATE ... RETURNING, honouring If-Match."""
+    versions = if_match_versions(request)
+    statement = queries.update_statement(tuple(changes), versions is not None)
+    params = list(changes.values()) + [id] + ([versions] if versions is not None else [])
+    async with acquire() as conn:
+        async with conn.transaction():
+            book = await conn.fetchrow(statement.sql, *params)
+            if book is None and versions is not None:
+                current = await conn.fetchrow(queries.BOOK_BY_ID.sql, id)
+                if current is not None:
+                    response = jsonify({"error": "Book was modified by another request", "data": dict(current)})
+                    response.status_code = 412
+                    response.set_etag(str(current['version']))
+                    return response
+    if book is None:
+        return jsonify({"error": "Book not found"}), 404
+    response = jsonify({"message": "Book updated successfully", "data": dict(book)})
+    response.set_etag(str(book['version']))
+    return response
+
+
+@app.route(f'/update/<int(max={queries.MAX_BOOK_ID}):id>', methods=['PUT'])
+async def update_book(id):
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+    updated_book = await request.get_json()
+    validation_error = validate_book_data(updated_book)
+    if validation_error:
+        return jsonify({"error": validation_error}), 400
+    return await write_book(id, book_changes(updated_book))
+
+
+@app.route(f'/update/<int(max={queries.MAX_BOOK_ID}):id>', methods=['PATCH'])
+async def patch_book(id):
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+    changes = await request.get_json()
+    validation_error = validate_book_data(changes, partial=True)
+    if validation_error:
+        return jsonify({"error": validation_error}), 400
+    return await write_book(id, book_changes(changes))
+
+
+@app.route(f'/delete/<int(max={queries.MAX_BOOK_ID}):id>', methods=['DELETE'])
+async def delete_book(id):
+    async with acquire() as conn:
+        deleted = await conn.fetchval(queries.DELETE_BOOK.sql, id)
+    if deleted is None:
+        return jsonify({"error": "Book not found"}), 404
+    return jsonify({"message": "Book deleted successfully"}), 200
+
+
+@app.route('/health', methods=['GET'])
+async def health_check():
+    try:
+        async with acquire() as conn:
+            await conn.fetchval("SELECT 1")
+    except DB_UNAVAILABLE_ERRORS:
+        return jsonify({"status": "unhealthy", "reason": "Database unreachable"}), 503
+    return jsonify({"status": "healthy", "pool": {"size": _pool.get_size(), "idle": _pool.get_idle_size()}}), 200
+
+
+if __name__ == '__main__':
+    app.run()
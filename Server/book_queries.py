@@ -0,0 +1,353 @@
+"""
+SQL for the book table (and its stats rollup and idempotency keys), shared by
+the Postgres storage backend, the test fixtures and the seeders.
+
+Fixed-shape statements are PREPAREd on first use on each physical connection
+(pooled or plain) and then run with EXECUTE, so Postgres skips parsing and,
+once the plan is cached, planning. Multi-row writes pass arrays through
+unnest() so they are fixed-shape, and preparable, too.
+
+Every function takes a cursor; committing is left to the caller.
+"""
+import weakref
+
+from json_provider import fetch_dicts
+
+BOOK_FIELDS = ('publisher', 'name', 'date', 'cost')
+# Explicit list so internal columns (search_vector) never reach API responses.
+COLUMNS = ('id',) + BOOK_FIELDS + ('version',)
+BOOK_COLUMNS = ", ".join(COLUMNS)
+COLUMN_TYPES = {'publisher': 'text', 'name': 'text', 'date': 'date', 'cost': 'numeric'}
+# book.id is a SERIAL (integer); routes never match a larger id. Id parameters
+# are still declared bigint, so a larger id in a list is just not found.
+MAX_BOOK_ID = 2 ** 31 - 1
+EXPORT_BOOKS = f"SELECT {BOOK_COLUMNS} FROM book ORDER BY id"
+
+
+# Every Statement by name, so logs can show the SQL behind "EXECUTE name (...)".
+STATEMENTS = {}
+
+
+class Statement:
+    __slots__ = ('name', 'sql', 'prepare', 'execute')
+
+    def __init__(self, name, param_types, sql):
+        self.name = name
+        # $n placeholders: asyncpg (async_app.py) runs the same text directly.
+        self.sql = sql
+        types = f" ({', '.join(param_types)})" if param_types else ""
+        self.prepare = f"PREPARE {name}{types} AS {sql}"
+        self.execute = f"EXECUTE {name}" + (f" ({', '.join(['%s'] * len(param_types))})" if param_types else "")
+        STATEMENTS[name] = self
+
+
+# Names of the statements prepared on each live connection; entries vanish with the connection.
+_prepared = weakref.WeakKeyDictionary()
+
+
+def run(cursor, statement, params=()):
+    """EXECUTE statement on cursor's connection, preparing it there first if needed."""
+    connection = cursor.connection
+    names = _prepared.get(connection)
+    if names is None:
+        names = _prepared[connection] = set()
+    if statement.name not in names:
+        # PREPARE is not transactional: the statement outlives a later rollback.
+        cursor.execute(statement.prepare)
+        names.add(statement.name)
+    cursor.execute(statement.execute, params)
+
+
+def _text_array(values):
+    # Arrays are sent as text[] and cast in SQL: psycopg2 would otherwise type
+    # ARRAY[...] from its first element and mixed JSON input (10, "12.5") fails.
+    return [None if value is None else str(value) for value in values]
+
+
+def _book_values(book):
+    return tuple(book[field] for field in BOOK_FIELDS)
+
+
+# --- Reads ---
+ALL_BOOKS = Statement('all_books', (), f"SELECT {BOOK_COLUMNS} FROM book")
+BOOK_BY_ID = Statement('book_by_id', ('bigint',), f"SELECT {BOOK_COLUMNS} FROM book WHERE id = $1")
+BOOKS_BY_IDS = Statement('books_by_ids', ('bigint[]',), f"SELECT {BOOK_COLUMNS} FROM book WHERE id = ANY($1)")
+BOOK_BY_KEY = Statement('book_by_key', ('text', 'text'),
+                        f"SELECT {BOOK_COLUMNS} FROM book WHERE name = $1 AND publisher = $2")
+
+
+_select_statements = {}
+
+
+def select_statement(columns):
+    """Prepared SELECT of a subset of COLUMNS over the whole table (?fields=)."""
+    statement = _select_statements.get(columns)
+    if statement is None:
+        statement = _select_statements[columns] = Statement(
+            "all_books_" + "_".join(columns), (), f"SELECT {', '.join(columns)} FROM book")
+    return statement
+
+
+def all_books(cursor, columns=None):
+    run(cursor, ALL_BOOKS if columns is None else select_statement(columns))
+    return fetch_dicts(cursor)
+
+
+def get_book(cursor, book_id):
+    run(cursor, BOOK_BY_ID, (book_id,))
+    return next(iter(fetch_dicts(cursor)), None)
+
+
+def get_books(cursor, ids):
+    """Books with the given ids, in no particular order; missing ids are skipped."""
+    run(cursor, BOOKS_BY_IDS, (list(ids),))
+    return fetch_dicts(cursor)
+
+
+def find_book(cursor, name, publisher):
+    run(cursor, BOOK_BY_KEY, (name, publisher))
+    return next(iter(fetch_dicts(cursor)), None)
+
+
+def list_books(cursor, query):
+    """
+    One keyset page for a storage.ListQuery: up to limit + 1 rows, the extra
+    one telling the caller whether another page exists. Each sort column has
+    a (column, id) index, so pages are index range scans.
+    """
+    where, params = [], []
+    if query.publishers:
+        where.append("publisher = ANY(%s)")
+        params.append(list(query.publishers))
+    for value, clause in ((query.date_from, "date >= %s"), (query.date_to, "date <= %s"),
+                          (query.cost_min, "cost >= %s"), (query.cost_max, "cost <= %s")):
+        if value is not None:
+            where.append(clause)
+            params.append(value)
+    sort, direction = query.sort, query.order.upper()
+    if query.after is not None:
+        value, last_id = query.after
+        op = '>' if direction == 'ASC' else '<'
+        if sort == 'id':
+            where.append(f"id {op} %s")
+            params.append(last_id)
+        else:
+            where.append(f"({sort}, id) {op} (%s, %s)")
+            params.extend([value, last_id])
+
+    columns = BOOK_COLUMNS
+    if query.fields is not None:
+        # The cursor needs the sort column and id even when not requested.
+        columns = ", ".join(column for column in COLUMNS if column in query.fields or column in (sort, 'id'))
+    sql = f"SELECT {columns} FROM book"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {sort} {direction}" if sort == 'id' else f" ORDER BY {sort} {direction}, id {direction}"
+    sql += " LIMIT %s"
+    params.append(query.limit + 1)
+    cursor.execute(sql, params)
+    return fetch_dicts(cursor)
+
+
+# --- Single-row writes ---
+_INSERT = "INSERT INTO book (publisher, name, date, cost) VALUES ($1, $2, $3, $4)"
+_VALUE_TYPES = tuple(COLUMN_TYPES[field] for field in BOOK_FIELDS)
+INSERT_BOOK = Statement('insert_book', _VALUE_TYPES,
+                        f"{_INSERT} ON CONFLICT (name, publisher) DO NOTHING RETURNING {BOOK_COLUMNS}")
+UPSERT_BOOK = Statement('upsert_book', _VALUE_TYPES,
+                        f"{_INSERT} ON CONFLICT (name, publisher) DO UPDATE "
+                        f"SET date = EXCLUDED.date, cost = EXCLUDED.cost, version = book.version + 1 "
+                        f"RETURNING {BOOK_COLUMNS}, xmax = 0 AS inserted")
+DELETE_BOOK = Statement('delete_book', ('bigint',), "DELETE FROM book WHERE id = $1 RETURNING id")
+
+_update_statements = {}
+
+
+def insert_book(cursor, book, on_conflict='error'):
+    """
+    Insert one book (a dict with BOOK_FIELDS). Returns (row, created). When
+    (name, publisher) already exists the stored row is returned with
+    created=False; on_conflict='update' first overwrites its date and cost.
+    """
+    if on_conflict == 'update':
+        run(cursor, UPSERT_BOOK, _book_values(book))
+        row = fetch_dicts(cursor)[0]
+        return row, row.pop('inserted')
+    run(cursor, INSERT_BOOK, _book_values(book))
+    rows = fetch_dicts(cursor)
+    if rows:
+        return rows[0], True
+    return find_book(cursor, book['name'], book['publisher']), False
+
+
+def update_statement(columns, conditional=False):
+    """Prepared UPDATE for one combination of columns (PUT writes all, PATCH some)."""
+    key = (columns, conditional)
+    statement = _update_statements.get(key)
+    if statement is None:
+        assignments = ", ".join(f"{column} = ${i}" for i, column in enumerate(columns, 1))
+        sql = f"UPDATE book SET {assignments}, version = version + 1 WHERE id = ${len(columns) + 1}"
+        types = [COLUMN_TYPES[column] for column in columns] + ['bigint']
+        if conditional:
+            sql += f" AND version = ANY(${len(columns) + 2})"
+            types.append('bigint[]')
+        name = "update_book_" + "_".join(columns) + ("_if_version" if conditional else "")
+        statement = _update_statements[key] = Statement(name, types, f"{sql} RETURNING {BOOK_COLUMNS}")
+    return statement
+
+
+def update_book(cursor, book_id, changes, versions=None):
+    """
+    Write changes (column -> value) and bump the version. With versions, only
+    if the stored version is one of them. Returns the new row, or None.
+    """
+    columns = tuple(field for field in BOOK_FIELDS if field in changes)
+    params = [changes[column] for column in columns] + [book_id]
+    if versions is not None:
+        params.append(list(versions))
+    run(cursor, update_statement(columns, versions is not None), params)
+    return next(iter(fetch_dicts(cursor)), None)
+
+
+def delete_book(cursor, book_id):
+    run(cursor, DELETE_BOOK, (book_id,))
+    return cursor.fetchone() is not None
+
+
+# --- Multi-row writes ---
+_INSERT_MANY = ("INSERT INTO book (publisher, name, date, cost) "
+                "SELECT * FROM unnest($1::text[], $2::text[], $3::text[]::date[], $4::text[]::numeric[])")
+_MANY_TYPES = ('text[]', 'text[]', 'text[]', 'text[]')
+INSERT_BOOKS = {
+    'error': Statement('insert_books', _MANY_TYPES, f"{_INSERT_MANY} RETURNING id, name, publisher"),
+    'ignore': Statement('insert_books_ignore', _MANY_TYPES,
+                        f"{_INSERT_MANY} ON CONFLICT (name, publisher) DO NOTHING RETURNING id, name, publisher"),
+    'update': Statement('insert_books_update', _MANY_TYPES,
+                        f"{_INSERT_MANY} ON CONFLICT (name, publisher) DO UPDATE "
+                        f"SET date = EXCLUDED.date, cost = EXCLUDED.cost, version = book.version + 1 "
+                        f"RETURNING id, name, publisher"),
+}
+UPDATE_BOOKS = Statement(
+    'update_books', ('bigint[]',) + _MANY_TYPES,
+    "UPDATE book SET publisher = v.publisher, name = v.name, date = v.date, cost = v.cost, "
+    "version = book.version + 1 "
+    "FROM unnest($1, $2::text[], $3::text[], $4::text[]::date[], $5::text[]::numeric[]) "
+    "AS v(id, publisher, name, date, cost) WHERE book.id = v.id RETURNING book.id",
+)
+DELETE_BOOKS = Statement('delete_books', ('bigint[]',), "DELETE FROM book WHERE id = ANY($1) RETURNING id")
+
+
+def insert_books(cursor, books, on_conflict='error'):
+    """
+    Insert (publisher, name, date, cost) rows in one statement. Returns
+    (id, name, publisher) per row written; with 'ignore' duplicates of
+    existing or earlier rows are skipped, with 'error' they raise.
+    """
+    columns = list(zip(*books)) or [(), (), (), ()]
+    run(cursor, INSERT_BOOKS[on_conflict], [_text_array(column) for column in columns])
+    return cursor.fetchall()
+
+
+def update_books(cursor, rows):
+    """Apply (id, publisher, name, date, cost) rows; returns the ids that exist."""
+    ids, *columns = list(zip(*rows)) or [(), (), (), (), ()]
+    run(cursor, UPDATE_BOOKS, [list(ids)] + [_text_array(column) for column in columns])
+    return {row[0] for row in cursor.fetchall()}
+
+
+def delete_books(cursor, ids):
+    """Delete by id; returns the ids that existed."""
+    run(cursor, DELETE_BOOKS, (list(ids),))
+    return {row[0] for row in cursor.fetchall()}
+
+
+# --- Statistics ---
+# Served from the book_stats rollup (one row per publisher and year), which
+# triggers on book keep current within each writing transaction.
+def stats(cursor):
+    """Catalog totals: books, publishers, total and average cost, year range."""
+    cursor.execute("""
+        SELECT coalesce(sum(book_count), 0)::bigint AS book_count,
+               count(DISTINCT publisher) AS publisher_count,
+               coalesce(sum(total_cost), 0) AS total_cost,
+               round(sum(total_cost) / nullif(sum(book_count), 0), 2) AS average_cost,
+               min(year) AS first_year, max(year) AS last_year
+        FROM book_stats
+    """)
+    return fetch_dicts(cursor)[0]
+
+
+def publisher_stats(cursor):
+    """Book count and average cost per publisher, largest first."""
+    cursor.execute("""
+        SELECT publisher, sum(book_count)::bigint AS book_count,
+               round(sum(total_cost) / sum(book_count), 2) AS average_cost,
+               min(year) AS first_year, max(year) AS last_year
+        FROM book_stats
+        GROUP BY publisher
+        ORDER BY book_count DESC, publisher
+    """)
+    return fetch_dicts(cursor)
+
+
+def yearly_stats(cursor, publishers=None):
+    """Books per publisher per year, optionally for some publishers only."""
+    sql = """
+        SELECT publisher, year, book_count, round(total_cost / book_count, 2) AS average_cost
+        FROM book_stats
+    """
+    params = []
+    if publishers:
+        sql += " WHERE publisher = ANY(%s)"
+        params.append(list(publishers))
+    cursor.execute(sql + " ORDER BY publisher, year", params)
+    return fetch_dicts(cursor)
+
+
+# --- Idempotency keys ---
+PRUNE_IDEMPOTENCY_KEYS = Statement(
+    'prune_idempotency_keys', ('double precision',),
+    "DELETE FROM idempotency_key WHERE created_at < now() - make_interval(secs => $1)",
+)
+PRUNE_IDEMPOTENCY_KEY = Statement(
+    'prune_idempotency_key', ('text', 'double precision'),
+    "DELETE FROM idempotency_key WHERE key = $1 AND created_at < now() - make_interval(secs => $2)",
+)
+CLAIM_IDEMPOTENCY_KEY = Statement(
+    'claim_idempotency_key', ('text', 'text'),
+    "INSERT INTO idempotency_key (key, request_hash) VALUES ($1, $2) ON CONFLICT (key) DO NOTHING RETURNING key",
+)
+IDEMPOTENT_RESPONSE = Statement(
+    'idempotent_response', ('text',),
+    "SELECT request_hash, status_code, response FROM idempotency_key WHERE key = $1",
+)
+STORE_IDEMPOTENT_RESPONSE = Statement(
+    'store_idempotent_response', ('integer', 'jsonb', 'text'),
+    "UPDATE idempotency_key SET status_code = $1, response = $2 WHERE key = $3",
+)
+
+
+def prune_idempotency_keys(cursor, ttl, key=None):
+    """Delete keys older than ttl seconds: all of them, or just ``key``."""
+    if key is None:
+        run(cursor, PRUNE_IDEMPOTENCY_KEYS, (ttl,))
+    else:
+        run(cursor, PRUNE_IDEMPOTENCY_KEY, (key, ttl))
+
+
+def claim_idempotency_key(cursor, key, fingerprint):
+    """
+    Reserve key inside the current transaction. Returns None when claimed,
+    else the stored (request_hash, status_code, response). A concurrent
+    request with the same key blocks on the INSERT until the first one
+    commits (then sees its response) or rolls back (then takes over).
+    """
+    run(cursor, CLAIM_IDEMPOTENCY_KEY, (key, fingerprint))
+    if cursor.fetchone():
+        return None
+    run(cursor, IDEMPOTENT_RESPONSE, (key,))
+    return cursor.fetchone()
+
+
+def store_idempotent_response(cursor, key, status_code, response_json):
+    run(cursor, STORE_IDEMPOTENT_RESPONSE, (status_code, response_json, key))
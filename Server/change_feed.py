@@ -0,0 +1,128 @@
+"""
+Process-wide Postgres LISTEN connection that wakes Server-Sent Events streams.
+
+One background thread per process holds a dedicated (unpooled) connection
+LISTENing on a channel, so open streams cost a waiting thread each but no
+database connection. Notifications carry no data; they only bump a counter
+that streams wait on before re-reading the change log.
+
+A notified change can still be held back by a fence (a transaction open
+anywhere in the cluster). Given a ``fence_query``, the listener polls it on
+behalf of every stream, backing off while the fence does not move, and bumps
+the counter again once it does. Given a ``prune_query``, the same thread runs
+it every ``prune_interval`` seconds to trim the change log.
+"""
+import select
+import threading
+import time
+
+import psycopg2
+
+
+class ChangeListener:
+    def __init__(self, channel, poll_interval=1.0, reconnect_delay=1.0, fence_query=None,
+                 fence_poll=0.1, fence_poll_max=1.0, prune_query=None, prune_params=None,
+                 prune_interval=300.0, **connect_kwargs):
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self.reconnect_delay = reconnect_delay
+        # fence_query returns one row (fence, withheld): any value that changes
+        # when the fence moves, and whether committed changes are still behind it.
+        self.fence_query = fence_query
+        self.fence_poll = fence_poll
+        self.fence_poll_max = fence_poll_max
+        self.prune_query = prune_query
+        self.prune_params = prune_params
+        self.prune_interval = prune_interval
+        self._connect_kwargs = connect_kwargs
+        self.sequence = 0       # bumped for every notification, fence move (and reconnect)
+        self.fence_checks = 0
+        self.pruned = 0         # change log rows deleted by prune_query
+        self._fence = None
+        self._fence_delay = None    # set while changes are withheld
+        self._prune_at = 0.0
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"listen-{channel}", daemon=True)
+        self._thread.start()
+
+    def wait(self, seen, timeout):
+        """
+        Block until the sequence moves past ``seen`` or ``timeout`` seconds
+        pass. Returns the current sequence.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.sequence != seen or self._stopped.is_set(), timeout)
+            return self.sequence
+
+    def stop(self):
+        self._stopped.set()
+        self._wake()
+        self._thread.join(timeout=self.poll_interval + 1)
+
+    def _wake(self):
+        with self._condition:
+            self.sequence += 1
+            self._condition.notify_all()
+
+    def _read_fence(self, conn):
+        with conn.cursor() as cursor:
+            cursor.execute(self.fence_query)
+            self.fence_checks += 1
+            return cursor.fetchone()
+
+    def _notified(self, conn):
+        # Read the fence before waking: streams then re-read at or past it, so
+        # only a later move of the fence needs another wake-up.
+        if self.fence_query:
+            self._fence, withheld = self._read_fence(conn)
+            self._fence_delay = self.fence_poll if withheld else None
+        self._wake()
+
+    def _poll_fence(self, conn):
+        fence, withheld = self._read_fence(conn)
+        if fence != self._fence:
+            self._fence = fence
+            self._fence_delay = self.fence_poll
+            self._wake()
+        else:
+            self._fence_delay = min(self._fence_delay * 2, self.fence_poll_max)
+        if not withheld:
+            self._fence_delay = None
+
+    def _prune(self, conn):
+        if self.prune_query is None or time.monotonic() < self._prune_at:
+            return
+        with conn.cursor() as cursor:
+            cursor.execute(self.prune_query, self.prune_params)
+            self.pruned += cursor.rowcount
+        self._prune_at = time.monotonic() + self.prune_interval
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                conn = psycopg2.connect(**self._connect_kwargs)
+            except psycopg2.OperationalError:
+                self._stopped.wait(self.reconnect_delay)
+                continue
+            try:
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                # Anything sent while we were (re)connecting was missed.
+                self._notified(conn)
+                while not self._stopped.is_set():
+                    self._prune(conn)
+                    timeout = self.poll_interval if self._fence_delay is None else self._fence_delay
+                    # Notifications may already have arrived during our own queries.
+                    if not conn.notifies and select.select([conn], [], [], timeout)[0]:
+                        conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self._notified(conn)
+                    elif self._fence_delay is not None:
+                        self._poll_fence(conn)
+            except psycopg2.Error:
+                self._stopped.wait(self.reconnect_delay)
+            finally:
+                conn.close()
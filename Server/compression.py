@@ -0,0 +1,118 @@
+"""
+Negotiated gzip/brotli compression of API responses.
+
+install(app) adds an after_request hook that compresses JSON, CSV and text
+bodies when the client's Accept-Encoding allows it:
+
+- buffered bodies smaller than ``min_size`` bytes are sent as-is
+- streamed bodies (/export) are compressed chunk by chunk, flushing after
+  each so rows keep flowing
+- Server-Sent Events are never compressed
+- a response carrying an ``encoded`` dict (encoding -> bytes), as cached
+  responses do, reuses and fills it instead of compressing again
+
+brotli is used when the ``brotli`` package is installed and preferred by
+the client's q-values, gzip otherwise.
+"""
+import gzip
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html')
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding):
+    """Best supported encoding for an Accept-Encoding header, or None."""
+    supported = supported_encodings()
+    offers = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offers[coding] = q
+    wildcard = offers.get('*', 0.0)
+    best, best_q = None, 0.0
+    for coding in supported:     # server preference breaks ties
+        q = offers.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _compressor(encoding, level):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)     # 31: gzip container
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def compress_stream(chunks, encoding, level):
+    process, flush, finish = _compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = process(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def install(app, min_size=1024, gzip_level=6, brotli_quality=4):
+    levels = {'gzip': gzip_level, 'br': brotli_quality}
+
+    @app.after_request
+    def compress_response(response):
+        response.vary.add('Accept-Encoding')
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or request.method == 'HEAD'):
+            return response
+        encoding = negotiate(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding, levels[encoding])
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            encoded = getattr(response, 'encoded', None)
+            body = encoded.get(encoding) if encoded is not None else None
+            if body is None:
+                body = compress(data, encoding, levels[encoding])
+                if encoded is not None:
+                    encoded[encoding] = body
+            response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,308 @@
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import InterfaceError, OperationalError
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_INERROR,
+    TRANSACTION_STATUS_INTRANS,
+)
+
+
+class PoolTimeout(OperationalError):
+    """Raised when no connection could be checked out before the wait timeout."""
+
+
+class _PoolEntry:
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = self.last_used = time.monotonic()
+
+
+class PooledConnection:
+    """
+    Thin proxy around a psycopg2 connection checked out of a ConnectionPool.
+    Everything is delegated to the real connection except close(), which
+    hands the connection back to the pool instead of closing the socket.
+    """
+    __slots__ = ('_pool', '_entry')
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    @property
+    def raw(self):
+        if self._entry is None:
+            raise InterfaceError("connection already returned to pool")
+        return self._entry.conn
+
+    @property
+    def closed(self):
+        return 1 if self._entry is None else self._entry.conn.closed
+
+    def close(self):
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool._release(entry)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Same transaction semantics as a psycopg2 connection: commit on
+        # success, roll back on error, keep the connection checked out.
+        if exc_type is None:
+            self.raw.commit()
+        else:
+            self.raw.rollback()
+        return False
+
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded psycopg2 connection pool.
+
+    - keeps between ``minconn`` and ``maxconn`` connections
+    - pings connections that sat idle longer than ``health_check_interval``
+      seconds before handing them out, replacing broken ones
+    - recycles connections older than ``max_lifetime`` seconds and closes
+      surplus connections (above ``minconn``) idle for ``max_idle`` seconds
+    - waits up to ``timeout`` seconds for a free connection, then raises
+      PoolTimeout
+    """
+
+    def __init__(self, minconn=1, maxconn=10, timeout=5.0, max_lifetime=1800.0,
+                 max_idle=300.0, health_check_interval=5.0,
+                 connection_factory=psycopg2.connect, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("pool size must satisfy 0 <= minconn <= maxconn, maxconn >= 1")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self._factory = connection_factory
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0          # open connections, idle + in use
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+        self._counters = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'health_check_failures': 0,
+            'wait_count': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    # --- Connection lifecycle ---
+    def _connect(self):
+        conn = self._factory(**self._connect_kwargs)
+        with self._cond:
+            self._counters['connections_created'] += 1
+        return _PoolEntry(conn)
+
+    def _discard(self, entry, recycled=False):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            if recycled:
+                self._counters['connections_recycled'] += 1
+            self._cond.notify()
+
+    def _is_stale(self, entry, now):
+        if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+            return True
+        return False
+
+    def _is_healthy(self, entry, now):
+        conn = entry.conn
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            return False
+        if now - entry.last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def prefill(self):
+        """Open connections up to ``minconn``; used right after (pre)fork."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.minconn:
+                    return
+                self._size += 1
+            try:
+                entry = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    # --- Checkout / release ---
+    def getconn(self, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        entry = None
+        with self._cond:
+            if self._closed:
+                raise PoolTimeout("connection pool is closed")
+            while not self._idle and self._size >= self.maxconn:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"no database connection available within {timeout}s "
+                        f"(pool size {self.maxconn})"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            if self._idle:
+                entry = self._idle.pop()
+            else:
+                self._size += 1
+            self._in_use += 1
+
+            waited = time.monotonic() - started
+            self._counters['checkouts'] += 1
+            if waited > 0.001:
+                self._counters['wait_count'] += 1
+                self._counters['wait_time_total'] += waited
+                self._counters['wait_time_max'] = max(self._counters['wait_time_max'], waited)
+
+        try:
+            if entry is not None:
+                now = time.monotonic()
+                if self._is_stale(entry, now):
+                    self._discard_reserved(entry, recycled=True)
+                    entry = None
+                elif not self._is_healthy(entry, now):
+                    with self._cond:
+                        self._counters['health_check_failures'] += 1
+                    self._discard_reserved(entry)
+                    entry = None
+            if entry is None:
+                entry = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, entry)
+
+    def _discard_reserved(self, entry, recycled=False):
+        # Close a checked-out connection but keep its slot reserved for the
+        # replacement the caller is about to open.
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        if recycled:
+            with self._cond:
+                self._counters['connections_recycled'] += 1
+
+    def _release(self, entry):
+        with self._cond:
+            self._in_use -= 1
+        conn = entry.conn
+        now = time.monotonic()
+        if conn.closed or self._closed or self._is_stale(entry, now):
+            self._discard(entry, recycled=not conn.closed)
+            return
+        try:
+            status = conn.get_transaction_status()
+            if status in (TRANSACTION_STATUS_INTRANS, TRANSACTION_STATUS_INERROR):
+                conn.rollback()
+            elif status != TRANSACTION_STATUS_IDLE:
+                self._discard(entry)
+                return
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error:
+            self._discard(entry)
+            return
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self._trim_idle(now)
+            self._cond.notify()
+
+    def _trim_idle(self, now):
+        # Oldest idle connections sit at the left of the deque.
+        while (self.max_idle and self._size > self.minconn and self._idle
+               and now - self._idle[0].last_used > self.max_idle):
+            entry = self._idle.popleft()
+            self._size -= 1
+            self._counters['connections_recycled'] += 1
+            try:
+                entry.conn.close()
+            except Exception:
+                pass
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            try:
+                entry.conn.close()
+            except Exception:
+                pass
+
+    # --- Introspection ---
+    def stats(self):
+        with self._cond:
+            counters = dict(self._counters)
+            wait_count = counters['wait_count']
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': counters['checkouts'],
+                'timeouts': counters['timeouts'],
+                'connections_created': counters['connections_created'],
+                'connections_recycled': counters['connections_recycled'],
+                'health_check_failures': counters['health_check_failures'],
+                'wait_count': wait_count,
+                'wait_time_total_ms': round(counters['wait_time_total'] * 1000, 3),
+                'wait_time_avg_ms': round(counters['wait_time_total'] * 1000 / wait_count, 3) if wait_count else 0.0,
+                'wait_time_max_ms': round(counters['wait_time_max'] * 1000, 3),
+            }
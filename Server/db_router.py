@@ -0,0 +1,85 @@
+import itertools
+import threading
+import time
+
+from psycopg2 import OperationalError
+
+
+class ReplicaRouter:
+    """
+    Routes read-only checkouts across read-replica ConnectionPools.
+
+    - picks the replica with the fewest connections in use, rotating
+      round-robin between equally loaded ones (``strategy='round_robin'``
+      ignores load)
+    - a replica whose checkout fails (unreachable, or its pool timed out) is
+      skipped for ``retry_after`` seconds and the next one is tried
+    - with no usable replica, reads fall back to the primary pool
+    """
+
+    STRATEGIES = ('least_loaded', 'round_robin')
+
+    def __init__(self, primary, replicas=(), strategy='least_loaded', retry_after=5.0):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"strategy must be one of {', '.join(self.STRATEGIES)}")
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.strategy = strategy
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+        self._down_until = [0.0] * len(self.replicas)
+        self._counters = {'replica_reads': 0, 'primary_reads': 0, 'failovers': 0}
+
+    def _candidates(self):
+        now = time.monotonic()
+        with self._lock:
+            up = [i for i, until in enumerate(self._down_until) if until <= now]
+        if not up:
+            return []
+        start = next(self._turn) % len(up)
+        ordered = up[start:] + up[:start]
+        if self.strategy == 'least_loaded':
+            # sorted() is stable, so ties keep their round-robin order.
+            ordered.sort(key=lambda i: self.replicas[i].stats()['in_use'])
+        return ordered
+
+    def _count(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+    def getconn(self, primary=False):
+        """
+        Check out a connection for reads: a healthy replica, else (or with
+        ``primary=True``) the primary.
+        """
+        for i in ([] if primary else self._candidates()):
+            try:
+                conn = self.replicas[i].getconn()
+            except OperationalError:
+                with self._lock:
+                    self._down_until[i] = time.monotonic() + self.retry_after
+                    self._counters['failovers'] += 1
+                continue
+            self._count('replica_reads')
+            return conn
+        self._count('primary_reads')
+        return self.primary.getconn()
+
+    def closeall(self):
+        for pool in self.replicas:
+            pool.closeall()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            counters = dict(self._counters)
+            down = list(self._down_until)
+        return {
+            'strategy': self.strategy,
+            **counters,
+            'replicas': [
+                {'up': until <= now, 'in_use': pool.stats()['in_use'], 'checkouts': pool.stats()['checkouts']}
+                for pool, until in zip(self.replicas, down)
+            ],
+        }
@@ -0,0 +1,77 @@
+"""
+Fast JSON provider for the Book API.
+
+Book rows carry ``Decimal`` cost and ``date`` values that the stock Flask
+provider routes through its per-object ``default()`` fallback. This provider
+handles them up front (dates as ISO-8601, decimals as strings) and uses
+orjson when it is installed, falling back to the standard library otherwise.
+"""
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime, time
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+def json_default(value):
+    """Encode the non-JSON types that come back from psycopg2/asyncpg."""
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def fetch_dicts(cursor, rows=None):
+    """
+    Rows from a plain (tuple) cursor as dicts. Column names are read once per
+    result set instead of per row as RealDictCursor does.
+    """
+    if rows is None:
+        rows = cursor.fetchall()
+    columns = [column.name for column in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+class FastJSONMixin:
+    """dumps/loads/response overrides shared by the Flask and Quart providers."""
+
+    def dumps_bytes(self, obj):
+        if orjson is not None:
+            # orjson natively encodes date/datetime as ISO-8601; Decimal goes to json_default.
+            return orjson.dumps(obj, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(obj, default=json_default, separators=(',', ':'),
+                          ensure_ascii=False).encode()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault('default', json_default)
+            return json.dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        # Skip the str round-trip: hand the encoded bytes straight to the response.
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
+
+
+class FastJSONProvider(FastJSONMixin, DefaultJSONProvider):
+    pass
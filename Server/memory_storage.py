@@ -0,0 +1,438 @@
+"""
+In-process storage engine: the book catalog in plain Python structures.
+
+Rows are __slots__ objects in a primary-key dict. Ids only grow, so an array
+of ids kept sorted with bisect serves id order and keyset pages by id;
+publisher, name, date and cost each keep a sorted list of (value, id) pairs
+for the other sort orders and for range filters. A (name, publisher) dict
+enforces the unique key, and a (publisher, year) rollup answers /stats the
+way the book_stats table does.
+
+Write sessions keep an undo log and replay it if the block raises, so a
+failed request leaves nothing behind, as a rolled-back transaction would.
+One lock serializes sessions. Text sorts by code point (like the C
+collation). The data lives in this process only: serve it with one worker.
+"""
+import math
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from itertools import islice
+from operator import attrgetter
+
+from book_queries import BOOK_FIELDS, COLUMNS
+from storage import IDEMPOTENCY_PRUNE_INTERVAL, ConstraintViolation, DuplicateBook, InvalidValue
+
+INDEXED_COLUMNS = ('publisher', 'name', 'date', 'cost')
+CENTS = Decimal('0.01')
+_row_values = attrgetter(*COLUMNS)
+
+
+class Book:
+    __slots__ = COLUMNS
+
+    def __init__(self, id, publisher, name, date, cost, version=1):
+        self.id = id
+        self.publisher = publisher
+        self.name = name
+        self.date = date
+        self.cost = cost
+        self.version = version
+
+
+def _as_dict(row):
+    return dict(zip(COLUMNS, _row_values(row)))
+
+
+# --- Column values ---
+# Accept what the Postgres columns accept from the routes and raise
+# InvalidValue (the DataError of this backend) for the rest. A missing value
+# breaks NOT NULL, a ConstraintViolation as in Postgres. Unlike numeric,
+# cost rejects NaN and Infinity: they have no place in the sorted indexes.
+def _text(column, value):
+    if value is None:
+        raise ConstraintViolation(f'null value in column "{column}" violates not-null constraint')
+    return str(value)
+
+
+def _date(column, value):
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").date()
+    except ValueError:
+        raise InvalidValue(f'invalid input syntax for type date: "{value}"')
+
+
+def _numeric(column, value):
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise InvalidValue(f'invalid input syntax for type numeric: "{value}"')
+    if not number.is_finite():
+        raise InvalidValue(f'{column} must be a finite number')
+    # Plain notation, as numeric stores it: 1e2 -> 100, 1e-7 -> 0.0000001.
+    return Decimal(format(number, 'f'))
+
+
+COERCE = {'publisher': _text, 'name': _text, 'date': _date, 'cost': _numeric}
+
+
+def _coerce(column, value):
+    return COERCE[column](column, value)
+
+
+def _book_values(values):
+    """(publisher, name, date, cost) in BOOK_FIELDS order, coerced."""
+    return tuple(_coerce(field, value) for field, value in zip(BOOK_FIELDS, values))
+
+
+def _average(total, count):
+    return (total / count).quantize(CENTS, ROUND_HALF_UP)
+
+
+class MemoryStorage:
+    """
+    Storage backend holding every book in this process. read() and write()
+    yield the storage itself: the methods below are its session interface
+    (see storage.PostgresBooks) and expect the lock held.
+    """
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._ids = array('q')
+        self._indexes = {column: [] for column in INDEXED_COLUMNS}
+        self._keys = {}
+        self._rollup = {}
+        self._next_id = 1
+        self._idempotency = {}
+        self._idempotency_pruned_at = 0.0
+        self._undo = None
+
+    @contextmanager
+    def read(self):
+        with self._lock:
+            yield self
+
+    @contextmanager
+    def write(self):
+        with self._lock:
+            if self._undo is not None:
+                # Nested in a write session of this thread: part of that one.
+                yield self
+                return
+            self._undo = []
+            try:
+                yield self
+            except BaseException:
+                undo, self._undo = self._undo, None
+                for step in reversed(undo):
+                    step()
+                raise
+            finally:
+                self._undo = None
+
+    def export(self, batch_size):
+        with self._lock:
+            rows = [_row_values(self._rows[book_id]) for book_id in self._ids]
+        return (rows[start:start + batch_size] for start in range(0, len(rows), batch_size))
+
+    # --- Primitive changes (undo-logged) ---
+    def _log(self, step):
+        if self._undo is not None:
+            self._undo.append(step)
+
+    def _count(self, row, sign):
+        key = (row.publisher, row.date.year)
+        entry = self._rollup.get(key)
+        if entry is None:
+            entry = self._rollup[key] = [0, Decimal(0)]
+        entry[0] += sign
+        entry[1] += sign * row.cost
+        if entry[0] <= 0:
+            del self._rollup[key]
+
+    def _add(self, row):
+        self._rows[row.id] = row
+        ids = self._ids
+        if not ids or row.id > ids[-1]:
+            ids.append(row.id)
+        else:
+            ids.insert(bisect_left(ids, row.id), row.id)
+        for column, index in self._indexes.items():
+            insort(index, (getattr(row, column), row.id))
+        self._keys[row.name, row.publisher] = row.id
+        self._count(row, 1)
+        self._log(lambda: self._remove(row))
+
+    def _remove(self, row):
+        del self._rows[row.id]
+        del self._ids[bisect_left(self._ids, row.id)]
+        for column, index in self._indexes.items():
+            del index[bisect_left(index, (getattr(row, column), row.id))]
+        del self._keys[row.name, row.publisher]
+        self._count(row, -1)
+        self._log(lambda: self._add(row))
+
+    def _change(self, row, values):
+        """Set columns of a stored row, keeping indexes, key and rollup in step."""
+        old = {column: getattr(row, column) for column in values}
+        owner = self._keys.get((values.get('name', row.name), values.get('publisher', row.publisher)))
+        if owner is not None and owner != row.id:
+            raise DuplicateBook("duplicate key value violates unique constraint \"book_name_publisher_key\"")
+        self._count(row, -1)
+        del self._keys[row.name, row.publisher]
+        for column, value in values.items():
+            index = self._indexes.get(column)
+            if index is not None:
+                del index[bisect_left(index, (getattr(row, column), row.id))]
+                insort(index, (value, row.id))
+            setattr(row, column, value)
+        self._keys[row.name, row.publisher] = row.id
+        self._count(row, 1)
+        self._log(lambda: self._change(row, old))
+
+    def _insert(self, values):
+        publisher, name, published, cost = values
+        if (name, publisher) in self._keys:
+            raise DuplicateBook("duplicate key value violates unique constraint \"book_name_publisher_key\"")
+        row = Book(self._next_id, publisher, name, published, cost)
+        self._next_id += 1
+        self._add(row)
+        return row
+
+    # --- Reads ---
+    def all_books(self, columns=None):
+        rows = self._rows
+        if columns is None:
+            return [_as_dict(rows[book_id]) for book_id in self._ids]
+        values = attrgetter(*columns)
+        if len(columns) == 1:
+            return [{columns[0]: values(rows[book_id])} for book_id in self._ids]
+        return [dict(zip(columns, values(rows[book_id]))) for book_id in self._ids]
+
+    def get_book(self, book_id):
+        row = self._rows.get(book_id)
+        return None if row is None else _as_dict(row)
+
+    def get_books(self, ids):
+        rows = self._rows
+        return [_as_dict(rows[book_id]) for book_id in dict.fromkeys(ids) if book_id in rows]
+
+    def find_book(self, name, publisher):
+        book_id = self._keys.get((name, publisher))
+        return None if book_id is None else _as_dict(self._rows[book_id])
+
+    def list_books(self, query):
+        matches = self._matcher(query)
+        page = islice((row for row in self._scan(query) if matches(row)), query.limit + 1)
+        return [_as_dict(row) for row in page]
+
+    def _matcher(self, query):
+        publishers = set(query.publishers) or None
+        date_from, date_to = query.date_from, query.date_to
+        cost_min = None if query.cost_min is None else _numeric('cost', query.cost_min)
+        cost_max = None if query.cost_max is None else _numeric('cost', query.cost_max)
+
+        def matches(row):
+            return ((publishers is None or row.publisher in publishers)
+                    and (date_from is None or row.date >= date_from)
+                    and (date_to is None or row.date <= date_to)
+                    and (cost_min is None or row.cost >= cost_min)
+                    and (cost_max is None or row.cost <= cost_max))
+        return matches
+
+    def _ranges(self, column, query):
+        """Slices of the column's index that can hold matching rows, or None if unfiltered."""
+        index = self._indexes[column]
+        if column == 'publisher':
+            if not query.publishers:
+                return None
+            return [(bisect_left(index, (publisher,)), bisect_left(index, (publisher, math.inf)))
+                    for publisher in sorted(set(query.publishers))]
+        low, high = {'date': (query.date_from, query.date_to),
+                     'cost': (query.cost_min, query.cost_max)}.get(column, (None, None))
+        if low is None and high is None:
+            return None
+        start = 0 if low is None else bisect_left(index, (_coerce(column, low),))
+        stop = len(index) if high is None else bisect_left(index, (_coerce(column, high), math.inf))
+        return [(start, max(start, stop))]
+
+    def _scan(self, query):
+        """Candidate rows in the query's order, starting after its cursor."""
+        sort, descending = query.sort, query.order == 'desc'
+        after = None
+        if query.after is not None:
+            value, last_id = query.after
+            after = (last_id,) if sort == 'id' else (_coerce(sort, value), last_id)
+
+        # Walking the sort order visits about (limit + 1) * n / size rows before
+        # the page fills, where size is what a filter leaves; collecting and
+        # sorting that filter's index range costs about size. Pick the cheaper.
+        total = len(self._rows)
+        best = None
+        for column in INDEXED_COLUMNS:
+            ranges = self._ranges(column, query) if column != sort else None
+            if ranges is not None:
+                size = sum(stop - start for start, stop in ranges)
+                if best is None or size < best[0]:
+                    best = (size, column, ranges)
+        if best is not None and best[0] * best[0] < (query.limit + 1) * total:
+            _, column, ranges = best
+            index, rows = self._indexes[column], self._rows
+            key = (lambda row: (row.id,)) if sort == 'id' else (lambda row: (getattr(row, sort), row.id))
+            candidates = sorted((rows[index[i][1]] for start, stop in ranges for i in range(start, stop)),
+                                key=key, reverse=descending)
+            if after is not None:
+                candidates = [row for row in candidates if (key(row) < after if descending else key(row) > after)]
+            return candidates
+
+        rows = self._rows
+        if sort == 'id':
+            ids = self._ids
+            if descending:
+                stop = len(ids) if after is None else bisect_left(ids, after[0])
+                return (rows[ids[i]] for i in range(stop - 1, -1, -1))
+            start = 0 if after is None else bisect_right(ids, after[0])
+            return (rows[ids[i]] for i in range(start, len(ids)))
+        index = self._indexes[sort]
+        ranges = self._ranges(sort, query)
+        start, stop = ranges[0] if ranges is not None and len(ranges) == 1 else (0, len(index))
+        if descending:
+            if after is not None:
+                stop = min(stop, bisect_left(index, after))
+            return (rows[index[i][1]] for i in range(stop - 1, start - 1, -1))
+        if after is not None:
+            start = max(start, bisect_right(index, after))
+        return (rows[index[i][1]] for i in range(start, stop))
+
+    def stats(self):
+        count = sum(entry[0] for entry in self._rollup.values())
+        total = sum((entry[1] for entry in self._rollup.values()), Decimal(0))
+        years = [year for _, year in self._rollup]
+        return {
+            "book_count": count,
+            "publisher_count": len({publisher for publisher, _ in self._rollup}),
+            "total_cost": total,
+            "average_cost": _average(total, count) if count else None,
+            "first_year": min(years, default=None),
+            "last_year": max(years, default=None),
+        }
+
+    def publisher_stats(self):
+        publishers = {}
+        for (publisher, year), (count, total) in self._rollup.items():
+            entry = publishers.setdefault(publisher, [0, Decimal(0), year, year])
+            entry[0] += count
+            entry[1] += total
+            entry[2] = min(entry[2], year)
+            entry[3] = max(entry[3], year)
+        result = [{"publisher": publisher, "book_count": count, "average_cost": _average(total, count),
+                   "first_year": first, "last_year": last}
+                  for publisher, (count, total, first, last) in publishers.items()]
+        return sorted(result, key=lambda row: (-row["book_count"], row["publisher"]))
+
+    def yearly_stats(self, publishers=None):
+        wanted = set(publishers) if publishers else None
+        return [{"publisher": publisher, "year": year, "book_count": count,
+                 "average_cost": _average(total, count)}
+                for (publisher, year), (count, total) in sorted(self._rollup.items())
+                if wanted is None or publisher in wanted]
+
+    # --- Writes ---
+    def insert_book(self, book, on_conflict='error'):
+        values = _book_values(book[field] for field in BOOK_FIELDS)
+        book_id = self._keys.get((values[1], values[0]))
+        if book_id is None:
+            return _as_dict(self._insert(values)), True
+        row = self._rows[book_id]
+        if on_conflict == 'update':
+            self._change(row, {'date': values[2], 'cost': values[3], 'version': row.version + 1})
+        return _as_dict(row), False
+
+    def update_book(self, book_id, changes, versions=None):
+        row = self._rows.get(book_id)
+        if row is None or (versions is not None and row.version not in versions):
+            return None
+        values = {field: _coerce(field, changes[field]) for field in BOOK_FIELDS if field in changes}
+        values['version'] = row.version + 1
+        self._change(row, values)
+        return _as_dict(row)
+
+    def delete_book(self, book_id):
+        row = self._rows.get(book_id)
+        if row is None:
+            return False
+        self._remove(row)
+        return True
+
+    def insert_books(self, books, on_conflict='error'):
+        """(publisher, name, date, cost) rows; returns (id, name, publisher) per row written."""
+        written, seen = [], set()
+        for values in [_book_values(book) for book in books]:
+            key = (values[1], values[0])
+            book_id = self._keys.get(key)
+            if book_id is None or on_conflict == 'error':
+                row = self._insert(values)
+            elif on_conflict == 'ignore':
+                continue
+            elif key in seen:
+                raise DuplicateBook("ON CONFLICT DO UPDATE command cannot affect row a second time")
+            else:
+                row = self._rows[book_id]
+                self._change(row, {'date': values[2], 'cost': values[3], 'version': row.version + 1})
+            seen.add(key)
+            written.append((row.id, row.name, row.publisher))
+        return written
+
+    def update_books(self, rows):
+        """Apply (id, publisher, name, date, cost) rows; returns the ids that exist."""
+        updated = set()
+        for book_id, *values in rows:
+            row = self._rows.get(book_id)
+            if row is None:
+                continue
+            changes = dict(zip(BOOK_FIELDS, _book_values(values)))
+            changes['version'] = row.version + 1
+            self._change(row, changes)
+            updated.add(book_id)
+        return updated
+
+    def delete_books(self, ids):
+        deleted = set()
+        for book_id in ids:
+            row = self._rows.get(book_id)
+            if row is not None:
+                self._remove(row)
+                deleted.add(book_id)
+        return deleted
+
+    # --- Idempotency keys ---
+    def claim_idempotency_key(self, key, fingerprint, ttl):
+        now = time.monotonic()
+        if now - self._idempotency_pruned_at > IDEMPOTENCY_PRUNE_INTERVAL:
+            self._idempotency_pruned_at = now
+            expired = [stored for stored, entry in self._idempotency.items() if now - entry[3] > ttl]
+        else:
+            entry = self._idempotency.get(key)
+            expired = [key] if entry is not None and now - entry[3] > ttl else []
+        for stored in expired:
+            del self._idempotency[stored]
+        entry = self._idempotency.get(key)
+        if entry is not None:
+            return tuple(entry[:3])
+        self._idempotency[key] = [fingerprint, None, None, now]
+        self._log(lambda: self._idempotency.pop(key, None))
+        return None
+
+    def store_idempotent_response(self, key, status_code, body):
+        entry = self._idempotency[key]
+        previous = entry[1:3]
+        entry[1:3] = [status_code, body]
+        self._log(lambda: entry.__setitem__(slice(1, 3), previous))
@@ -0,0 +1,246 @@
+"""
+Opt-in request and SQL instrumentation with a Prometheus text /metrics endpoint.
+
+Enabled with METRICS_ENABLED=1. Every request is timed end to end and split
+into phases:
+
+- connect:   checking a connection out of the pool
+- query:     cursor.execute() round trips
+- fetch:     fetchone/fetchmany/fetchall
+- serialize: JSON encoding of the response
+
+Queries and rows are counted per route, and statements slower than
+SLOW_QUERY_MS are logged with their SQL (for a prepared statement, its SQL
+followed by the EXECUTE and its parameters). Recording is a few perf_counter()
+calls and dict updates per request, cheap enough to leave on in production.
+"""
+import logging
+import re
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+from psycopg2.extensions import cursor as _cursor
+
+import book_queries as queries
+
+logger = logging.getLogger("book_api.sql")
+
+PHASES = ('connect', 'query', 'fetch', 'serialize')
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_LOG_LIMIT = 1000
+_EXECUTE = re.compile(r'EXECUTE (\w+)')
+
+slow_query_threshold = 0.2     # seconds; overridden by instrument()
+
+
+# --- Metric types ---
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name, self.help, self.label_names = name, help_text, label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(zip(self.label_names, label_values))} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help_text, label_names
+        self.buckets = buckets
+        self._series = {}      # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self._series.items())
+        for label_values, series in snapshot:
+            labels = list(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]}")
+        return lines
+
+
+REQUESTS = Counter("book_api_requests_total", "HTTP requests handled.", ('method', 'route', 'status'))
+REQUEST_SECONDS = Histogram("book_api_request_duration_seconds", "End-to-end request latency.", ('method', 'route'))
+PHASE_SECONDS = Histogram("book_api_request_phase_seconds", "Time per request phase.", ('route', 'phase'))
+QUERIES = Counter("book_api_db_queries_total", "SQL statements executed.", ('route',))
+ROWS = Counter("book_api_db_rows_total", "Rows fetched from the database.", ('route',))
+SLOW_QUERIES = Counter("book_api_db_slow_queries_total", "SQL statements slower than the threshold.", ('route',))
+METRICS = (REQUESTS, REQUEST_SECONDS, PHASE_SECONDS, QUERIES, ROWS, SLOW_QUERIES)
+
+
+# --- Per-request recording ---
+class RequestMetrics:
+    __slots__ = ('started', 'phases', 'queries', 'rows')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.rows = 0
+
+
+def _current():
+    if has_request_context():
+        return g.get('_request_metrics')
+    return None
+
+
+def record_phase(phase, seconds):
+    current = _current()
+    if current is not None:
+        current.phases[phase] += seconds
+
+
+def _logged_sql(sql):
+    # "EXECUTE book_by_id (42)" alone does not say what ran.
+    match = _EXECUTE.match(sql)
+    statement = queries.STATEMENTS.get(match.group(1)) if match else None
+    return sql if statement is None else f"{statement.sql} -- {sql}"
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else '<unmatched>'
+
+
+class InstrumentedCursor(_cursor):
+    """psycopg2 cursor that times execute/fetch and counts queries and rows."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            elapsed = time.perf_counter() - started
+            current = _current()
+            if current is not None:
+                current.phases['query'] += elapsed
+                current.queries += 1
+            if elapsed >= slow_query_threshold:
+                route = _route() if has_request_context() else '<none>'
+                SLOW_QUERIES.inc((route,))
+                sql = _logged_sql(self.query.decode(errors='replace') if self.query else str(query))
+                logger.warning("slow query (%.1f ms) on %s: %s", elapsed * 1000, route, sql[:SQL_LOG_LIMIT])
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        result = fetch(*args)
+        current = _current()
+        if current is not None:
+            current.phases['fetch'] += time.perf_counter() - started
+            if isinstance(result, list):
+                current.rows += len(result)
+            elif result is not None:
+                current.rows += 1
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed_fetch(super().fetchmany)
+        return self._timed_fetch(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+# --- Flask wiring ---
+def instrument(app, collectors=(), slow_query_ms=200):
+    """
+    Install the request hooks, time JSON serialization and register /metrics.
+    ``collectors`` are callables returning extra exposition lines (gauges)
+    evaluated at scrape time.
+    """
+    global slow_query_threshold
+    slow_query_threshold = slow_query_ms / 1000.0
+
+    @app.before_request
+    def start_request_metrics():
+        g._request_metrics = RequestMetrics()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        current = g.pop('_request_metrics', None)
+        if current is None:
+            return response
+        elapsed = time.perf_counter() - current.started
+        route = _route()
+        REQUESTS.inc((request.method, route, str(response.status_code)))
+        REQUEST_SECONDS.observe((request.method, route), elapsed)
+        for phase, seconds in current.phases.items():
+            if seconds:
+                PHASE_SECONDS.observe((route, phase), seconds)
+        if current.queries:
+            QUERIES.inc((route,), current.queries)
+        if current.rows:
+            ROWS.inc((route,), current.rows)
+        response.headers['Server-Timing'] = ', '.join(
+            [f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in current.phases.items() if seconds]
+            + [f"total;dur={elapsed * 1000:.2f}"]
+        )
+        return response
+
+    json_response = app.json.response
+
+    def timed_json_response(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return json_response(*args, **kwargs)
+        finally:
+            record_phase('serialize', time.perf_counter() - started)
+
+    app.json.response = timed_json_response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        lines = []
+        for metric in METRICS:
+            lines.extend(metric.expose())
+        for collector in collectors:
+            lines.extend(collector())
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def gauge_lines(name, help_text, value):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
@@ -0,0 +1,126 @@
+import hashlib
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+class CachedResponse:
+    __slots__ = ('body', 'mimetype', 'etag', 'last_modified', 'expires_at', 'encoded')
+
+    def __init__(self, body, mimetype, etag, last_modified, expires_at):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+        self.encoded = {}       # Content-Encoding -> compressed body, filled on demand
+
+
+class ResponseCache:
+    """
+    In-process LRU + TTL cache of serialized GET responses.
+
+    Entries are keyed by request path + query string and dropped all at once by
+    invalidate() whenever a write route commits. Bodies larger than
+    ``max_entry_bytes`` are never cached so one huge listing cannot evict
+    everything else.
+
+    The generation counter lives in shared memory. A cache created before
+    gunicorn forks its workers (serve.py preloads the app) therefore shares
+    it: a write in one worker bumps it, and every other worker drops its
+    entries on its next lookup instead of serving them until the TTL.
+    """
+
+    def __init__(self, max_entries=256, ttl=30.0, max_entry_bytes=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self._entries = OrderedDict()
+        self._generation = multiprocessing.Value('Q', 0)     # bumped by invalidate(), in any process
+        self._seen_generation = 0
+        self._invalidated_at = multiprocessing.Value('d', 0.0)  # time.time() of the last invalidate()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    @property
+    def generation(self):
+        return self._generation.value
+
+    @property
+    def invalidated_at(self):
+        return self._invalidated_at.value
+
+    def get(self, key):
+        generation = self.generation
+        with self._lock:
+            if generation != self._seen_generation:
+                # Another process (or thread) committed a write since these were stored.
+                self._entries.clear()
+                self._seen_generation = generation
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry
+
+    def set(self, key, body, mimetype, generation=None, etag=None, store=True):
+        """
+        Cache a response body. Pass the ``generation`` read before the body was
+        built: if a write invalidated the cache meanwhile the body may already be
+        stale, so it is returned but not stored. Without an explicit ``etag``
+        one is derived from the body; with ``store=False`` the entry is only
+        built, never stored.
+        """
+        # Last-Modified has one-second resolution in HTTP, so drop microseconds.
+        entry = CachedResponse(
+            body=body,
+            mimetype=mimetype,
+            etag=etag or hashlib.blake2b(body, digest_size=16).hexdigest(),
+            last_modified=datetime.now(timezone.utc).replace(microsecond=0),
+            expires_at=time.monotonic() + self.ttl,
+        )
+        if not store or len(body) > self.max_entry_bytes:
+            return entry
+        with self._lock:
+            current = self.generation
+            if generation is not None and generation != current:
+                return entry
+            if current != self._seen_generation:
+                self._entries.clear()
+                self._seen_generation = current
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+        return entry
+
+    def invalidate(self):
+        with self._generation.get_lock():
+            self._generation.value += 1
+            self._invalidated_at.value = time.time()
+        with self._lock:
+            self._entries.clear()
+            self._counters['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hit_ratio': round(self._counters['hits'] / lookups, 4) if lookups else 0.0,
+            }
@@ -7,7 +7,7 @@ echo "🧪 Running Pytest unit tests..."
 # Check if pytest is available
 if ! command -v pytest &> /dev/null; then
     echo "❌ Error: pytest not found"
-    echo "💡 Install with: pip install pytest pytest-json-report"
+    echo "💡 Install with: pip install pytest pytest-json-report pytest-xdist"
     exit 1
 fi
 
@@ -23,7 +23,9 @@ mkdir -p "$(dirname "$PYTEST_OUTPUT")"
 echo "📝 Generating pytest report to: $PYTEST_OUTPUT"
 cd "$SCRIPT_DIR"
 
+# One worker (and database) per CPU; PYTEST_WORKERS=0 runs serially
 pytest tests/pytest/ -v \
+    -n "${PYTEST_WORKERS:-auto}" \
     --json-report \
     --json-report-file="$PYTEST_OUTPUT" \
     --tb=short
@@ -0,0 +1,162 @@
+"""
+Generate and bulk-load synthetic books for production-scale testing.
+
+    python seed_books.py --rows 5000000 --workers 4
+    python seed_books.py --rows 100000 --seed 7 --truncate --dsn "host=localhost dbname=demo_flask user=postgres"
+
+Rows are produced in batches of --batch-size and streamed with
+COPY FROM STDIN, so memory stays bounded by one batch per loader. Every batch
+draws from its own RNG derived from (--seed, batch number), so the data set
+depends only on --seed, --rows and --batch-size, not on --workers.
+Publishers follow a Zipf-like distribution, publication dates lean recent and
+costs are log-normal. Names carry a running number so (name, publisher) stays
+unique; load into an empty table (--truncate) when reusing a seed.
+
+The change-log trigger stays on, so every loaded book also gets an 'insert'
+row in book_change (and reaches GET /changes). --truncate empties book_change
+along with book: TRUNCATE logs nothing, and ids restart, so old entries would
+describe rows that no longer exist. Change-feed consumers resync from the
+start afterwards.
+"""
+import argparse
+import functools
+import io
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import Playwright_Test_data as seeding
+
+COPY_BOOKS = "COPY book (name, publisher, date, cost) FROM STDIN"
+DEFAULT_BATCH_SIZE = 50000
+
+ADJECTIVES = ["Silent", "Crimson", "Hidden", "Broken", "Golden", "Last", "Distant", "Quiet", "Wild",
+              "Forgotten", "Burning", "Northern", "Practical", "Modern", "Complete", "Little", "Endless"]
+NOUNS = ["Garden", "Empire", "River", "Winter", "Harbor", "Lantern", "Voyage", "Orchard", "Kingdom",
+         "Machine", "Algorithm", "Atlas", "Shadow", "Meridian", "Archive", "Compass", "Signal", "Python"]
+SUBJECTS = ["Databases", "Flask", "Cooking", "Gardening", "Statistics", "Design", "History", "Chess",
+            "Networking", "Photography", "Philosophy", "Economics"]
+TITLE_PATTERNS = [
+    lambda rng: f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}",
+    lambda rng: f"{rng.choice(NOUNS)} of the {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}",
+    lambda rng: f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}s",
+    lambda rng: f"{rng.choice(['Learning', 'Mastering', 'Practical', 'Introducing'])} {rng.choice(SUBJECTS)}",
+]
+PUBLISHER_WORDS = ["Harbor", "Meridian", "Oak", "Lantern", "Summit", "Riverside", "Beacon", "Granite",
+                   "Willow", "Atlas", "Northwind", "Cobalt", "Juniper", "Falcon", "Sterling", "Ember"]
+PUBLISHER_SUFFIXES = ["Press", "Books", "House", "Publishing", "Media", "& Sons", "Editions"]
+
+FIRST_YEAR, LAST_YEAR = 1950, 2025
+
+
+def make_publishers(count, seed):
+    names = [f"{word} {suffix}" for word, suffix in itertools.product(PUBLISHER_WORDS, PUBLISHER_SUFFIXES)]
+    random.Random(seed).shuffle(names)
+    return [names[i % len(names)] + (f" {i // len(names) + 1}" if i >= len(names) else "") for i in range(count)]
+
+
+def publisher_weights(count, skew=1.1):
+    # Cumulative Zipf weights: a few big publishers, a long tail of small ones
+    return list(itertools.accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def generate_batch(seed, batch, batch_size, rows, publishers, cum_weights):
+    """COPY text for batch number `batch` (rows batch*batch_size onwards)."""
+    start = batch * batch_size
+    count = min(batch_size, rows - start)
+    rng = random.Random(seed * 1_000_003 + batch)
+    out = io.StringIO()
+    for i, publisher in enumerate(rng.choices(publishers, cum_weights=cum_weights, k=count), start + 1):
+        year = max(FIRST_YEAR, LAST_YEAR - int(rng.expovariate(1 / 12)))
+        published = date(year, 1, 1) + timedelta(days=rng.randrange(365))
+        cost = min(round(rng.lognormvariate(3.2, 0.6), 2), 99999999.99)
+        out.write(f"{rng.choice(TITLE_PATTERNS)(rng)} ({i})\t{publisher}\t{published.isoformat()}\t{cost:.2f}\n")
+    out.seek(0)
+    return out, count
+
+
+def load_batch(batch, config, seed, batch_size, rows, publishers, cum_weights):
+    """Generate one batch and COPY it in its own transaction; returns rows loaded."""
+    data, count = generate_batch(seed, batch, batch_size, rows, publishers, cum_weights)
+    conn = seeding.connect_with_retry(config)
+    try:
+        with conn.cursor() as cur:
+            cur.copy_expert(COPY_BOOKS, data)
+        conn.commit()
+    finally:
+        conn.close()
+    return count
+
+
+def prepare(config, truncate):
+    conn = seeding.connect_with_retry(config)
+    try:
+        with conn.cursor() as cur:
+            seeding.create_schema(cur)
+            if truncate:
+                # TRUNCATE skips the write triggers, so reset the change log and
+                # the stats rollup alongside.
+                cur.execute("TRUNCATE book, book_change RESTART IDENTITY")
+                seeding.rebuild_stats_rollup(cur)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def analyze(config):
+    conn = seeding.connect_with_retry(config)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE book")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="parallel loader processes")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per COPY")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed; same seed, same rows")
+    parser.add_argument("--publishers", type=int, default=500)
+    parser.add_argument("--truncate", action="store_true", help="empty the book table first")
+    parser.add_argument("--dsn", help="libpq connection string (default: Playwright_Test_data.db_config)")
+    args = parser.parse_args()
+
+    config = {"dsn": args.dsn} if args.dsn else seeding.db_config
+    publishers = make_publishers(args.publishers, args.seed)
+    cum_weights = publisher_weights(args.publishers)
+    batches = range((args.rows + args.batch_size - 1) // args.batch_size)
+
+    prepare(config, args.truncate)
+    print(f"🌱 Loading {args.rows:,} books in {len(batches)} batches with {args.workers} worker(s)...")
+    started = time.perf_counter()
+    loaded = 0
+
+    def report(count):
+        nonlocal loaded
+        loaded += count
+        elapsed = time.perf_counter() - started
+        print(f"   {loaded:>12,} rows  {loaded / elapsed:>10,.0f} rows/s")
+
+    load = functools.partial(load_batch, config=config, seed=args.seed, batch_size=args.batch_size,
+                             rows=args.rows, publishers=publishers, cum_weights=cum_weights)
+    if args.workers <= 1:
+        for batch in batches:
+            report(load(batch))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for future in as_completed([pool.submit(load, batch) for batch in batches]):
+                report(future.result())
+
+    elapsed = time.perf_counter() - started
+    analyze(config)
+    print(f"✅ Loaded {loaded:,} books in {elapsed:.1f}s ({loaded / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Production launcher for the Book API.
+
+Runs app.py under gunicorn with N preforked worker processes (default: one
+per CPU core), each serving requests on a pool of threads:
+
+    python serve.py --bind 0.0.0.0:5000 --workers 4 --threads 8
+
+The app is imported once in the master and forked; every worker then builds
+its own connection pool in post_fork, so no psycopg2 connection is ever
+shared between processes. The response cache's invalidation counter, on the
+other hand, is created at import and so is shared: a write in any worker
+invalidates the cached GET responses of all of them. On SIGTERM/SIGINT workers stop accepting new
+connections and finish in-flight requests for up to --graceful-timeout
+seconds before exiting. Load balancers should probe GET /health.
+
+With STORAGE_BACKEND=memory the catalog lives in the process, so a second
+worker would hold a second, diverging catalog: the server then runs one
+worker and scales with --threads only.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+import app as book_api
+
+
+class BookAPIServer(BaseApplication):
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def post_fork(server, worker):
+    # Fresh pool per worker, warmed up before the worker accepts traffic.
+    if book_api.storage.name != 'postgres':
+        return
+    try:
+        book_api.init_pool(prefill=True)
+    except book_api.OperationalError as e:
+        # Stay up; /health reports 503 until the database is reachable.
+        worker.log.warning("worker %s could not prefill its DB pool: %s", worker.pid, e)
+    # Its thread also prunes the change log, so start it even without streams.
+    book_api.get_change_listener()
+
+
+def worker_exit(server, worker):
+    book_api.close_pool()
+
+
+def build_options(args):
+    workers = args.workers
+    if book_api.storage.name == 'memory' and workers != 1:
+        print(f"STORAGE_BACKEND=memory keeps the catalog in one process: "
+              f"running 1 worker instead of {workers} (use --threads to scale)", file=sys.stderr)
+        workers = 1
+    # Every thread may hold a connection, so size the pool to the thread count
+    # unless DB_POOL_MAX was set explicitly.
+    if 'DB_POOL_MAX' not in os.environ:
+        book_api.pool_config['maxconn'] = max(args.threads, book_api.pool_config['minconn'])
+    return {
+        'bind': args.bind,
+        'workers': workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': 5,
+        'accesslog': '-',
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Book API with preforked gunicorn workers.")
+    parser.add_argument("--bind", default=os.environ.get("BIND", "0.0.0.0:5000"))
+    parser.add_argument("--workers", type=int,
+                        default=int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count())))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("WEB_THREADS", 4)))
+    parser.add_argument("--timeout", type=int, default=30,
+                        help="seconds before a stuck worker is killed and replaced")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="seconds to drain in-flight requests on shutdown")
+    args = parser.parse_args()
+
+    BookAPIServer(book_api.app, build_options(args)).run()
+
+
+if __name__ == "__main__":
+    main()
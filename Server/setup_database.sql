@@ -13,9 +13,114 @@ CREATE TABLE book (
     publisher VARCHAR(255) NOT NULL,
     name VARCHAR(255) NOT NULL,
     date DATE NOT NULL,
-    cost DECIMAL(10, 2) NOT NULL
+    cost DECIMAL(10, 2) NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1  -- bumped on every update; served as the ETag
 );
 
+-- One row per (name, publisher): the conflict target for POST /create upserts
+CREATE UNIQUE INDEX book_name_publisher_key ON book (name, publisher);
+
+-- Stored responses for POST /create calls made with an Idempotency-Key header
+CREATE TABLE idempotency_key (
+    key TEXT PRIMARY KEY,
+    request_hash TEXT NOT NULL,
+    status_code INTEGER,
+    response JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX idempotency_key_created_at_idx ON idempotency_key (created_at);
+
+-- Indexes backing keyset pagination, filtering and sorting on GET /books
+CREATE INDEX book_publisher_id_idx ON book (publisher, id);
+CREATE INDEX book_date_id_idx ON book (date, id);
+CREATE INDEX book_cost_id_idx ON book (cost, id);
+CREATE INDEX book_name_id_idx ON book (name, id);
+
+-- Full-text document for GET /search (name weighted above publisher)
+ALTER TABLE book ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', name), 'A') ||
+        setweight(to_tsvector('english', publisher), 'B')
+    ) STORED;
+CREATE INDEX book_search_idx ON book USING GIN (search_vector);
+
+-- Typo-tolerant search (optional: requires the pg_trgm contrib extension)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX book_name_trgm_idx ON book USING GIN (name gin_trgm_ops);
+CREATE INDEX book_publisher_trgm_idx ON book USING GIN (publisher gin_trgm_ops);
+
+-- Per-(publisher, year) rollup behind GET /stats, maintained by statement-level triggers
+CREATE TABLE book_stats (
+    publisher TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    book_count BIGINT NOT NULL,
+    total_cost NUMERIC NOT NULL,
+    PRIMARY KEY (publisher, year)
+);
+CREATE INDEX book_stats_empty_idx ON book_stats (book_count) WHERE book_count <= 0;
+
+CREATE FUNCTION book_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE book_stats s
+        SET book_count = s.book_count - delta.book_count,
+            total_cost = s.total_cost - delta.total_cost
+        FROM (
+            SELECT publisher, extract(year FROM date)::int AS year,
+                   count(*) AS book_count, sum(cost) AS total_cost
+            FROM old_rows GROUP BY 1, 2
+        ) AS delta
+        WHERE s.publisher = delta.publisher AND s.year = delta.year;
+        DELETE FROM book_stats WHERE book_count <= 0;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO book_stats AS s (publisher, year, book_count, total_cost)
+        SELECT publisher, extract(year FROM date)::int, count(*), sum(cost)
+        FROM new_rows GROUP BY 1, 2
+        ON CONFLICT (publisher, year) DO UPDATE
+        SET book_count = s.book_count + EXCLUDED.book_count,
+            total_cost = s.total_cost + EXCLUDED.total_cost;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER book_stats_insert AFTER INSERT ON book
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION book_stats_apply();
+CREATE TRIGGER book_stats_update AFTER UPDATE ON book
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION book_stats_apply();
+CREATE TRIGGER book_stats_delete AFTER DELETE ON book
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION book_stats_apply();
+
+-- Change log behind GET /changes and the SSE stream, written in each writing transaction
+CREATE TABLE book_change (
+    seq BIGSERIAL,
+    txid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    book_id INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (txid, seq)
+);
+
+CREATE FUNCTION book_change_log() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO book_change (book_id, op) SELECT id, 'delete' FROM old_rows ORDER BY id;
+    ELSE
+        INSERT INTO book_change (book_id, op) SELECT id, lower(TG_OP) FROM new_rows ORDER BY id;
+    END IF;
+    PERFORM pg_notify('book_changes', '');
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER book_change_insert AFTER INSERT ON book
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION book_change_log();
+CREATE TRIGGER book_change_update AFTER UPDATE ON book
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION book_change_log();
+CREATE TRIGGER book_change_delete AFTER DELETE ON book
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION book_change_log();
+
 -- Insert sample data for testing
 INSERT INTO book (publisher, name, date, cost) VALUES
 ('Penguin Random House', 'Python Crash Course', '2023-01-15', 299.99),
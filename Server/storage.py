@@ -0,0 +1,202 @@
+"""
+Storage backends behind the book routes.
+
+Routes open a session on the configured backend instead of using a psycopg2
+connection directly:
+
+    with storage.read() as books:       # may be served by a read replica
+        book = books.get_book(book_id)
+    with storage.write() as books:      # committed when the block exits cleanly
+        row, created = books.insert_book(payload, on_conflict)
+
+PostgresStorage binds book_queries to pooled connections; MemoryStorage
+(memory_storage.py) keeps the catalog in process. Sessions of both expose the
+same methods and return the same rows: dicts with COLUMNS keys, ``date`` as a
+datetime.date and ``cost`` as a Decimal. Full-text search and the change feed
+are built on Postgres features and stay outside this interface.
+"""
+import json
+import time
+from contextlib import contextmanager
+
+import book_queries as queries
+from json_provider import json_default
+
+# Expired idempotency keys are swept from the whole table at most this often (seconds).
+IDEMPOTENCY_PRUNE_INTERVAL = 60
+
+
+class StorageError(Exception):
+    """Base for errors a backend raises where Postgres would raise a psycopg2 error."""
+
+
+class ConstraintViolation(StorageError):
+    """A write breaks a table constraint (the IntegrityError of a backend)."""
+
+
+class DuplicateBook(ConstraintViolation):
+    """A write would create a second book with the same (name, publisher)."""
+
+
+class InvalidValue(StorageError):
+    """A value does not fit its column (e.g. a date that is not YYYY-MM-DD)."""
+
+
+class ListQuery:
+    """
+    Parsed /books parameters. ``publishers`` is a tuple (empty for all);
+    ``after`` is the (sort value, id) pair from the cursor, or None.
+    """
+    __slots__ = ('limit', 'sort', 'order', 'fields', 'publishers',
+                 'date_from', 'date_to', 'cost_min', 'cost_max', 'after')
+
+    def __init__(self, limit, sort='id', order='asc', fields=None, publishers=(),
+                 date_from=None, date_to=None, cost_min=None, cost_max=None, after=None):
+        self.limit = limit
+        self.sort = sort
+        self.order = order
+        self.fields = fields
+        self.publishers = tuple(publishers)
+        self.date_from = date_from
+        self.date_to = date_to
+        self.cost_min = cost_min
+        self.cost_max = cost_max
+        self.after = after
+
+
+class PostgresBooks:
+    """A Postgres session: book_queries bound to one connection's cursor."""
+
+    def __init__(self, storage, cursor):
+        self._storage = storage
+        self.cursor = cursor
+
+    # --- Reads ---
+    def all_books(self, columns=None):
+        return queries.all_books(self.cursor, columns)
+
+    def list_books(self, query):
+        return queries.list_books(self.cursor, query)
+
+    def get_book(self, book_id):
+        return queries.get_book(self.cursor, book_id)
+
+    def get_books(self, ids):
+        return queries.get_books(self.cursor, ids)
+
+    def find_book(self, name, publisher):
+        return queries.find_book(self.cursor, name, publisher)
+
+    def stats(self):
+        return queries.stats(self.cursor)
+
+    def publisher_stats(self):
+        return queries.publisher_stats(self.cursor)
+
+    def yearly_stats(self, publishers=None):
+        return queries.yearly_stats(self.cursor, publishers)
+
+    # --- Writes ---
+    def insert_book(self, book, on_conflict='error'):
+        return queries.insert_book(self.cursor, book, on_conflict)
+
+    def update_book(self, book_id, changes, versions=None):
+        return queries.update_book(self.cursor, book_id, changes, versions)
+
+    def delete_book(self, book_id):
+        return queries.delete_book(self.cursor, book_id)
+
+    def insert_books(self, books, on_conflict='error'):
+        return queries.insert_books(self.cursor, books, on_conflict)
+
+    def update_books(self, rows):
+        return queries.update_books(self.cursor, rows)
+
+    def delete_books(self, ids):
+        return queries.delete_books(self.cursor, ids)
+
+    # --- Idempotency keys ---
+    def claim_idempotency_key(self, key, fingerprint, ttl):
+        """
+        None when this request should do the work, else the stored
+        (request_hash, status_code, body) of the first one.
+        """
+        now = time.monotonic()
+        if now - self._storage.idempotency_pruned_at > IDEMPOTENCY_PRUNE_INTERVAL:
+            self._storage.idempotency_pruned_at = now
+            queries.prune_idempotency_keys(self.cursor, ttl)
+        else:
+            queries.prune_idempotency_keys(self.cursor, ttl, key)
+        return queries.claim_idempotency_key(self.cursor, key, fingerprint)
+
+    def store_idempotent_response(self, key, status_code, body):
+        queries.store_idempotent_response(self.cursor, key, status_code, json.dumps(body, default=json_default))
+
+
+class ExportRows:
+    """
+    The whole table as batches of row tuples (COLUMNS order), fetched from a
+    named cursor so memory stays flat whatever the table size. close() hands
+    the connection back and may be called more than once.
+    """
+
+    def __init__(self, connection, batch_size):
+        self._connection = connection
+        self._batch_size = batch_size
+
+    def __iter__(self):
+        # Each fetchmany() is one FETCH of batch_size rows from the server-side cursor.
+        cursor = self._connection.cursor(name='book_export')
+        cursor.itersize = self._batch_size
+        try:
+            cursor.execute(queries.EXPORT_BOOKS)
+            while True:
+                rows = cursor.fetchmany(self._batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+            self.close()
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            connection.close()
+
+
+class PostgresStorage:
+    """
+    Sessions on pooled connections. ``connect`` and ``connect_read`` return a
+    connection for writes and for reads (which may be a replica); close()
+    hands it back.
+    """
+    name = 'postgres'
+
+    def __init__(self, connect, connect_read):
+        self._connect = connect
+        self._connect_read = connect_read
+        self.idempotency_pruned_at = 0.0
+
+    @contextmanager
+    def read(self):
+        connection = self._connect_read()
+        try:
+            with connection.cursor() as cursor:
+                yield PostgresBooks(self, cursor)
+        finally:
+            connection.close()
+
+    @contextmanager
+    def write(self):
+        connection = self._connect()
+        try:
+            with connection.cursor() as cursor:
+                yield PostgresBooks(self, cursor)
+            connection.commit()
+        finally:
+            connection.close()
+
+    def export(self, batch_size):
+        # The connection is checked out now, so pool exhaustion is a 503, not a broken stream.
+        return ExportRows(self._connect_read(), batch_size)
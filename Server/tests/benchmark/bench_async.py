@@ -0,0 +1,87 @@
+"""
+Sync (Flask) vs async (Quart + asyncpg) serving throughput for GET /.
+
+    python tests/benchmark/bench_async.py --requests 2000 --concurrency 100
+
+Starts app.py on the threaded Werkzeug server and async_app.py under
+hypercorn on local ports, fires the same request load at both and prints
+req/s and latency percentiles.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+SERVERS = {
+    "sync (Flask threaded)": [
+        sys.executable, "-c",
+        "from app import app; app.run(port={port}, threaded=True)",
+    ],
+    "async (Quart + asyncpg)": [
+        sys.executable, "-m", "hypercorn", "async_app:app", "--bind", "127.0.0.1:{port}",
+    ],
+}
+
+
+def wait_ready(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not come up")
+
+
+def fetch(url):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=30) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def run_load(url, requests, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(fetch, [url] * requests))
+    elapsed = time.perf_counter() - started
+    quantiles = statistics.quantiles(latencies, n=100)
+    return requests / elapsed, quantiles[49] * 1000, quantiles[94] * 1000, quantiles[98] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--port", type=int, default=5101)
+    args = parser.parse_args()
+
+    print(f"{args.requests} x GET / at concurrency {args.concurrency}")
+    print(f"  {'server':<26} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for offset, (label, command) in enumerate(SERVERS.items()):
+        port = args.port + offset
+        process = subprocess.Popen(
+            [part.format(port=port) for part in command],
+            cwd=SERVER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            url = f"http://127.0.0.1:{port}/"
+            wait_ready(url)
+            run_load(url, min(args.requests, 100), args.concurrency)  # warm up pools
+            rps, p50, p95, p99 = run_load(url, args.requests, args.concurrency)
+            print(f"  {label:<26} {rps:9.0f} {p50:9.1f} {p95:9.1f} {p99:9.1f}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Per-row vs bulk write throughput, measured in-process through the Flask test client.
+
+    python tests/benchmark/bench_bulk.py --rows 5000
+
+Every row is tagged with a dedicated publisher and removed afterwards.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app import app, get_db_connection
+
+BENCH_PUBLISHER = "BenchBulkPub"
+
+
+def make_books(count):
+    return [
+        {"publisher": BENCH_PUBLISHER, "name": f"Bench Book {i}", "date": "2024-01-01", "cost": 10 + i % 90}
+        for i in range(count)
+    ]
+
+
+def bench_ids():
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM book WHERE publisher = %s ORDER BY id", (BENCH_PUBLISHER,))
+            return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def cleanup():
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM book WHERE publisher = %s", (BENCH_PUBLISHER,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def timed(label, rows, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<22} {elapsed:8.3f}s  {rows / elapsed:10.0f} rows/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    books = make_books(args.rows)
+    cleanup()
+    try:
+        print(f"Per-row path ({args.rows} rows):")
+        per_row = timed("POST /create", args.rows,
+                        lambda: [client.post("/create", json=book) for book in books])
+        ids = bench_ids()
+        updates = [dict(book, id=book_id, cost=99) for book, book_id in zip(books, ids)]
+        per_row_update = timed("PUT /update/<id>", args.rows,
+                               lambda: [client.put(f"/update/{u['id']}", json=u) for u in updates])
+        per_row_delete = timed("DELETE /delete/<id>", args.rows,
+                               lambda: [client.delete(f"/delete/{book_id}") for book_id in ids])
+
+        print(f"Bulk path ({args.rows} rows):")
+        bulk = timed("POST /bulk/create", args.rows, lambda: client.post("/bulk/create", json=books))
+        ids = bench_ids()
+        updates = [dict(book, id=book_id, cost=99) for book, book_id in zip(books, ids)]
+        bulk_update = timed("PUT /bulk/update", args.rows, lambda: client.put("/bulk/update", json=updates))
+        bulk_delete = timed("DELETE /bulk/delete", args.rows, lambda: client.delete("/bulk/delete", json=ids))
+
+        print("Speedup:")
+        print(f"  create x{per_row / bulk:.1f}, update x{per_row_update / bulk_update:.1f}, "
+              f"delete x{per_row_delete / bulk_delete:.1f}")
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Bytes and time for GET / with and without compression and fields= projection.
+
+    python seed_books.py --rows 100000 --truncate --dsn "..."
+    python tests/benchmark/bench_compression.py --mbps 20
+
+Requests go through the Flask test client, so "server" is the in-process time
+to query, serialize and compress; "transfer" is body size over a --mbps link.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import compression
+from app import app, response_cache
+
+CASES = [
+    ("all columns", "/", None),
+    ("all columns", "/", "gzip"),
+    ("all columns", "/", "br"),
+    ("fields=name,cost", "/?fields=name,cost", None),
+    ("fields=name,cost", "/?fields=name,cost", "gzip"),
+    ("fields=name,cost", "/?fields=name,cost", "br"),
+]
+
+
+def measure(client, url, encoding, repeats):
+    headers = {"Accept-Encoding": encoding} if encoding else {}
+    times = []
+    for _ in range(repeats):
+        response_cache.clear()
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        times.append(time.perf_counter() - started)
+    assert response.status_code == 200
+    assert response.headers.get("Content-Encoding") == encoding
+    return len(response.data), statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mbps", type=float, default=20.0, help="link speed for the transfer estimate")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    rows = len(client.get("/?fields=id").get_json())
+    print(f"{rows:,} books, {args.mbps:g} Mbit/s link")
+    print(f"{'response':<18} {'encoding':<9} {'bytes':>12} {'server ms':>10} {'transfer ms':>12} {'total ms':>9}")
+    baseline = None
+    for label, url, encoding in CASES:
+        if encoding and encoding not in compression.supported_encodings():
+            print(f"{label:<18} {encoding:<9} {'(not installed)':>12}")
+            continue
+        size, server = measure(client, url, encoding, args.repeats)
+        transfer = size * 8 / (args.mbps * 1e6)
+        total = server + transfer
+        baseline = baseline or (size, total)
+        print(f"{label:<18} {encoding or 'identity':<9} {size:>12,} {server * 1000:>10.0f} {transfer * 1000:>12.0f} "
+              f"{total * 1000:>9.0f}  ({size / baseline[0]:.1%} bytes, {total / baseline[1]:.1%} time)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Row fetching + JSON serialization cost for large book listings, before/after.
+
+    python tests/benchmark/bench_json.py --rows 10000 100000
+
+before: RealDictCursor rows serialized by Flask's DefaultJSONProvider
+after:  tuple rows mapped with fetch_dicts() and serialized by FastJSONProvider
+
+Rows come from generate_series, so no table has to be seeded.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from psycopg2.extras import RealDictCursor
+
+from app import get_db_connection
+from json_provider import FastJSONProvider, fetch_dicts, orjson
+
+SYNTHETIC_BOOKS = """
+    SELECT g AS id, 'Publisher ' || g %% 50 AS publisher, 'Book ' || g AS name,
+           date '2000-01-01' + g %% 9000 AS date, ((g %% 100000) / 100.0)::numeric(10, 2) AS cost
+    FROM generate_series(1, %s) AS g
+"""
+
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def fetch(connection, rows, cursor_factory=None):
+    with connection.cursor(cursor_factory=cursor_factory) as cursor:
+        cursor.execute(SYNTHETIC_BOOKS, (rows,))
+        return cursor.fetchall() if cursor_factory else fetch_dicts(cursor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    before_app, after_app = Flask("before"), Flask("after")
+    before_app.json = DefaultJSONProvider(before_app)
+    after_app.json = FastJSONProvider(after_app)
+
+    print(f"JSON backend for FastJSONProvider: {'orjson' if orjson else 'json (stdlib)'}")
+    print(f"  {'rows':>8} {'phase':<10} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    connection = get_db_connection()
+    try:
+        for rows in args.rows:
+            fetch_before, dict_rows = best_of(lambda: fetch(connection, rows, RealDictCursor))
+            fetch_after, tuple_rows = best_of(lambda: fetch(connection, rows))
+            with before_app.app_context():
+                encode_before, body_before = best_of(lambda: before_app.json.response(dict_rows).get_data())
+            with after_app.app_context():
+                encode_after, body_after = best_of(lambda: after_app.json.response(tuple_rows).get_data())
+            for phase, before, after in (("fetch", fetch_before, fetch_after),
+                                         ("serialize", encode_before, encode_after),
+                                         ("total", fetch_before + encode_before, fetch_after + encode_after)):
+                print(f"  {rows:>8} {phase:<10} {before * 1000:10.1f} {after * 1000:10.1f} {before / after:7.1f}x")
+            print(f"  {rows:>8} {'bytes':<10} {len(body_before):10} {len(body_after):10}")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Prepared (book_queries) vs plain cursor.execute() latency for the hot book statements.
+
+    python tests/benchmark/bench_prepared.py --iterations 5000
+
+Runs against existing rows on one connection; updates are rolled back.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import book_queries
+from app import get_db_connection
+from book_queries import BOOK_COLUMNS
+
+
+def timed(fn, iterations, repeats=3):
+    """Best-of-repeats microseconds per call."""
+    runs = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for i in range(iterations):
+            fn(i)
+        runs.append((time.perf_counter() - started) / iterations * 1e6)
+    return min(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=50, help="ids per multi-get")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM book ORDER BY id LIMIT 1000")
+            ids = [row[0] for row in cursor.fetchall()]
+            if len(ids) < args.batch:
+                sys.exit("Need at least --batch books; run Playwright_Test_data.py or seed_books.py first.")
+
+            def pick(i):
+                return ids[i % len(ids)]
+
+            def plain_get(i):
+                cursor.execute(f"SELECT {BOOK_COLUMNS} FROM book WHERE id = %s", (pick(i),))
+                cursor.fetchall()
+
+            def plain_multi(i):
+                cursor.execute(f"SELECT {BOOK_COLUMNS} FROM book WHERE id = ANY(%s)", (ids[:args.batch],))
+                cursor.fetchall()
+
+            def plain_update(i):
+                cursor.execute(f"UPDATE book SET cost = %s, version = version + 1 WHERE id = %s "
+                               f"RETURNING {BOOK_COLUMNS}", (10 + i % 90, pick(i)))
+                cursor.fetchall()
+
+            cases = [
+                ("get by id", plain_get, lambda i: book_queries.get_book(cursor, pick(i))),
+                (f"get {args.batch} ids", plain_multi, lambda i: book_queries.get_books(cursor, ids[:args.batch])),
+                ("patch cost", plain_update,
+                 lambda i: book_queries.update_book(cursor, pick(i), {"cost": 10 + i % 90})),
+            ]
+            print(f"{'statement':<14} {'execute µs':>11} {'prepared µs':>12} {'speedup':>8}")
+            for label, plain, prepared in cases:
+                prepared(0)     # PREPARE outside the timing
+                plain_us = timed(plain, args.iterations)
+                conn.rollback()
+                prepared_us = timed(prepared, args.iterations)
+                conn.rollback()
+                print(f"{label:<14} {plain_us:>11.1f} {prepared_us:>12.1f} {plain_us / prepared_us:>7.2f}x")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
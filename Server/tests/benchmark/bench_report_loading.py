@@ -0,0 +1,84 @@
+"""
+Peak memory and time to load a large Newman result file, before/after.
+
+    python tests/benchmark/bench_report_loading.py --executions 10000 --body-kb 8
+
+before: json.load() of the whole document
+after:  result_loader.load_newman (streams run.executions / run.failures)
+
+Each variant runs in a fresh interpreter so ru_maxrss is its own peak.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+UNIFIED_REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "unified_report")
+
+LOADERS = {
+    "json.load": "import json\nwith open(path, encoding='utf-8') as f:\n    data = json.load(f)\n"
+                 "count = len(data['run']['executions'])",
+    "streaming": "from result_loader import load_newman\ncount = len(load_newman(path)['executions'])",
+}
+
+PROBE = """
+import resource, sys, time
+sys.path.insert(0, {report_dir!r})
+path = {path!r}
+started = time.perf_counter()
+{loader}
+print(count, time.perf_counter() - started, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def write_newman_file(path, executions, body_kb, seed):
+    """A Newman-shaped document whose executions carry response bodies, like a real run."""
+    rng = random.Random(seed)
+    body = [rng.randrange(256) for _ in range(body_kb * 1024)]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"collection": {"item": []}, "run": {"stats": {"assertions": {"total": %d, "failed": %d}}, '
+                '"executions": [' % (executions * 2, executions // 20))
+        for i in range(executions):
+            execution = {
+                "item": {"name": f"TC{i % 10000 + 1:05d} - Request {i}"},
+                "request": {"url": {"path": ["book", str(i)]}, "method": "GET"},
+                "response": {"code": 200, "stream": {"type": "Buffer", "data": body}},
+                "assertions": [{"assertion": "status is 200"}, {"assertion": "body is JSON"}],
+            }
+            f.write(("," if i else "") + json.dumps(execution))
+        f.write('], "failures": [')
+        f.write(",".join(json.dumps({"source": {"name": f"TC{i % 10000 + 1:05d} - Request {i}"},
+                                     "error": {"test": "status is 200", "message": "expected 500 to equal 200",
+                                               "stack": "x" * 2000}})
+                         for i in range(0, executions, 20)))
+        f.write("]}}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--executions", type=int, default=10000)
+    parser.add_argument("--body-kb", type=int, default=8, help="response body size per execution")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "newman-result.json")
+        started = time.perf_counter()
+        write_newman_file(path, args.executions, args.body_kb, args.seed)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"{args.executions:,} executions, {size_mb:,.0f} MB file (written in {time.perf_counter() - started:.1f}s)")
+        print(f"  {'loader':<10} {'seconds':>8} {'peak RSS MB':>12}")
+        for name, loader in LOADERS.items():
+            probe = PROBE.format(report_dir=UNIFIED_REPORT_DIR, path=path, loader=loader)
+            out = subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True, text=True).stdout
+            count, seconds, max_rss_kb = out.split()
+            assert int(count) == args.executions
+            print(f"  {name:<10} {float(seconds):>8.2f} {int(max_rss_kb) / 1024:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
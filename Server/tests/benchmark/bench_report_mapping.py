@@ -0,0 +1,98 @@
+"""
+Test-plan -> Newman mapping in the unified report generator, before/after.
+
+    python tests/benchmark/bench_report_mapping.py --cases 10000 --executions 50000
+
+before: per plan row, scan every Newman test name, then every failure
+after:  tc_mapping.map_test_plan (TC id and failure indexes, column operations)
+
+The old loop is quadratic, so it runs on --legacy-sample plan rows and is
+extrapolated; its output on those rows must equal the new mapping's.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "unified_report"))
+
+import pandas as pd
+
+from tc_mapping import map_test_plan
+
+ACTIONS = ["Create book", "Update book", "Delete book", "Fetch all books", "Health check", "Search books"]
+
+
+def synthetic_run(cases, executions, failure_rate, seed):
+    rng = random.Random(seed)
+    plan = pd.DataFrame({
+        "TC No": [f"TC{i:05d}" for i in range(1, cases + 1)],
+        "Description": [rng.choice(ACTIONS) for _ in range(cases)],
+        "Pass/Fail": [rng.choices(["Pass", "Fail", "Manual"], [80, 10, 10])[0] for _ in range(cases)],
+    })
+    runs = []
+    for i in range(executions):
+        # Most requests cover one plan case; some are setup requests without a TC id.
+        tc = f"TC{rng.randint(1, cases * 6 // 5):05d} - " if rng.random() < 0.9 else ""
+        runs.append({"item": {"name": f"{tc}{rng.choice(ACTIONS)} #{i}"}})
+    failures = [{"source": {"name": run["item"]["name"]}, "error": {"test": "status is 200"}}
+                for run in rng.sample(runs, int(executions * failure_rate))]
+    return plan, runs, failures
+
+
+def legacy_map(df, executions, failures):
+    """The generator's original row-by-row mapping."""
+    newman_test_names = [execution["item"]["name"] for execution in executions]
+    df["Automation_Status"] = "Not Automated"
+    df["Newman_Test_Name"] = ""
+    df["Automation_Result"] = ""
+    for idx, row in df.iterrows():
+        tc_id = str(row["TC No"]).strip().upper()
+        if str(row.get("Pass/Fail", "")).strip().lower() == "manual":
+            df.at[idx, "Automation_Status"] = "Manual Required"
+            continue
+        matched_test = None
+        for test_name in newman_test_names:
+            if tc_id.lower() in test_name.lower():
+                matched_test = test_name
+                break
+        if matched_test:
+            df.at[idx, "Automation_Status"] = "Automated"
+            df.at[idx, "Newman_Test_Name"] = matched_test
+            test_failed = any(failure["source"]["name"] == matched_test for failure in failures)
+            df.at[idx, "Automation_Result"] = "❌ Failed" if test_failed else "✅ Passed"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=10000)
+    parser.add_argument("--executions", type=int, default=50000)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--legacy-sample", type=int, default=200, help="plan rows to time the old loop on")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    plan, executions, failures = synthetic_run(args.cases, args.executions, args.failure_rate, args.seed)
+    print(f"{args.cases:,} plan cases, {args.executions:,} executions, {len(failures):,} failures")
+
+    df = plan.copy()
+    started = time.perf_counter()
+    coverage = map_test_plan(df, executions, failures)
+    indexed = time.perf_counter() - started
+    print(f"  indexed     {indexed * 1000:10.1f} ms   ({coverage['automated']:,} automated, "
+          f"{coverage['manual_required']:,} manual)")
+
+    sample = plan.sample(n=min(args.legacy_sample, len(plan)), random_state=args.seed).copy()
+    started = time.perf_counter()
+    legacy_map(sample, executions, failures)
+    legacy = (time.perf_counter() - started) * len(plan) / len(sample)
+    print(f"  legacy      {legacy * 1000:10.1f} ms   (extrapolated from {len(sample)} rows)")
+    print(f"  speedup     {legacy / indexed:10.0f}x")
+
+    columns = ["Automation_Status", "Newman_Test_Name", "Automation_Result"]
+    assert sample[columns].equals(df.loc[sample.index, columns]), "mappings differ"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+GET /search latency over a large catalog.
+
+    python tests/benchmark/bench_search.py --rows 1000000
+
+Seeds --rows synthetic books (tagged with a dedicated publisher prefix and
+removed afterwards) with INSERT ... SELECT generate_series, refreshes planner
+statistics, then times each query through the Flask test client with the
+response cache disabled. The plan of the first query is printed so you can
+confirm the GIN indexes are used.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import Playwright_Test_data as seeding
+from app import app, build_search_query, get_db_connection, response_cache, trigram_available
+
+BENCH_PUBLISHER_PREFIX = "BenchSearch"
+WORDS = ["river", "shadow", "garden", "empire", "winter", "quantum", "harbor", "silent",
+         "crimson", "journey", "python", "atlas", "orchard", "lantern", "voyage", "meridian"]
+QUERIES = ["quantum", "silent garden", "\"crimson empire\"", "lantern -winter", "meridain"]
+
+SEED_BOOKS = """
+    INSERT INTO book (name, publisher, date, cost)
+    SELECT initcap(w[1 + g %% 16] || ' ' || w[1 + (g / 16) %% 16] || ' ' || w[1 + (g / 256) %% 16]) || ' ' || g,
+           %s || ' ' || (g %% 500),
+           date '1990-01-01' + g %% 12000,
+           (5 + g %% 49500 / 100.0)::numeric(10, 2)
+    FROM generate_series(1, %s) AS g, (SELECT %s::text[] AS w) AS words
+"""
+
+
+def seed(rows):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            seeding.create_schema(cursor)
+            cursor.execute(SEED_BOOKS, (BENCH_PUBLISHER_PREFIX, rows, WORDS))
+            cursor.execute("ANALYZE book")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def cleanup():
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM book WHERE publisher LIKE %s", (BENCH_PUBLISHER_PREFIX + " %",))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def explain(query):
+    conn = get_db_connection()
+    try:
+        sql, params, _ = build_search_query({"q": query}, trigram_available(conn))
+        with conn.cursor() as cursor:
+            cursor.execute("EXPLAIN (ANALYZE, COSTS OFF) " + sql, params)
+            return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--keep-data", action="store_true", help="do not delete seeded books afterwards")
+    args = parser.parse_args()
+
+    client = app.test_client()
+    cleanup()
+    started = time.perf_counter()
+    seed(args.rows)
+    print(f"Seeded {args.rows} books in {time.perf_counter() - started:.1f}s")
+    try:
+        conn = get_db_connection()
+        try:
+            print(f"Trigram matching: {'on' if trigram_available(conn) else 'off (pg_trgm not installed)'}")
+        finally:
+            conn.close()
+        print("\n".join("  " + line for line in explain(QUERIES[0])))
+
+        print(f"  {'query':<20} {'hits':>6} {'p50 ms':>8} {'p95 ms':>8}")
+        for query in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                response_cache.clear()
+                t = time.perf_counter()
+                body = client.get("/search", query_string={"q": query, "limit": args.limit}).get_json()
+                timings.append(time.perf_counter() - t)
+            p95 = statistics.quantiles(timings, n=20)[18] if len(timings) >= 2 else timings[0]
+            print(f"  {query:<20} {len(body['data']):>6} "
+                  f"{statistics.median(timings) * 1000:8.1f} {p95 * 1000:8.1f}")
+    finally:
+        if not args.keep_data:
+            cleanup()
+
+
+if __name__ == "__main__":
+    main()
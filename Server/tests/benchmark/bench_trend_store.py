@@ -0,0 +1,77 @@
+"""
+Trend-store write and query latency over a long run history.
+
+    python tests/benchmark/bench_trend_store.py --runs 3000 --tests 200
+
+Fills a temporary SQLite history with --runs runs of --tests tests each,
+then times recording one more run and the report's two queries (recent runs
+for the charts, duration regressions for the new run). One test is made
+slower in the last run and must be flagged.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "unified_report"))
+
+import trend_store
+
+SUMMARY = {"newman_requests": 33, "newman_assertions": 58, "newman_failed": 3, "pytest_total": 50,
+           "pytest_passed": 49, "pytest_failed": 1, "pytest_duration": 2.5, "newman_response_avg": 120.0,
+           "plan_total": 44, "plan_automated": 30, "automation_coverage": 68.2}
+
+
+def results(rng, tests, slow=None):
+    rows = []
+    for i in range(tests):
+        kind = "pytest" if i % 2 else "newman"
+        duration = rng.gauss(20 + i % 50, 2)
+        if slow == i:
+            duration *= 3
+        rows.append((kind, f"{kind} test {i}", "passed", duration))
+    return rows
+
+
+def timed(fn, repeats=5):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        value = fn()
+        times.append(time.perf_counter() - started)
+    return value, statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3000)
+    parser.add_argument("--tests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = trend_store.connect(os.path.join(tmp, "history.sqlite3"))
+        started = time.perf_counter()
+        for _ in range(args.runs):
+            trend_store.record_run(conn, SUMMARY, results(rng, args.tests))
+        print(f"{args.runs:,} runs x {args.tests} tests loaded in {time.perf_counter() - started:.1f}s "
+              f"({os.path.getsize(os.path.join(tmp, 'history.sqlite3')) / 1e6:.0f} MB)")
+
+        slow = args.tests // 2
+        started = time.perf_counter()
+        run_id = trend_store.record_run(conn, SUMMARY, results(rng, args.tests, slow=slow))
+        print(f"  record_run            {(time.perf_counter() - started) * 1000:8.2f} ms")
+        runs, ms = timed(lambda: trend_store.recent_runs(conn, 30))
+        print(f"  recent_runs(30)       {ms:8.2f} ms")
+        regressions, ms = timed(lambda: trend_store.duration_regressions(conn, run_id))
+        print(f"  duration_regressions  {ms:8.2f} ms  -> {[r['name'] for r in regressions]}")
+        assert len(runs) == 30 and [r["name"] for r in regressions] == [f"newman test {slow}"]
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Load test for the Book CRUD API: throughput and latency under a request mix.
+
+    python app.py &                                   # or: python serve.py
+    python tests/benchmark/load_test.py --seed-books 10000 --concurrency 1 10 50 \\
+        --mix list=60,get=20,create=10,update=8,delete=2 --duration 20
+
+Seeds N books through POST /bulk/create (tagged with a LoadTest publisher,
+removed afterwards through /bulk/delete), so any storage backend can be
+driven, then drives the running server at each concurrency level for --duration seconds
+(or --requests requests). Results go to perf-results.json, which the unified
+report renders next to the functional results.
+
+Regression gate:
+    --save-baseline             store this run as perf-baseline.json
+    --baseline perf-baseline.json --max-regression 15
+                                exit 1 if req/s drops or p95 rises by more
+                                than 15% at any concurrency level
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from urllib.parse import quote, urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS = os.path.join(BENCH_DIR, "perf-results.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "perf-baseline.json")
+LOAD_PUBLISHER_PREFIX = "LoadTest Pub"
+PUBLISHERS = 20
+DEFAULT_MIX = "list=60,get=20,create=10,update=8,delete=2"
+SEED_BATCH = 1000          # books per /bulk/create (and ids per /bulk/delete) request
+
+
+# ---------- SEEDING ----------
+def generate_books(count, rng):
+    start = date(1990, 1, 1)
+    return [
+        {"publisher": f"{LOAD_PUBLISHER_PREFIX} {i % PUBLISHERS}", "name": f"LoadTest Book {i}",
+         "date": (start + timedelta(days=rng.randrange(12000))).isoformat(), "cost": round(rng.uniform(5, 500), 2)}
+        for i in range(count)
+    ]
+
+
+def api(conn, method, path, body=None):
+    """One JSON request on conn; returns the decoded body, raising on a non-2xx status."""
+    conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                 headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = json.loads(response.read() or b"null")
+    if not 200 <= response.status < 300:
+        raise RuntimeError(f"{method} {path} -> {response.status}: {data}")
+    return data
+
+
+def connect(base_url):
+    target = urlsplit(base_url)
+    return http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+
+
+def seed(base_url, count, rng):
+    books = generate_books(count, rng)
+    conn = connect(base_url)
+    try:
+        ids = []
+        for start in range(0, len(books), SEED_BATCH):
+            for result in api(conn, "POST", "/bulk/create", books[start:start + SEED_BATCH])["results"]:
+                if result["status"] != "created":
+                    raise RuntimeError(f"could not seed book {start + result['index']}: {result['error']}")
+                ids.append(result["id"])
+        return ids
+    finally:
+        conn.close()
+
+
+def cleanup(base_url):
+    """Delete every LoadTest book, including those created during the run."""
+    conn = connect(base_url)
+    try:
+        ids = []
+        for i in range(PUBLISHERS):
+            path = f"/books?limit=500&fields=id&publisher={quote(f'{LOAD_PUBLISHER_PREFIX} {i}')}"
+            page = api(conn, "GET", path)
+            ids += [book["id"] for book in page["data"]]
+            while page.get("next_cursor"):
+                page = api(conn, "GET", f"{path}&after={quote(page['next_cursor'])}")
+                ids += [book["id"] for book in page["data"]]
+        for start in range(0, len(ids), SEED_BATCH):
+            api(conn, "DELETE", "/bulk/delete", ids[start:start + SEED_BATCH])
+    finally:
+        conn.close()
+
+
+# ---------- WORKLOAD ----------
+class IdPool:
+    """Seeded ids shared by workers; delete consumes them, create adds more."""
+
+    def __init__(self, ids):
+        self._ids = list(ids)
+        self._lock = threading.Lock()
+
+    def pick(self, rng):
+        with self._lock:
+            return rng.choice(self._ids) if self._ids else None
+
+    def take(self, rng):
+        with self._lock:
+            if not self._ids:
+                return None
+            index = rng.randrange(len(self._ids))
+            self._ids[index], self._ids[-1] = self._ids[-1], self._ids[index]
+            return self._ids.pop()
+
+    def add(self, book_id):
+        with self._lock:
+            self._ids.append(book_id)
+
+
+def random_book(rng):
+    return {
+        "publisher": f"{LOAD_PUBLISHER_PREFIX} {rng.randrange(PUBLISHERS)}",
+        "name": f"LoadTest Book {rng.randrange(10 ** 9)}",
+        "date": (date(1990, 1, 1) + timedelta(days=rng.randrange(12000))).isoformat(),
+        "cost": round(rng.uniform(5, 500), 2),
+    }
+
+
+def build_request(op, rng, ids):
+    """Return (method, path, body) for one operation of the mix."""
+    if op == "list":
+        publisher = f"{LOAD_PUBLISHER_PREFIX} {rng.randrange(PUBLISHERS)}"
+        return "GET", f"/books?limit=50&publisher={publisher.replace(' ', '%20')}", None
+    if op == "list_all":
+        return "GET", "/", None
+    if op == "get":
+        book_id = ids.pick(rng)
+        return ("GET", f"/book/{book_id}", None) if book_id else build_request("create", rng, ids)
+    if op == "create":
+        return "POST", "/create", random_book(rng)
+    if op == "update":
+        book_id = ids.pick(rng)
+        return ("PUT", f"/update/{book_id}", random_book(rng)) if book_id else build_request("create", rng, ids)
+    if op == "delete":
+        book_id = ids.take(rng)
+        return ("DELETE", f"/delete/{book_id}", None) if book_id else build_request("create", rng, ids)
+    raise ValueError(f"unknown operation: {op}")
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        op, _, weight = part.partition("=")
+        mix[op.strip()] = float(weight)
+    unknown = set(mix) - {"list", "list_all", "get", "create", "update", "delete"}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown operations in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def worker(base_url, mix, ids, deadline, remaining, samples, seed_value):
+    rng = random.Random(seed_value)
+    ops, weights = list(mix), list(mix.values())
+    target = urlsplit(base_url)
+    conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+    headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+    local = []
+    try:
+        while time.monotonic() < deadline:
+            if remaining is not None:
+                with remaining["lock"]:
+                    if remaining["count"] <= 0:
+                        break
+                    remaining["count"] -= 1
+            op = rng.choices(ops, weights)[0]
+            method, path, body = build_request(op, rng, ids)
+            payload = json.dumps(body) if body is not None else None
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                response_body = response.read()
+                ok = response.status < 500
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+                ok, response_body = False, b""
+            elapsed = time.perf_counter() - started
+            local.append((op, elapsed, ok))
+            if ok and op == "create" and method == "POST":
+                try:
+                    created = json.loads(response_body)
+                    book_id = (created.get("data") or created).get("id")
+                    if book_id:
+                        ids.add(book_id)
+                except (ValueError, AttributeError):
+                    pass
+    finally:
+        conn.close()
+        samples.extend(local)
+
+
+# ---------- STATISTICS ----------
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    if len(latencies) >= 2:
+        q = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = q[49], q[94], q[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+            "p50": round(p50 * 1000, 3),
+            "p95": round(p95 * 1000, 3),
+            "p99": round(p99 * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+def run_level(base_url, mix, ids, concurrency, duration, requests, seed_value):
+    samples = []
+    remaining = {"count": requests, "lock": threading.Lock()} if requests else None
+    deadline = time.monotonic() + (duration if not requests else 10 ** 6)
+    threads = [
+        threading.Thread(target=worker, args=(base_url, mix, ids, deadline, remaining, samples, seed_value + i))
+        for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    level = {"concurrency": concurrency, "duration_s": round(elapsed, 3)}
+    level.update(summarize([s[1] for s in samples], sum(not s[2] for s in samples), elapsed))
+    level["operations"] = {
+        op: summarize([s[1] for s in samples if s[0] == op],
+                      sum(not s[2] for s in samples if s[0] == op), elapsed)
+        for op in mix if any(s[0] == op for s in samples)
+    }
+    return level
+
+
+# ---------- REGRESSION GATE ----------
+def compare_to_baseline(results, baseline, max_regression):
+    """Return a list of human-readable regressions (empty when within budget)."""
+    budget = max_regression / 100.0
+    baseline_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    regressions = []
+    for level in results["levels"]:
+        base = baseline_levels.get(level["concurrency"])
+        if not base:
+            continue
+        if base["rps"] and level["rps"] < base["rps"] * (1 - budget):
+            regressions.append(
+                f"c={level['concurrency']}: throughput {level['rps']:.1f} req/s vs baseline {base['rps']:.1f}"
+            )
+        base_p95, p95 = base["latency_ms"]["p95"], level["latency_ms"]["p95"]
+        if base_p95 and p95 > base_p95 * (1 + budget):
+            regressions.append(f"c={level['concurrency']}: p95 {p95:.1f} ms vs baseline {base_p95:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Book CRUD API.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--seed-books", type=int, default=1000, help="books to seed before the run")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--requests", type=int, help="fixed request count per level (overrides --duration)")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--output", default=DEFAULT_RESULTS)
+    parser.add_argument("--baseline", help="fail if results regress against this baseline file")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="allowed regression in percent")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="store results as baseline")
+    parser.add_argument("--keep-data", action="store_true", help="do not delete seeded books afterwards")
+    args = parser.parse_args()
+
+    rng = random.Random(args.random_seed)
+    print(f"🌱 Seeding {args.seed_books} books...")
+    ids = IdPool(seed(args.base_url, args.seed_books, rng))
+
+    results = {
+        "generated": datetime.now().isoformat(timespec="seconds"),
+        "base_url": args.base_url,
+        "seeded_books": args.seed_books,
+        "mix": args.mix,
+        "levels": [],
+    }
+    try:
+        for concurrency in args.concurrency:
+            print(f"🚀 Concurrency {concurrency}...")
+            level = run_level(args.base_url, args.mix, ids, concurrency,
+                              args.duration, args.requests, args.random_seed)
+            results["levels"].append(level)
+            latency = level["latency_ms"]
+            print(f"   {level['rps']:.1f} req/s | p50 {latency['p50']:.1f} ms | p95 {latency['p95']:.1f} ms "
+                  f"| p99 {latency['p99']:.1f} ms | errors {level['errors']}")
+    finally:
+        if not args.keep_data:
+            cleanup(args.base_url)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.max_regression)
+        results["baseline"] = {"file": os.path.abspath(args.baseline), "max_regression_pct": args.max_regression,
+                               "regressions": regressions, "levels": baseline.get("levels", [])}
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"📊 Results saved to: {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"📌 Baseline saved to: {args.save_baseline}")
+
+    if args.baseline and results["baseline"]["regressions"]:
+        print(f"❌ Performance regressed beyond {args.max_regression}%:")
+        for regression in results["baseline"]["regressions"]:
+            print(f"   {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
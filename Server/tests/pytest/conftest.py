@@ -1,10 +1,155 @@
+import hashlib
+import inspect
 import pytest
 import psycopg2
 import sys
 import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
-from app import app as flask_app, get_db_connection
+import app as app_module
+import Playwright_Test_data
+from app import app as flask_app, response_cache
+from memory_storage import MemoryStorage
+
+# STORAGE_BACKEND=memory runs the suite against the in-process engine: no
+# database is created and tests marked `postgres` are skipped.
+MEMORY_BACKEND = app_module.STORAGE_BACKEND == 'memory'
+
+# --- Per-worker databases ---
+# Each pytest-xdist worker (or the single process without -n) gets its own
+# database, cloned from a template that is created and seeded once.
+BASE_DBNAME = app_module.db_config['dbname']
+TEMPLATE_DBNAME = f"{BASE_DBNAME}_test_template"
+TEMPLATE_LOCK = 0x626f6f6b  # pg_advisory_lock key serializing template builds
+
+def _admin_connection():
+    conn = psycopg2.connect(**dict(app_module.db_config, dbname="postgres"))
+    conn.autocommit = True
+    return conn
+
+def _template_fingerprint():
+    # Schema and seed data both live in Playwright_Test_data; rebuild when it changes.
+    return hashlib.sha256(inspect.getsource(Playwright_Test_data).encode()).hexdigest()
+
+def _ensure_template(cursor):
+    fingerprint = _template_fingerprint()
+    cursor.execute(
+        "SELECT shobj_description(oid, 'pg_database') FROM pg_database WHERE datname = %s", (TEMPLATE_DBNAME,)
+    )
+    row = cursor.fetchone()
+    if row and row[0] == fingerprint:
+        return
+    cursor.execute(f'DROP DATABASE IF EXISTS "{TEMPLATE_DBNAME}" WITH (FORCE)')
+    cursor.execute(f'CREATE DATABASE "{TEMPLATE_DBNAME}"')
+    conn = psycopg2.connect(**dict(app_module.db_config, dbname=TEMPLATE_DBNAME))
+    try:
+        with conn, conn.cursor() as seed:
+            Playwright_Test_data.create_schema(seed)
+            Playwright_Test_data.seed_sample_books(seed)
+    finally:
+        conn.close()
+    # Written last, so a build that failed half-way is redone by the next run.
+    cursor.execute(f'COMMENT ON DATABASE "{TEMPLATE_DBNAME}" IS %s', (fingerprint,))
+
+@pytest.fixture(scope="session", autouse=True)
+def worker_database():
+    """
+    Clone this worker's database from the template and point the app at it.
+    Dropped again when the session ends.
+    """
+    if MEMORY_BACKEND:
+        yield None
+        return
+    dbname = f"{BASE_DBNAME}_test_{os.environ.get('PYTEST_XDIST_WORKER', 'main')}"
+    admin = _admin_connection()
+    try:
+        with admin.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (TEMPLATE_LOCK,))
+            try:
+                _ensure_template(cursor)
+                cursor.execute(f'DROP DATABASE IF EXISTS "{dbname}" WITH (FORCE)')
+                cursor.execute(f'CREATE DATABASE "{dbname}" TEMPLATE "{TEMPLATE_DBNAME}"')
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (TEMPLATE_LOCK,))
+        app_module.close_pool()
+        app_module.db_config['dbname'] = dbname
+        if 'async_app' in sys.modules:
+            sys.modules['async_app'].async_db_config['database'] = dbname
+        yield dbname
+        app_module.close_pool()
+        if app_module._change_listener is not None:
+            app_module._change_listener.stop()
+            app_module._change_listener = None
+        app_module.db_config['dbname'] = BASE_DBNAME
+        with admin.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS "{dbname}" WITH (FORCE)')
+    finally:
+        admin.close()
+
+# --- Per-test rollback ---
+class SavepointConnection:
+    """
+    Stands in for a pooled connection inside the test's outer transaction.
+    Checkout opens a savepoint, commit() releases it and starts the next one,
+    rollback() and close() roll back to it; nothing is ever really committed.
+    """
+    _counter = 0
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._open = False
+        SavepointConnection._counter += 1
+        self._name = f"test_sp_{SavepointConnection._counter}"
+        self._savepoint()
+
+    def _execute(self, sql):
+        with self._conn.cursor() as cursor:
+            cursor.execute(sql)
+
+    def _savepoint(self):
+        self._execute(f"SAVEPOINT {self._name}")
+        self._open = True
+
+    def commit(self):
+        self._execute(f"RELEASE SAVEPOINT {self._name}")
+        self._savepoint()
+
+    def rollback(self):
+        if self._open:
+            self._execute(f"ROLLBACK TO SAVEPOINT {self._name}")
+
+    def close(self):
+        if self._open:
+            self.rollback()
+            self._execute(f"RELEASE SAVEPOINT {self._name}")
+            self._open = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+@pytest.fixture(scope="session")
+def outer_connection(worker_database):
+    conn = psycopg2.connect(**app_module.db_config)
+    yield conn
+    conn.close()
+
+@pytest.fixture(autouse=True)
+def savepoint_isolation(request, monkeypatch):
+    """
+    Run the test inside one transaction that is rolled back afterwards: the
+    app and the fixtures get SavepointConnections on a shared connection.
+    Tests that need real commits (LISTEN/NOTIFY, commit-ordered cursors, other
+    pools or processes reading the data) opt out with @pytest.mark.commits.
+    """
+    if MEMORY_BACKEND or request.node.get_closest_marker("commits"):
+        yield
+        return
+    conn = request.getfixturevalue("outer_connection")
+    monkeypatch.setattr(app_module, "get_db_connection", lambda: SavepointConnection(conn))
+    try:
+        yield
+    finally:
+        conn.rollback()
 
 @pytest.fixture(scope="session")
 def app():
@@ -16,12 +161,36 @@ def client(app):
     # Flask test client
     return app.test_client()
 
+# --- In-process backend ---
+@pytest.fixture(autouse=True)
+def memory_storage(request, monkeypatch):
+    """
+    With the memory backend, give every test a fresh catalog seeded like the
+    template database, and skip tests that need Postgres itself.
+    """
+    if not MEMORY_BACKEND:
+        yield None
+        return
+    if request.node.get_closest_marker("postgres"):
+        pytest.skip("needs the postgres storage backend")
+    store = MemoryStorage()
+    with store.write() as books:
+        books.insert_books([(publisher, name, published, cost)
+                            for name, publisher, published, cost in Playwright_Test_data.sample_books])
+    monkeypatch.setattr(app_module, "storage", store)
+    yield store
+
+@pytest.fixture
+def storage():
+    """The app's storage backend; tests write through storage.write() sessions."""
+    return app_module.storage
+
 @pytest.fixture(scope="function")
 def db_connection():
     """
     Provides a DB connection for tests. Rollback any changes after each test.
     """
-    conn = get_db_connection()
+    conn = app_module.get_db_connection()
     cursor = conn.cursor()
     yield conn, cursor
     conn.rollback()
@@ -29,18 +198,35 @@ def db_connection():
     conn.close()
 
 @pytest.fixture(scope="function")
-def create_sample_book(db_connection):
+def create_sample_book(storage):
     """
     Fixture to create a sample book for testing update/delete/fetch.
     Returns the inserted book id.
     """
-    conn, cursor = db_connection
-    cursor.execute(
-        "INSERT INTO book (publisher, name, date, cost) VALUES (%s, %s, %s, %s) RETURNING id",
-        ("TestPub", "TestBook", "2025-01-01", 50.0)
-    )
-    book_id = cursor.fetchone()[0]
-    conn.commit()
+    with storage.write() as books:
+        [(book_id, _, _)] = books.insert_books([("TestPub", "TestBook", "2025-01-01", 50.0)])
     yield book_id
-    cursor.execute("DELETE FROM book WHERE id=%s", (book_id,))
-    conn.commit()
+    with storage.write() as books:
+        books.delete_book(book_id)
+
+@pytest.fixture(scope="function")
+def create_sample_books(storage):
+    """
+    Fixture to create a small catalog under one publisher for listing tests.
+    Returns (publisher, [ids]) in insertion order.
+    """
+    publisher = "ListPub"
+    with storage.write() as books:
+        rows = books.insert_books([(publisher, f"ListBook{i}", f"2024-01-{i + 1:02d}", 10 + i) for i in range(7)])
+    ids = sorted(book_id for book_id, _, _ in rows)
+    yield publisher, ids
+    with storage.write() as books:
+        books.delete_books(ids)
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """
+    Fixtures write straight to the database, bypassing the routes that
+    invalidate the response cache, so start every test with it empty.
+    """
+    response_cache.clear()
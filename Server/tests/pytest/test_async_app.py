@@ -0,0 +1,150 @@
+import asyncio
+import pytest
+
+# The async serving mode is optional; skip when its dependencies are absent.
+pytest.importorskip("quart")
+pytest.importorskip("asyncpg")
+
+import async_app
+
+# asyncpg connections of their own: the sync savepoint rollback cannot cover them.
+pytestmark = [pytest.mark.commits, pytest.mark.postgres]
+
+
+def call_with_headers(method, path, **kwargs):
+    """
+    Run one request through the Quart test client. test_app() runs the
+    before/after_serving hooks, so each call opens and closes its own pool.
+    """
+    async def _call():
+        async with async_app.app.test_app() as test_app:
+            client = test_app.test_client()
+            response = await getattr(client, method)(path, **kwargs)
+            return response.status_code, await response.get_json(), response.headers
+    return asyncio.run(_call())
+
+def call(method, path, **kwargs):
+    status, body, _ = call_with_headers(method, path, **kwargs)
+    return status, body
+
+# ----------------------------
+# Same contracts as test_books_api.py, against async_app
+# ----------------------------
+
+@pytest.mark.functional
+def test_async_health_check():
+    status, body = call("get", "/health")
+    assert status in [200, 503]
+    assert "status" in body
+
+@pytest.mark.create_api
+def test_async_create_update_delete(db_connection):
+    payload = {"publisher": "AsyncPub", "name": "Async101", "date": "2025-01-01", "cost": 49.99}
+    status, body = call("post", "/create", json=payload)
+    assert status == 201
+    assert body["data"]["name"] == "Async101"
+    book_id = body["data"]["id"]
+
+    status, books = call("get", "/")
+    assert status == 200
+    assert book_id in [book["id"] for book in books]
+
+    status, body = call("put", f"/update/{book_id}", json=dict(payload, name="Async202"))
+    assert status == 200
+    assert body["data"]["name"] == "Async202"
+
+    status, body = call("delete", f"/delete/{book_id}")
+    assert status == 200
+    assert "deleted successfully" in body["message"]
+
+@pytest.mark.create_api
+def test_async_create_validation():
+    status, body = call("post", "/create", json={"name": "Flask101", "date": "2025-01-01", "cost": 1})
+    assert status == 400
+    assert "Missing field" in body["error"]
+    status, body = call("post", "/create", json={"publisher": "P", "name": "N", "date": "2025-01-01", "cost": "abc"})
+    assert status == 400
+    assert "Invalid cost" in body["error"]
+
+@pytest.mark.global_error
+def test_async_not_found():
+    status, body = call("put", "/update/99999999", json={"publisher": "X", "name": "Y", "date": "2025-01-01", "cost": 10})
+    assert status == 404
+    assert "Book not found" in body["error"]
+    status, body = call("delete", "/delete/99999999")
+    assert status == 404
+    status, body = call("get", "/unknown")
+    assert status == 404
+    assert "Resource not found" in body["error"]
+
+# ----------------------------
+# Edge cases shared with the sync app
+# ----------------------------
+
+@pytest.fixture
+def async_book():
+    payload = {"publisher": "AsyncEdgePub", "name": 2001, "date": "2025-1-1", "cost": "12.50"}
+    status, body = call("post", "/create", json=payload)
+    assert status == 201
+    yield payload, body["data"]
+    call("delete", f"/delete/{body['data']['id']}")
+
+@pytest.mark.create_api
+def test_async_create_returns_stored_row(async_book):
+    _, book = async_book
+    # Not the echoed body: text name, zero-padded date, numeric cost, version.
+    assert book["name"] == "2001"
+    assert book["date"] == "2025-01-01"
+    assert book["cost"] == "12.50"
+    assert book["version"] == 1
+
+@pytest.mark.create_api
+def test_async_create_on_conflict(async_book):
+    payload, book = async_book
+    status, body = call("post", "/create", json=payload)
+    assert status == 409
+    assert body["data"]["id"] == book["id"]
+    status, body = call("post", "/create?on_conflict=ignore", json=dict(payload, cost=99))
+    assert status == 200 and body["data"]["cost"] == "12.50"
+    status, body = call("post", "/create?on_conflict=update", json=dict(payload, cost=99))
+    assert status == 200 and body["data"]["cost"] == "99" and body["data"]["version"] == 2
+    status, body = call("post", "/create?on_conflict=merge", json=payload)
+    assert status == 400
+
+@pytest.mark.create_api
+def test_async_create_rejects_invalid_cost():
+    for cost in ("nan", "Infinity", True):
+        status, body = call("post", "/create", json={"publisher": "P", "name": "N", "date": "2025-01-01", "cost": cost})
+        assert status == 400
+        assert "Invalid cost" in body["error"]
+
+@pytest.mark.create_api
+def test_async_idempotency_key():
+    import uuid
+    key = str(uuid.uuid4())
+    payload = {"publisher": "AsyncIdemPub", "name": key, "date": "2025-01-01", "cost": 5}
+    status, first, _ = call_with_headers("post", "/create", json=payload, headers={"Idempotency-Key": key})
+    assert status == 201
+    status, replay, headers = call_with_headers("post", "/create", json=payload, headers={"Idempotency-Key": key})
+    assert status == 201
+    assert headers["Idempotent-Replayed"] == "true"
+    assert replay == first
+    status, _ = call("post", "/create", json=dict(payload, cost=6), headers={"Idempotency-Key": key})
+    assert status == 422
+    call("delete", f"/delete/{first['data']['id']}")
+
+@pytest.mark.update_api
+def test_async_conditional_update(async_book):
+    _, book = async_book
+    url = f"/update/{book['id']}"
+    status, body, headers = call_with_headers("patch", url, json={"cost": 20}, headers={"If-Match": '"1"'})
+    assert status == 200
+    assert body["data"]["version"] == 2 and body["data"]["name"] == "2001"
+    assert headers["ETag"] == '"2"'
+
+    status, body = call("put", url, json={"publisher": "AsyncEdgePub", "name": "Stale", "date": "2025-01-01",
+                                          "cost": 1}, headers={"If-Match": '"1"'})
+    assert status == 412
+    assert body["data"]["version"] == 2
+    status, body = call("patch", url, json={})
+    assert status == 400
@@ -1,5 +1,9 @@
+import os
+import time
 import pytest
 import json
+from datetime import date
+from decimal import Decimal
 
 # ----------------------------
 # SECTION 1: Basic Functional
@@ -12,10 +16,9 @@ def test_health_check(client):
     assert "status" in response.get_json()
 
 @pytest.mark.functional
-def test_get_books_empty(client, db_connection):
-    conn, cursor = db_connection
-    cursor.execute("DELETE FROM book")
-    conn.commit()
+def test_get_books_empty(client, storage):
+    with storage.write() as books:
+        books.delete_books([book["id"] for book in books.all_books(("id",))])
     response = client.get("/")
     assert response.status_code == 200
     assert response.get_json() == []
@@ -60,6 +63,14 @@ def test_create_invalid_cost(client):
     assert response.status_code == 400
     assert "Invalid cost" in response.get_json()["error"]
 
+@pytest.mark.create_api
+@pytest.mark.parametrize("cost", ["nan", "inf", "-Infinity", True])
+def test_create_non_finite_or_boolean_cost(client, cost):
+    payload = {"publisher": "Packt", "name": "Flask", "date": "2025-01-01", "cost": cost}
+    response = client.post("/create", json=payload)
+    assert response.status_code == 400
+    assert "Invalid cost" in response.get_json()["error"]
+
 @pytest.mark.create_api
 def test_create_invalid_date(client):
     payload = {
@@ -130,6 +141,7 @@ def test_delete_nonexistent_book(client):
 
 # These would require DB mock or stop DB service manually
 @pytest.mark.db_failure
+@pytest.mark.postgres
 def test_db_connection_failure(client, monkeypatch):
     from app import get_db_connection
     def fake_conn():
@@ -148,7 +160,888 @@ def test_404_not_found(client):
     assert response.status_code == 404
     assert "Resource not found" in response.get_json()["error"]
 
+@pytest.mark.global_error
+def test_ids_beyond_integer_range_not_found(client):
+    big = 2 ** 31
+    book = {"publisher": "P", "name": "N", "date": "2025-01-01", "cost": 1}
+    assert client.get(f"/book/{big}").status_code == 404
+    assert client.put(f"/update/{big}", json=book).status_code == 404
+    assert client.delete(f"/delete/{big}").status_code == 404
+    assert client.get(f"/books?ids={big}").get_json()["missing"] == [big]
+    response = client.delete("/bulk/delete", json=[big])
+    assert response.get_json()["results"][0]["status"] == "not_found"
+
 @pytest.mark.global_error
 def test_method_not_allowed(client):
     response = client.patch("/create")
     assert response.status_code == 405
+
+# ----------------------------
+# SECTION 7: Connection Pool
+# ----------------------------
+
+@pytest.mark.pool
+@pytest.mark.commits
+@pytest.mark.postgres
+def test_pool_stats(client):
+    client.get("/")
+    response = client.get("/pool/stats")
+    assert response.status_code == 200
+    stats = response.get_json()
+    for key in ("in_use", "idle", "max_size", "wait_time_avg_ms"):
+        assert key in stats
+    assert stats["in_use"] == 0
+
+@pytest.mark.pool
+@pytest.mark.commits
+@pytest.mark.postgres
+def test_pool_reuses_connections(client):
+    client.get("/")
+    created = client.get("/pool/stats").get_json()["connections_created"]
+    for _ in range(5):
+        assert client.get("/").status_code == 200
+    assert client.get("/pool/stats").get_json()["connections_created"] == created
+
+@pytest.mark.pool
+@pytest.mark.commits
+@pytest.mark.postgres
+def test_pool_exhausted_returns_503(client, monkeypatch):
+    import app as app_module
+    from db_pool import ConnectionPool
+    tiny_pool = ConnectionPool(minconn=0, maxconn=1, timeout=0.05, **app_module.db_config)
+    monkeypatch.setattr(app_module, "_pool", tiny_pool)
+    monkeypatch.setattr(app_module, "_pool_pid", os.getpid())
+    held = app_module.get_db_connection()
+    try:
+        response = client.get("/")
+        assert response.status_code == 503
+        assert tiny_pool.stats()["timeouts"] == 1
+    finally:
+        held.close()
+        tiny_pool.closeall()
+
+# ----------------------------
+# SECTION 8: Paginated Listing
+# ----------------------------
+
+@pytest.mark.functional
+def test_list_books_keyset_pages(client, create_sample_books):
+    publisher, ids = create_sample_books
+    seen, cursor = [], None
+    while True:
+        query = {"publisher": publisher, "limit": 3}
+        if cursor:
+            query["after"] = cursor
+        body = client.get("/books", query_string=query).get_json()
+        seen.extend(book["id"] for book in body["data"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ids
+
+@pytest.mark.functional
+def test_list_books_filters_and_sort(client, create_sample_books):
+    publisher, ids = create_sample_books
+    query = {"publisher": publisher, "cost_min": 12, "date_to": "2024-01-05",
+             "sort": "cost", "order": "desc"}
+    response = client.get("/books", query_string=query)
+    assert response.status_code == 200
+    assert [book["id"] for book in response.get_json()["data"]] == ids[2:5][::-1]
+
+@pytest.mark.functional
+def test_list_books_invalid_params(client):
+    assert client.get("/books?limit=0").status_code == 400
+    assert client.get("/books?sort=secret").status_code == 400
+    assert client.get("/books?after=garbage").status_code == 400
+    # Well-formed cursors whose value has the wrong type for the sort column.
+    import base64
+    for sort, value, last_id in (("name", ["x"], 1), ("cost", {"a": 1}, 1), ("id", "5", 5), ("date", "2024-01-01", True)):
+        raw = base64.urlsafe_b64encode(json.dumps([sort, "asc", value, last_id]).encode()).decode()
+        response = client.get("/books", query_string={"sort": sort, "after": raw})
+        assert response.status_code == 400
+        assert response.get_json()["error"] == "Invalid cursor"
+
+# ----------------------------
+# SECTION 9: Streaming Export
+# ----------------------------
+
+@pytest.mark.functional
+def test_export_ndjson(client, create_sample_books):
+    publisher, ids = create_sample_books
+    response = client.get("/export?format=ndjson")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    exported = [row["id"] for row in rows if row["publisher"] == publisher]
+    assert exported == ids
+
+@pytest.mark.functional
+def test_export_json_and_csv(client, create_sample_books):
+    publisher, ids = create_sample_books
+    books = json.loads(client.get("/export").get_data(as_text=True))
+    assert {book["id"] for book in books} >= set(ids)
+    lines = client.get("/export?format=csv").get_data(as_text=True).splitlines()
+    assert set(lines[0].split(",")) == {"id", "publisher", "name", "date", "cost", "version"}
+    assert sum(publisher in line for line in lines) == len(ids)
+    assert client.get("/export?format=xml").status_code == 400
+
+# ----------------------------
+# SECTION 10: Bulk Endpoints
+# ----------------------------
+
+@pytest.mark.create_api
+def test_bulk_create_reports_per_item(client, storage):
+    payload = [
+        {"publisher": "BulkPub", "name": "Bulk1", "date": "2025-01-01", "cost": 10},
+        {"publisher": "BulkPub", "name": "Bulk2", "date": "2025-13-01", "cost": 10},
+        {"publisher": "BulkPub", "name": "Bulk3", "date": "2025-01-03", "cost": 30},
+    ]
+    response = client.post("/bulk/create", json=payload)
+    body = response.get_json()
+    assert response.status_code == 207
+    assert [r["status"] for r in body["results"]] == ["created", "error", "created"]
+    assert "Invalid date format" in body["results"][1]["error"]
+    created = [body["results"][0]["id"], body["results"][2]["id"]]
+    with storage.write() as books:
+        stored = sorted(books.get_books(created), key=lambda book: book["id"])
+        assert [book["name"] for book in stored] == ["Bulk1", "Bulk3"]
+        books.delete_books(created)
+
+@pytest.mark.functional
+def test_bulk_rejects_malformed_json_and_nested_values(client):
+    response = client.post("/bulk/create", data="[{", content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid JSON body"}
+
+    payload = [{"publisher": ["P"], "name": "N", "date": "2025-01-01", "cost": 1},
+               {"publisher": "P", "name": {"n": 1}, "date": "2025-01-01", "cost": 1}]
+    response = client.post("/bulk/create", json=payload)
+    assert response.status_code == 400
+    assert [r["error"] for r in response.get_json()["results"]] == [
+        "Invalid publisher. Must be a string.", "Invalid name. Must be a string."]
+    response = client.post("/create", json=payload[1])
+    assert response.status_code == 400
+
+@pytest.mark.functional
+def test_bulk_create_non_string_keys(client, storage):
+    # name/publisher are stored as text; results must still match their items.
+    payload = [{"publisher": 42, "name": 2001, "date": "2025-01-01", "cost": 10}]
+    response = client.post("/bulk/create", json=payload)
+    assert response.status_code == 200
+    result = response.get_json()["results"][0]
+    assert result["status"] == "created"
+    with storage.write() as books:
+        assert books.get_book(result["id"])["name"] == "2001"
+        books.delete_book(result["id"])
+
+@pytest.mark.update_api
+def test_bulk_update(client, create_sample_books):
+    publisher, ids = create_sample_books
+    payload = [
+        {"id": ids[0], "publisher": publisher, "name": "Renamed", "date": "2024-02-01", "cost": 1},
+        {"id": 99999999, "publisher": publisher, "name": "Ghost", "date": "2024-02-01", "cost": 1},
+    ]
+    response = client.put("/bulk/update", json=payload)
+    assert response.status_code == 207
+    assert [r["status"] for r in response.get_json()["results"]] == ["updated", "not_found"]
+
+    response = client.put("/bulk/update", json=[{"id": True, "publisher": publisher, "name": "Bool",
+                                                 "date": "2024-02-01", "cost": 1}])
+    assert response.status_code == 400
+    assert response.get_json()["results"][0]["error"] == "Missing field: id"
+
+@pytest.mark.delete_api
+def test_bulk_delete(client, create_sample_books):
+    publisher, ids = create_sample_books
+    response = client.delete("/bulk/delete", json=ids[:2] + [99999999, "x"])
+    statuses = [r["status"] for r in response.get_json()["results"]]
+    assert response.status_code == 207
+    assert statuses == ["deleted", "deleted", "not_found", "error"]
+    assert client.delete("/bulk/delete", json={"ids": ids}).status_code == 400
+
+# ----------------------------
+# SECTION 11: Response Cache
+# ----------------------------
+
+@pytest.mark.functional
+def test_list_cache_hit_and_conditional_get(client):
+    first = client.get("/")
+    etag = first.headers["ETag"]
+    before = client.get("/cache/stats").get_json()
+    second = client.get("/")
+    assert second.get_data() == first.get_data()
+    assert client.get("/cache/stats").get_json()["hits"] == before["hits"] + 1
+    not_modified = client.get("/", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.get_data() == b""
+
+@pytest.mark.functional
+def test_write_invalidates_cache(client, create_sample_book):
+    book_id = create_sample_book
+    etag = client.get("/").headers["ETag"]
+    client.delete(f"/delete/{book_id}")
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert book_id not in [book["id"] for book in response.get_json()]
+
+@pytest.mark.functional
+def test_invalidation_from_another_worker():
+    import multiprocessing
+    from response_cache import ResponseCache
+    # Created before the fork, as serve.py's preloaded app is.
+    cache = ResponseCache()
+    cache.set("/", b"[]", "application/json", cache.generation)
+    assert cache.get("/") is not None
+    worker = multiprocessing.get_context("fork").Process(target=cache.invalidate)
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0
+    assert cache.get("/") is None
+
+# ----------------------------
+# SECTION 12: Single and Batched Lookup
+# ----------------------------
+
+@pytest.mark.functional
+def test_get_single_book(client, create_sample_book):
+    book_id = create_sample_book
+    response = client.get(f"/book/{book_id}")
+    assert response.status_code == 200
+    assert response.get_json()["name"] == "TestBook"
+    etag = response.headers["ETag"]
+    assert client.get(f"/book/{book_id}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/book/99999999").status_code == 404
+
+@pytest.mark.consistency
+def test_book_json_types(client, create_sample_book):
+    book = client.get(f"/book/{create_sample_book}").get_json()
+    assert book["date"] == "2025-01-01"
+    assert book["cost"] in ("50.0", "50.00", "50")
+
+@pytest.mark.functional
+def test_get_books_by_ids(client, create_sample_books):
+    publisher, ids = create_sample_books
+    wanted = [ids[3], ids[0], 99999999]
+    response = client.get("/books", query_string={"ids": ",".join(map(str, wanted))})
+    body = response.get_json()
+    assert response.status_code == 200
+    assert [book["id"] for book in body["data"]] == [ids[3], ids[0]]
+    assert body["missing"] == [99999999]
+    assert client.get("/books?ids=1,two").status_code == 400
+
+@pytest.mark.operational
+@pytest.mark.postgres
+def test_health_reports_pool_state(client):
+    response = client.get("/health")
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["status"] == "healthy"
+    assert body["pool"]["in_use"] == 0
+
+@pytest.mark.operational
+def test_pool_rebuilt_after_fork(monkeypatch):
+    import app as app_module
+    inherited = app_module.get_pool()
+    # Simulate running in a forked child: the inherited pool must not be reused.
+    monkeypatch.setattr(app_module, "_pool_pid", -1)
+    fresh = app_module.get_pool()
+    assert fresh is not inherited
+    assert app_module.get_pool() is fresh
+
+# ----------------------------
+# SECTION 13: Instrumentation
+# ----------------------------
+
+@pytest.mark.operational
+@pytest.mark.postgres
+def test_metrics_instrumentation():
+    import psycopg2
+    from flask import Flask, jsonify
+    import app as app_module
+    import metrics
+    from json_provider import FastJSONProvider
+
+    mini = Flask("metrics_test")
+    mini.json = FastJSONProvider(mini)
+    metrics.instrument(mini, slow_query_ms=10_000)
+
+    @mini.route("/probe/<int:n>")
+    def probe(n):
+        conn = psycopg2.connect(cursor_factory=metrics.InstrumentedCursor, **app_module.db_config)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT generate_series(1, %s)", (n,))
+                rows = cursor.fetchall()
+        finally:
+            conn.close()
+        return jsonify(len(rows))
+
+    client = mini.test_client()
+    response = client.get("/probe/5")
+    assert "query;dur=" in response.headers["Server-Timing"]
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'book_api_requests_total{method="GET",route="/probe/<int:n>",status="200"} 1' in body
+    assert 'book_api_request_duration_seconds_count{method="GET",route="/probe/<int:n>"} 1' in body
+    assert 'book_api_db_queries_total{route="/probe/<int:n>"} 1' in body
+    assert 'book_api_db_rows_total{route="/probe/<int:n>"} 5' in body
+    assert 'book_api_request_phase_seconds_count{route="/probe/<int:n>",phase="serialize"} 1' in body
+
+@pytest.mark.operational
+@pytest.mark.postgres
+def test_slow_query_log_shows_prepared_sql(monkeypatch, caplog):
+    import psycopg2
+    import app as app_module
+    import book_queries
+    import metrics
+
+    monkeypatch.setattr(metrics, "slow_query_threshold", 0)
+    conn = psycopg2.connect(cursor_factory=metrics.InstrumentedCursor, **app_module.db_config)
+    try:
+        with conn.cursor() as cursor, caplog.at_level("WARNING", logger="book_api.sql"):
+            book_queries.get_book(cursor, 424242)
+    finally:
+        conn.close()
+    executed = caplog.messages[-1]
+    assert book_queries.BOOK_BY_ID.sql in executed
+    assert "EXECUTE book_by_id (424242)" in executed
+
+# ----------------------------
+# SECTION 14: Search
+# ----------------------------
+
+@pytest.mark.functional
+@pytest.mark.postgres
+def test_search_ranks_and_pages(client, db_connection):
+    conn, cursor = db_connection
+    ids = []
+    for name, publisher in (("Zephyrine Gardens", "SearchPub"),
+                            ("Zephyrine Zephyrine Almanac", "SearchPub"),
+                            ("Unrelated Title", "Zephyrine Press")):
+        cursor.execute(
+            "INSERT INTO book (publisher, name, date, cost) VALUES (%s, %s, %s, %s) RETURNING id",
+            (publisher, name, "2024-02-01", 20.0)
+        )
+        ids.append(cursor.fetchone()[0])
+    conn.commit()
+    try:
+        body = client.get("/search", query_string={"q": "zephyrine"}).get_json()
+        found = [book["id"] for book in body["data"]]
+        # Title matches (weight A) outrank the publisher-only match (weight B).
+        assert set(found) >= set(ids) and found.index(ids[2]) > found.index(ids[0])
+        assert all(a["rank"] >= b["rank"] for a, b in zip(body["data"], body["data"][1:]))
+
+        seen, after = [], None
+        while True:
+            query = {"q": "zephyrine", "limit": 1}
+            if after:
+                query["after"] = after
+            page = client.get("/search", query_string=query).get_json()
+            seen.extend(book["id"] for book in page["data"])
+            after = page["next_cursor"]
+            if after is None:
+                break
+        assert seen == found
+        assert client.get("/search").status_code == 400
+    finally:
+        cursor.execute("DELETE FROM book WHERE id = ANY(%s)", (ids,))
+        conn.commit()
+
+# ----------------------------
+# SECTION 15: Statistics
+# ----------------------------
+
+@pytest.mark.functional
+def test_stats_follow_writes(client, create_sample_books):
+    publisher, ids = create_sample_books
+    yearly = client.get("/stats/yearly", query_string={"publisher": publisher}).get_json()
+    assert yearly == [{"publisher": publisher, "year": 2024, "book_count": 7, "average_cost": "13.00"}]
+
+    client.put(f"/update/{ids[0]}", json={"publisher": publisher, "name": "Moved",
+                                           "date": "2023-05-01", "cost": 10})
+    client.delete(f"/delete/{ids[1]}")
+    yearly = client.get("/stats/yearly", query_string={"publisher": publisher}).get_json()
+    assert [(row["year"], row["book_count"]) for row in yearly] == [(2023, 1), (2024, 5)]
+
+@pytest.mark.consistency
+def test_stats_match_table(client, create_sample_books, storage):
+    with storage.read() as books:
+        catalog = books.all_books(("publisher",))
+    book_count, publisher_count = len(catalog), len({book["publisher"] for book in catalog})
+    totals = client.get("/stats").get_json()
+    assert (totals["book_count"], totals["publisher_count"]) == (book_count, publisher_count)
+    publishers = client.get("/stats/publishers").get_json()
+    assert sum(row["book_count"] for row in publishers) == book_count
+
+# ----------------------------
+# SECTION 16: Upsert and Idempotency
+# ----------------------------
+
+def books_of(storage, publisher):
+    with storage.read() as books:
+        return [book for book in books.all_books() if book["publisher"] == publisher]
+
+@pytest.fixture
+def upsert_cleanup(storage):
+    yield "UpsertPub"
+    ids = [book["id"] for book in books_of(storage, "UpsertPub")]
+    with storage.write() as books:
+        books.delete_books(ids)
+
+@pytest.mark.create_api
+def test_create_conflict_modes(client, upsert_cleanup):
+    payload = {"publisher": upsert_cleanup, "name": "Dup", "date": "2025-01-01", "cost": 10}
+    created = client.post("/create", json=payload)
+    assert created.status_code == 201
+    book_id = created.get_json()["data"]["id"]
+
+    duplicate = client.post("/create", json=payload)
+    assert duplicate.status_code == 409
+    assert duplicate.get_json()["data"]["id"] == book_id
+
+    ignored = client.post("/create?on_conflict=ignore", json=dict(payload, cost=99))
+    assert ignored.status_code == 200
+    assert float(ignored.get_json()["data"]["cost"]) == 10
+
+    updated = client.post("/create?on_conflict=update", json=dict(payload, cost=99))
+    assert updated.status_code == 200
+    assert updated.get_json()["data"]["id"] == book_id
+    assert float(updated.get_json()["data"]["cost"]) == 99
+    assert client.post("/create?on_conflict=merge", json=payload).status_code == 400
+
+@pytest.mark.create_api
+def test_create_idempotency_key(client, upsert_cleanup, storage):
+    import uuid
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    payload = {"publisher": upsert_cleanup, "name": "Once", "date": "2025-01-01", "cost": 10}
+    first = client.post("/create", json=payload, headers=headers)
+    retry = client.post("/create", json=payload, headers=headers)
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert len(books_of(storage, upsert_cleanup)) == 1
+    assert client.post("/create", json=dict(payload, cost=11), headers=headers).status_code == 422
+
+# ----------------------------
+# SECTION 17: Synthetic Data Generator
+# ----------------------------
+
+@pytest.mark.operational
+def test_seed_batches_are_deterministic():
+    import seed_books
+    publishers = seed_books.make_publishers(50, seed=1)
+    weights = seed_books.publisher_weights(50)
+    first, count = seed_books.generate_batch(1, 2, 100, 250, publishers, weights)
+    again, _ = seed_books.generate_batch(1, 2, 100, 250, publishers, weights)
+    other, _ = seed_books.generate_batch(2, 2, 100, 250, publishers, weights)
+    lines = first.getvalue().splitlines()
+    assert count == len(lines) == 50
+    assert first.getvalue() == again.getvalue() != other.getvalue()
+    name, publisher, published, cost = lines[0].split("\t")
+    assert name.endswith("(201)") and publisher in publishers and float(cost) > 0
+
+# ----------------------------
+# SECTION 18: Conditional Updates
+# ----------------------------
+
+@pytest.mark.update_api
+def test_update_if_match(client, create_sample_book):
+    book_id = create_sample_book
+    etag = client.get(f"/book/{book_id}").headers["ETag"]
+    payload = {"publisher": "TestPub", "name": "Edited", "date": "2025-01-01", "cost": 50}
+
+    first = client.put(f"/update/{book_id}", json=payload, headers={"If-Match": etag})
+    assert first.status_code == 200
+    assert first.get_json()["data"]["version"] == 2
+    assert first.headers["ETag"] != etag
+
+    # A second editor still holding the old ETag must not overwrite the first.
+    stale = client.put(f"/update/{book_id}", json=dict(payload, name="Lost"), headers={"If-Match": etag})
+    assert stale.status_code == 412
+    assert stale.get_json()["data"]["name"] == "Edited"
+    assert client.get(f"/book/{book_id}").headers["ETag"] == first.headers["ETag"]
+
+@pytest.mark.update_api
+def test_patch_writes_only_given_fields(client, create_sample_book):
+    book_id = create_sample_book
+    response = client.patch(f"/update/{book_id}", json={"cost": 75})
+    book = response.get_json()["data"]
+    assert response.status_code == 200
+    assert (book["name"], float(book["cost"]), book["version"]) == ("TestBook", 75, 2)
+    assert client.patch(f"/update/{book_id}", json={"color": "red"}).status_code == 400
+    assert client.patch("/update/99999999", json={"cost": 1}).status_code == 404
+
+# ----------------------------
+# SECTION 19: Change Feed
+# ----------------------------
+
+def settled_cursor(client, op, book_id, timeout=10):
+    """
+    Cursor of the (op, book_id) change once the feed serves it. The txid
+    fence is cluster-wide, so a transaction still open in another worker's
+    database can hold new changes back for a moment.
+    """
+    deadline = time.monotonic() + timeout
+    since = "0"
+    while True:
+        body = client.get("/changes", query_string={"since": since}).get_json()
+        for change in body["data"]:
+            if (change["op"], change["id"]) == (op, book_id):
+                return change["cursor"]
+        since = body["next_cursor"]
+        if not body["has_more"]:
+            assert time.monotonic() < deadline, f"{op} of book {book_id} never reached the change feed"
+            time.sleep(0.05)
+
+@pytest.mark.functional
+@pytest.mark.commits
+@pytest.mark.postgres
+def test_changes_since_cursor(client, create_sample_book):
+    book_id = create_sample_book
+    head = settled_cursor(client, "insert", book_id)
+    client.patch(f"/update/{book_id}", json={"cost": 51})
+    client.delete(f"/delete/{book_id}")
+    deleted = settled_cursor(client, "delete", book_id)
+    assert client.get("/changes").get_json()["next_cursor"] == deleted
+
+    body = client.get("/changes", query_string={"since": head, "limit": 1}).get_json()
+    assert body["has_more"] and len(body["data"]) == 1
+    rest = client.get("/changes", query_string={"since": body["next_cursor"]}).get_json()
+    changes = [(c["op"], c["id"]) for c in body["data"] + rest["data"]]
+    assert changes == [("update", book_id), ("delete", book_id)]
+    # The book is gone, so every entry reports its current state as None.
+    assert all(c["book"] is None for c in body["data"] + rest["data"])
+    assert client.get("/changes?since=bogus").status_code == 400
+
+@pytest.mark.functional
+@pytest.mark.commits
+@pytest.mark.postgres
+def test_changes_stream_pushes_notify(client, create_sample_book):
+    import threading
+    book_id = create_sample_book
+    head = settled_cursor(client, "insert", book_id)
+    response = client.get("/changes/stream", headers={"Last-Event-ID": head}, buffered=False)
+    assert response.mimetype == "text/event-stream"
+    events = iter(response.response)
+    assert next(events).startswith(b"retry:")
+    # The stream is idle until the update's NOTIFY wakes it.
+    timer = threading.Timer(0.3, lambda: client.patch(f"/update/{book_id}", json={"cost": 52}))
+    timer.start()
+    try:
+        event = next(events).decode()
+    finally:
+        timer.join()
+        response.close()
+    assert event.startswith("id: ") and "event: change" in event
+    data = json.loads(event.split("data: ", 1)[1])
+    assert (data["op"], data["id"], data["book"]["version"]) == ("update", book_id, 2)
+
+@pytest.mark.functional
+@pytest.mark.commits
+@pytest.mark.postgres
+def test_changes_stream_waits_out_the_fence(client, create_sample_book):
+    import threading
+    import psycopg2
+    from app import db_config, get_change_listener
+    book_id = create_sample_book
+    head = settled_cursor(client, "insert", book_id)
+    listener = get_change_listener()
+    blocker = psycopg2.connect(**db_config)
+    try:
+        with blocker.cursor() as cursor:
+            cursor.execute("SELECT pg_current_xact_id()")     # holds the fence until commit
+        response = client.get("/changes/stream", headers={"Last-Event-ID": head}, buffered=False)
+        events = iter(response.response)
+        assert next(events).startswith(b"retry:")
+        checks = listener.fence_checks
+        # Committed, NOTIFY sent, but withheld until the blocker ends.
+        assert client.patch(f"/update/{book_id}", json={"cost": 53}).status_code == 200
+        timer = threading.Timer(0.5, blocker.commit)
+        timer.start()
+        try:
+            event = next(events).decode()
+        finally:
+            timer.join()
+            response.close()
+    finally:
+        blocker.close()
+    assert "event: change" in event
+    assert json.loads(event.split("data: ", 1)[1])["op"] == "update"
+    # The listener watched the fence for the stream.
+    assert listener.fence_checks > checks
+
+@pytest.mark.functional
+@pytest.mark.commits
+@pytest.mark.postgres
+def test_change_log_pruned_after_retention():
+    import psycopg2
+    from app import db_config, create_change_listener
+    conn = psycopg2.connect(**db_config)
+    conn.autocommit = True
+    listener = None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO book_change (book_id, op, changed_at)
+                VALUES (0, 'delete', now() - interval '30 days'), (0, 'delete', now())
+                RETURNING seq
+            """)
+            old, recent = [row[0] for row in cursor.fetchall()]
+            listener = create_change_listener()
+            deadline = time.monotonic() + 5
+            while not listener.pruned:
+                assert time.monotonic() < deadline, "the change log was never pruned"
+                time.sleep(0.05)
+            # Only entries older than CHANGE_RETENTION_DAYS go.
+            cursor.execute("SELECT array_agg(seq) FROM book_change WHERE seq IN (%s, %s)", (old, recent))
+            assert cursor.fetchone()[0] == [recent]
+    finally:
+        if listener is not None:
+            listener.stop()
+        conn.close()
+
+# ----------------------------
+# SECTION 20: Query Layer
+# ----------------------------
+
+@pytest.mark.functional
+@pytest.mark.postgres
+def test_statements_prepared_once_per_connection(db_connection, create_sample_book):
+    import book_queries
+    conn, cursor = db_connection
+    book_id = create_sample_book
+    assert book_queries.get_book(cursor, book_id)["name"] == "TestBook"
+    assert book_queries.get_book(cursor, book_id + 100000) is None
+    cursor.execute("SELECT count(*) FROM pg_prepared_statements WHERE name = 'book_by_id'")
+    assert cursor.fetchone()[0] == 1
+    # PATCH-shaped and conditional updates get their own statements.
+    assert book_queries.update_book(cursor, book_id, {"cost": 60}, versions=[7]) is None
+    book = book_queries.update_book(cursor, book_id, {"cost": 60}, versions=[1])
+    assert (float(book["cost"]), book["version"]) == (60.0, 2)
+    assert book_queries.update_book(cursor, book_id, {"cost": 61})["version"] == 3
+    assert book_queries.delete_books(cursor, [book_id, book_id + 100000]) == {book_id}
+
+# ----------------------------
+# SECTION 21: Read Replicas
+# ----------------------------
+# Stand-in replicas: read-only sessions on the test database, and a port
+# nothing listens on for a replica that is down.
+
+@pytest.fixture
+def read_replicas(monkeypatch):
+    import app as app_module
+
+    def configure(*replicas):
+        monkeypatch.setattr(app_module, "replica_configs", list(replicas))
+        app_module.close_pool()
+        return app_module.get_router()
+
+    yield configure
+    monkeypatch.undo()
+    app_module.close_pool()
+
+def read_only_replica():
+    from app import db_config
+    return dict(db_config, options="-c default_transaction_read_only=on")
+
+def down_replica():
+    from app import db_config
+    return dict(db_config, host="127.0.0.1", port=1, connect_timeout=1)
+
+@pytest.mark.pool
+@pytest.mark.commits
+@pytest.mark.postgres
+def test_reads_use_replica_until_own_write(app, read_replicas):
+    from app import response_cache
+    router = read_replicas(read_only_replica())
+    client = app.test_client()      # own cookie jar
+    assert client.get("/").status_code == 200
+    assert router.stats()["replica_reads"] == 1
+
+    created = client.post("/create", json={"publisher": "ReplicaPub", "name": "ReplicaBook",
+                                           "date": "2025-01-01", "cost": 5})
+    # The write reached the primary: the replica session is read-only.
+    assert created.status_code == 201
+    book_id = created.get_json()["data"]["id"]
+    try:
+        assert "read_primary_until" in created.headers["Set-Cookie"]
+        assert client.get(f"/book/{book_id}").status_code == 200
+        stats = router.stats()
+        assert (stats["replica_reads"], stats["primary_reads"]) == (1, 1)
+        # Other clients keep reading from the replica.
+        response_cache.clear()
+        assert app.test_client().get(f"/book/{book_id}").status_code == 200
+        assert router.stats()["replica_reads"] == 2
+        # ...but inside the window that read is not cached for the writer to get later.
+        assert response_cache.stats()["entries"] == 0
+
+        # A cross-origin client gets no cookie; it echoes the header instead.
+        until = created.headers["Read-Primary-Until"]
+        assert "Read-Primary-Until" in created.headers["Access-Control-Expose-Headers"]
+        echoing = app.test_client()
+        assert echoing.get("/", headers={"Read-Primary-Until": until}).status_code == 200
+        assert router.stats()["primary_reads"] == 2
+        # A window longer than DB_READ_YOUR_WRITES was not set by the server.
+        forged = f"{float(until) + 3600:.3f}"
+        assert echoing.get("/books", headers={"Read-Primary-Until": forged}).status_code == 200
+        assert router.stats()["replica_reads"] == 3
+    finally:
+        client.delete(f"/delete/{book_id}")
+
+@pytest.mark.pool
+@pytest.mark.commits
+@pytest.mark.postgres
+def test_down_replica_fails_over(client, read_replicas):
+    from app import parse_replica_hosts
+    assert [(c["host"], c.get("port")) for c in parse_replica_hosts("a, b:5433")] == [("a", None), ("b", 5433)]
+
+    router = read_replicas(down_replica(), read_only_replica())
+    for page in range(3):
+        assert client.get("/books", query_string={"page": page + 1}).status_code == 200
+    stats = router.stats()
+    assert stats["failovers"] == 1 and stats["replica_reads"] == 3
+    assert [replica["up"] for replica in stats["replicas"]] == [False, True]
+    assert client.get("/pool/stats").get_json()["read_routing"]["failovers"] == 1
+
+    router = read_replicas(down_replica())
+    assert client.get("/").status_code == 200
+    assert router.stats()["primary_reads"] == 1
+
+# ----------------------------
+# SECTION 22: Compression and Field Projection
+# ----------------------------
+
+@pytest.fixture
+def many_books(storage):
+    publisher = "GzipPub"
+    with storage.write() as books:
+        rows = books.insert_books([(publisher, f"Compressible Book {i}", "2024-02-01", 20 + i) for i in range(30)])
+    yield publisher
+    with storage.write() as books:
+        books.delete_books([row[0] for row in rows])
+
+@pytest.mark.functional
+def test_gzip_negotiated_above_threshold(client, many_books):
+    import gzip
+    url = f"/books?publisher={many_books}&limit=50"
+    plain = client.get(url)
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    compressed = client.get(url, headers={"Accept-Encoding": "br;q=0, gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert len(compressed.data) < len(plain.data)
+    assert gzip.decompress(compressed.data) == plain.data
+    # Served from the response cache: the compressed variant is reused.
+    assert client.get(url, headers={"Accept-Encoding": "gzip"}).data == compressed.data
+
+    small = client.get("/books?limit=1", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+
+@pytest.mark.functional
+def test_streamed_export_is_compressed(client, many_books):
+    import gzip
+    response = client.get("/export?format=ndjson", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert sum(json.loads(line)["publisher"] == many_books for line in lines) == 30
+
+@pytest.mark.functional
+def test_accept_encoding_negotiation():
+    from compression import negotiate, supported_encodings
+    assert negotiate("") is None
+    assert negotiate("identity") is None
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("deflate, gzip;q=0.5") == "gzip"
+    assert negotiate("*") == supported_encodings()[0]
+
+@pytest.mark.functional
+def test_fields_projection(client, many_books):
+    books = client.get("/", query_string={"fields": "name,cost"}).get_json()
+    assert books and all(set(book) == {"name", "cost"} for book in books)
+
+    query = {"publisher": many_books, "fields": "name", "sort": "cost", "limit": 20}
+    page = client.get("/books", query_string=query).get_json()
+    assert all(set(book) == {"name"} for book in page["data"])
+    rest = client.get("/books", query_string={**query, "after": page["next_cursor"]}).get_json()
+    names = [book["name"] for book in page["data"] + rest["data"]]
+    assert names == [f"Compressible Book {i}" for i in range(30)]
+
+    assert client.get("/?fields=name,isbn").status_code == 400
+    assert client.get("/books?fields=").status_code == 400
+
+# ----------------------------
+# SECTION 23: Storage Backends
+# ----------------------------
+
+@pytest.mark.functional
+def test_failed_write_session_rolls_back(storage):
+    with storage.write() as books:
+        book_id = books.insert_book({"publisher": "RollbackPub", "name": "Kept", "date": "2024-01-01", "cost": 5})[0]["id"]
+    with pytest.raises(RuntimeError):
+        with storage.write() as books:
+            books.update_book(book_id, {"cost": 6})
+            books.insert_book({"publisher": "RollbackPub", "name": "Dropped", "date": "2024-01-02", "cost": 7})
+            raise RuntimeError("abort the session")
+    with storage.read() as books:
+        assert books.find_book("Dropped", "RollbackPub") is None
+        assert books.get_book(book_id)["cost"] == Decimal("5")
+    with storage.write() as books:
+        books.delete_book(book_id)
+
+@pytest.mark.functional
+def test_memory_storage_constraints():
+    from memory_storage import MemoryStorage
+    from storage import ConstraintViolation, DuplicateBook, InvalidValue
+    store = MemoryStorage()
+    with store.write() as books:
+        first = books.insert_book({"publisher": "P", "name": "A", "date": "2024-01-01", "cost": "1e2"})[0]
+        second = books.insert_book({"publisher": "P", "name": "B", "date": "2024-01-01", "cost": 3})[0]
+    assert first["cost"] == Decimal("100") and first["date"] == date(2024, 1, 1)
+
+    with pytest.raises(DuplicateBook):
+        with store.write() as books:
+            books.update_book(second["id"], {"name": "A"})
+    for bad, error in (({"date": "2024-02-30"}, InvalidValue), ({"cost": "NaN"}, InvalidValue),
+                       ({"publisher": None}, ConstraintViolation)):
+        with pytest.raises(error):
+            with store.write() as books:
+                books.insert_book({"publisher": "P", "name": "C", "date": "2024-01-01", "cost": 1, **bad})
+    with store.read() as books:
+        assert [book["name"] for book in books.all_books()] == ["A", "B"]
+        assert books.stats()["book_count"] == 2
+
+@pytest.mark.functional
+def test_memory_list_matches_brute_force():
+    import random
+    from memory_storage import MemoryStorage
+    from storage import ListQuery
+    rng = random.Random(7)
+    store = MemoryStorage()
+    with store.write() as books:
+        books.insert_books([(rng.choice("ABCD"), f"Book {i}", f"20{rng.randint(10, 24)}-0{rng.randint(1, 9)}-15",
+                             rng.randint(1, 40)) for i in range(300)])
+        rows = books.all_books()
+
+    for _ in range(60):
+        sort, order = rng.choice(["id", "name", "publisher", "date", "cost"]), rng.choice(["asc", "desc"])
+        filters = {}
+        if rng.random() < 0.5:
+            filters["cost_min"], filters["cost_max"] = sorted(rng.sample(range(1, 41), 2))
+        if rng.random() < 0.5:
+            filters["date_from"], filters["date_to"] = date(2012, 1, 1), date(rng.randint(2013, 2024), 6, 30)
+        publishers = rng.sample("ABCD", rng.randint(0, 2))
+        expected = [row for row in rows
+                    if (not publishers or row["publisher"] in publishers)
+                    and filters.get("cost_min", 0) <= row["cost"] <= filters.get("cost_max", 99)
+                    and filters.get("date_from", date.min) <= row["date"] <= filters.get("date_to", date.max)]
+        expected.sort(key=lambda row: (row[sort], row["id"]), reverse=order == "desc")
+
+        seen, after, limit = [], None, rng.choice([1, 7, 50])
+        while True:
+            with store.read() as books:
+                page = books.list_books(ListQuery(limit, sort, order, publishers=publishers, after=after, **filters))
+            seen += page[:limit]
+            if len(page) <= limit:
+                break
+            after = (page[limit - 1][sort], page[limit - 1]["id"])
+        assert [row["id"] for row in seen] == [row["id"] for row in expected]
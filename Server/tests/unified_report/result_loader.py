@@ -0,0 +1,175 @@
+"""
+Incremental loading of Newman and pytest JSON reports.
+
+A long Newman run stores every request and response body, so
+newman-result.json can reach hundreds of MB. Instead of json.load() the
+files are walked member by member: arrays such as run.executions are
+decoded one element at a time and trimmed to the fields the report uses,
+and everything else is decoded and dropped as soon as it is passed. Peak
+memory is one element (plus the read buffer), not the whole document.
+"""
+import json
+
+CHUNK_SIZE = 1 << 20
+_WHITESPACE = ' \t\n\r'
+
+
+class _Reader:
+    """Buffered reader that decodes one JSON value at a time."""
+
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size=None):
+        if self._eof:
+            return False
+        chunk = self._fp.read(size or self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            buffer, pos = self._buffer, self._pos
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self._fill():
+                return ''
+
+    def take(self, expected):
+        char = self.peek()
+        if char not in expected:
+            raise json.JSONDecodeError(f"Expecting one of {expected!r}", self._buffer, self._pos)
+        self._pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete value, reading more input as needed."""
+        self.peek()
+        size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill(size):
+                    raise
+                size *= 2      # large element: grow reads so retries stay few
+                continue
+            # A number may continue past the end of what has been read so far.
+            if end == len(self._buffer) and not self._eof and self._fill(size):
+                continue
+            self._pos = end
+            return value
+
+    def members(self):
+        """Iterate the keys of an object; the caller consumes each value."""
+        self.take('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.take(':')
+            yield key
+            if self.take(',}') == '}':
+                return
+
+    def items(self):
+        """Iterate an array; the caller consumes each element."""
+        self.take('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield
+            if self.take(',]') == ']':
+                return
+
+
+def stream_json(fp, keep=(), each=None):
+    """
+    Walk a JSON document. Values at the dotted paths in ``keep`` are
+    returned in a dict; for array paths in ``each`` the mapped function is
+    called with every element and its results are collected in a list.
+    All other values are skipped.
+    """
+    each = each or {}
+    wanted = set(keep) | set(each)
+    result = {}
+
+    def walk(path):
+        for key in reader.members():
+            child = f"{path}.{key}" if path else key
+            if child in each:
+                transform = each[child]
+                result[child] = [transform(reader.value()) for _ in reader.items()]
+            elif child in keep:
+                result[child] = reader.value()
+            elif reader.peek() == '{' and any(target.startswith(child + '.') for target in wanted):
+                walk(child)
+            else:
+                reader.value()
+
+    reader = _Reader(fp)
+    walk('')
+    return result
+
+
+# --- Report-specific loaders ---
+def _execution(execution):
+    return {"item": {"name": execution["item"]["name"]},
+            "response_time": (execution.get("response") or {}).get("responseTime")}
+
+
+def _failure(failure):
+    source = failure.get("source")
+    error = failure.get("error") or {}
+    return {
+        "source": {"name": source.get("name", "Unknown Test")} if isinstance(source, dict) else source,
+        "error": {key: error[key] for key in ("test", "name", "message") if key in error},
+    }
+
+
+def _pytest_test(test):
+    return {
+        "nodeid": test.get("nodeid"),
+        "outcome": test.get("outcome"),
+        "duration": (test.get("call") or {}).get("duration", 0),
+    }
+
+
+def load_newman(path):
+    """run.stats and run.timings, plus executions (request names, response times) and failures."""
+    with open(path, "r", encoding="utf-8") as f:
+        found = stream_json(f, keep={"run.stats", "run.timings"},
+                            each={"run.executions": _execution, "run.failures": _failure})
+    return {
+        "stats": found["run.stats"],
+        "timings": found.get("run.timings", {}),
+        "executions": found.get("run.executions", []),
+        "failures": found.get("run.failures", []),
+    }
+
+
+def load_pytest(path):
+    """pytest-json-report summary, duration, exit code and per-test outcomes."""
+    with open(path, "r", encoding="utf-8") as f:
+        found = stream_json(f, keep={"summary", "duration", "exitcode"}, each={"tests": _pytest_test})
+    return {
+        "summary": found.get("summary", {"passed": 0, "failed": 0, "total": 0}),
+        "tests": found.get("tests", []),
+        "duration": found.get("duration", 0),
+        "exitcode": found.get("exitcode", 0),
+    }
@@ -0,0 +1,72 @@
+"""
+Map test-plan rows (TC No) to Newman executions and their pass/fail result.
+
+Both sides are indexed once: TC ids found in Newman request names map to
+the first request carrying them, and failed request names go into a set,
+so mapping a plan is a few vectorized column operations rather than a scan
+of every execution and failure per row.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+TC_ID = re.compile(r'TC\d+', re.IGNORECASE)
+
+
+def failure_source_name(failure):
+    source = failure.get("source")
+    if isinstance(source, dict):
+        return source.get("name", "Unknown Test")
+    return source or "Unknown Test"
+
+
+def index_tests_by_tc(test_names):
+    """Lower-cased TC id -> first test name (in run order) that mentions it."""
+    index = {}
+    for name in test_names:
+        for tc_id in TC_ID.findall(name):
+            index.setdefault(tc_id.lower(), name)
+    return index
+
+
+def map_test_plan(df, executions, failures):
+    """
+    Add Automation_Status, Newman_Test_Name and Automation_Result columns to
+    the test-plan DataFrame in place and return coverage statistics.
+    """
+    test_names = list(dict.fromkeys(execution["item"]["name"] for execution in executions))
+    tests_by_tc = index_tests_by_tc(test_names)
+    failed_names = {failure_source_name(failure) for failure in failures}
+
+    tc_ids = df["TC No"].astype(str).str.strip().str.lower()
+    if "Pass/Fail" in df:
+        manual = df["Pass/Fail"].astype(str).str.strip().str.lower().eq("manual")
+    else:
+        manual = pd.Series(False, index=df.index)
+
+    matched = tc_ids.map(tests_by_tc)
+    # Ids that are not TCnn (free-form plans) fall back to a substring search.
+    unindexed = matched.isna() & ~tc_ids.str.fullmatch(TC_ID.pattern.lower())
+    if unindexed.any():
+        lowered = [(name.lower(), name) for name in test_names]
+        matched[unindexed] = tc_ids[unindexed].map(
+            lambda tc_id: next((name for lower, name in lowered if tc_id in lower), None))
+    matched = matched.where(~manual)
+    automated = matched.notna()
+
+    df["Automation_Status"] = np.select([manual, automated], ["Manual Required", "Automated"], "Not Automated")
+    df["Newman_Test_Name"] = matched.fillna("")
+    df["Automation_Result"] = np.where(
+        automated, np.where(matched.isin(failed_names), "❌ Failed", "✅ Passed"), "")
+
+    total = len(df)
+    automated_count = int(automated.sum())
+    manual_count = int(manual.sum())
+    return {
+        "total": total,
+        "automated": automated_count,
+        "manual_required": manual_count,
+        "not_automated": total - automated_count - manual_count,
+        "automation_coverage": (automated_count / total * 100) if total > 0 else 0,
+    }
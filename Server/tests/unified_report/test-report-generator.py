@@ -5,26 +5,38 @@ from datetime import datetime
 import os
 import re
 
+import trend_store
+from result_loader import load_newman, load_pytest
+from tc_mapping import failure_source_name, map_test_plan
+
 # ---------- ENHANCED CONFIGURATION (paths resolved relative to this script) ----------
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 TESTS_DIR = os.path.dirname(SCRIPT_DIR)  # .../Server/tests
 POSTMAN_DIR = os.path.join(TESTS_DIR, "postman_newman")
+BENCHMARK_DIR = os.path.join(TESTS_DIR, "benchmark")
 
 # Inputs
 newman_json = os.path.join(POSTMAN_DIR, "newman-result.json")
 pytest_json = os.path.join(TESTS_DIR, "pytest", "pytest-report.json")
 csv_file = os.path.join(TESTS_DIR, "Flask_CRUD_TestPlan_44TCs.csv")
+perf_json = os.path.join(BENCHMARK_DIR, "perf-results.json")
 
 # Output (always generate into unified_report)
 OUTPUT_DIR = os.path.join(TESTS_DIR, "unified_report")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 output_html = os.path.join(OUTPUT_DIR, "comprehensive-test-report.html")
 
+# Run history (SQLite) for trend charts and duration regressions
+history_db = os.environ.get("REPORT_HISTORY_DB", os.path.join(OUTPUT_DIR, "test-history.sqlite3"))
+TREND_RUNS = 30             # runs shown in the trend charts
+REGRESSION_WINDOW = 10      # prior runs a test's duration is compared against
+MAX_DURATION_REGRESSION = 50.0  # percent above the median of that window
+
 # ---------- LOAD NEWMAN DATA ----------
 print("🔍 Loading Newman results...")
 try:
-    with open(newman_json, "r", encoding="utf-8") as f:
-        newman_data = json.load(f)
+    # Streamed: only stats, request names and failure details are kept in memory
+    newman_data = load_newman(newman_json)
     print(f"✅ Newman results loaded")
 except FileNotFoundError:
     print(f"❌ Error: {newman_json} not found!")
@@ -38,14 +50,7 @@ except json.JSONDecodeError as e:
 pytest_data = {"summary": {"passed": 0, "failed": 0, "total": 0}, "tests": []}
 print("🔍 Loading Pytest results...")
 try:
-    with open(pytest_json, "r", encoding="utf-8") as f:
-        pytest_raw = json.load(f)
-    pytest_data = {
-        "summary": pytest_raw.get("summary", {"passed": 0, "failed": 0, "total": 0}),
-        "tests": pytest_raw.get("tests", []),
-        "duration": pytest_raw.get("duration", 0),
-        "exitcode": pytest_raw.get("exitcode", 0)
-    }
+    pytest_data = load_pytest(pytest_json)
     print(f"✅ Pytest results loaded: {pytest_data['summary']['total']} tests")
 except FileNotFoundError:
     print(f"⚠️ Warning: {pytest_json} not found - pytest data will be empty")
@@ -53,10 +58,22 @@ except FileNotFoundError:
 except json.JSONDecodeError as e:
     print(f"⚠️ Warning: Invalid pytest JSON: {e}")
 
+# ---------- LOAD PERFORMANCE DATA (optional) ----------
+perf_data = None
+if os.path.exists(perf_json):
+    try:
+        with open(perf_json, "r", encoding="utf-8") as f:
+            perf_data = json.load(f)
+        print(f"✅ Performance results loaded: {len(perf_data.get('levels', []))} concurrency levels")
+    except json.JSONDecodeError as e:
+        print(f"⚠️ Warning: Invalid performance JSON: {e}")
+else:
+    print("ℹ️  No performance results - run tests/benchmark/load_test.py to include them")
+
 # ---------- EXTRACT ESSENTIAL STATS ----------
-stats = newman_data["run"]["stats"]
-executions = newman_data["run"]["executions"]
-failures = newman_data["run"]["failures"]
+stats = newman_data["stats"]
+executions = newman_data["executions"]
+failures = newman_data["failures"]
 
 # Simple counters
 total_requests = len(executions)
@@ -70,11 +87,7 @@ success_rate = (passed_assertions / total_assertions * 100) if total_assertions
 # Failed test details with TC mapping
 failed_tests = []
 for failure in failures:
-    source = failure.get("source")
-    if isinstance(source, dict):
-        test_name = source.get("name", "Unknown Test")
-    else:
-        test_name = source or "Unknown Test"
+    test_name = failure_source_name(failure)
     # Try to extract TC number from test name (e.g., "TC01 - Server Start Check")
     tc_match = re.search(r'TC(\d+)', test_name)
     tc_number = tc_match.group(0) if tc_match else "N/A"
@@ -97,63 +110,15 @@ try:
         df = pd.read_csv(csv_file)
         test_plan_data["df"] = df
         
-        # Enhanced TC mapping logic
-        newman_test_names = [exec["item"]["name"] for exec in executions]
-        
-        # Add automation status columns
-        df["Automation_Status"] = "Not Automated"
-        df["Newman_Test_Name"] = ""
-        df["Automation_Result"] = ""
-        
-        automated_count = 0
-        manual_required_count = 0
-        
-        for idx, row in df.iterrows():
-            tc_id = str(row["TC No"]).strip().upper()
-            
-            # Check if marked as manual in CSV
-            if str(row.get("Pass/Fail", "")).strip().lower() == "manual":
-                df.at[idx, "Automation_Status"] = "Manual Required"
-                manual_required_count += 1
-                continue
-                
-            # Try to find matching Newman test
-            matched_test = None
-            for test_name in newman_test_names:
-                if tc_id.lower() in test_name.lower():
-                    matched_test = test_name
-                    break
-            
-            if matched_test:
-                df.at[idx, "Automation_Status"] = "Automated"
-                df.at[idx, "Newman_Test_Name"] = matched_test
-                automated_count += 1
-                
-                # Determine pass/fail status from Newman results
-                test_failed = any(
-                    failure["source"]["name"] == matched_test 
-                    for failure in failures
-                )
-                df.at[idx, "Automation_Result"] = "❌ Failed" if test_failed else "✅ Passed"
-        
-        # Calculate coverage statistics
-        total_tcs = len(df)
-        not_automated = total_tcs - automated_count - manual_required_count
-        
-        test_plan_data["coverage_stats"] = {
-            "total": total_tcs,
-            "automated": automated_count,
-            "manual_required": manual_required_count,
-            "not_automated": not_automated,
-            "automation_coverage": (automated_count / total_tcs * 100) if total_tcs > 0 else 0
-        }
+        # TC id -> Newman test and test -> failure lookups, applied column-wise
+        coverage = test_plan_data["coverage_stats"] = map_test_plan(df, executions, failures)
         
         print(f"📋 Test plan analysis:")
-        print(f"   Total test cases: {total_tcs}")
-        print(f"   Automated: {automated_count}")
-        print(f"   Manual required: {manual_required_count}")
-        print(f"   Not automated: {not_automated}")
-        print(f"   Coverage: {test_plan_data['coverage_stats']['automation_coverage']:.1f}%")
+        print(f"   Total test cases: {coverage['total']}")
+        print(f"   Automated: {coverage['automated']}")
+        print(f"   Manual required: {coverage['manual_required']}")
+        print(f"   Not automated: {coverage['not_automated']}")
+        print(f"   Coverage: {coverage['automation_coverage']:.1f}%")
         
 except Exception as e:
     print(f"⚠️  Test plan analysis failed: {e}")
@@ -347,6 +312,80 @@ template = Template("""
         {% endif %}
         {% endif %}
 
+        {% if perf_data %}
+        <div class="section">
+            <h2 class="section-title">⚡ Performance (Load Test)</h2>
+            <p class="timestamp">Run {{ perf_data.generated }} against {{ perf_data.base_url }} |
+               {{ perf_data.seeded_books }} seeded books |
+               mix {% for op, weight in perf_data.mix.items() %}{{ op }}={{ weight|int }}{% if not loop.last %}, {% endif %}{% endfor %}</p>
+            <table class="test-table">
+                <thead>
+                    <tr>
+                        <th>Concurrency</th>
+                        <th>Requests</th>
+                        <th>Req/s</th>
+                        <th>p50 (ms)</th>
+                        <th>p95 (ms)</th>
+                        <th>p99 (ms)</th>
+                        <th>Errors</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    {% for level in perf_data.levels %}
+                    <tr>
+                        <td><strong>{{ level.concurrency }}</strong></td>
+                        <td>{{ level.requests }}</td>
+                        <td>{{ "%.1f"|format(level.rps) }}</td>
+                        <td>{{ "%.1f"|format(level.latency_ms.p50) }}</td>
+                        <td>{{ "%.1f"|format(level.latency_ms.p95) }}</td>
+                        <td>{{ "%.1f"|format(level.latency_ms.p99) }}</td>
+                        <td>{% if level.errors %}<span class="badge badge-danger">{{ level.errors }}</span>{% else %}0{% endif %}</td>
+                    </tr>
+                    {% endfor %}
+                </tbody>
+            </table>
+            {% if perf_data.baseline %}
+                {% if perf_data.baseline.regressions %}
+                <div class="failure-item">
+                    <div class="failure-tc">Performance regressed beyond {{ perf_data.baseline.max_regression_pct }}% of baseline</div>
+                    {% for regression in perf_data.baseline.regressions %}
+                    <div class="failure-message">{{ regression }}</div>
+                    {% endfor %}
+                </div>
+                {% else %}
+                <p><span class="badge badge-success">Within {{ perf_data.baseline.max_regression_pct }}% of baseline</span></p>
+                {% endif %}
+            {% endif %}
+        </div>
+        {% endif %}
+
+        {% if trends and trends[0].runs > 1 %}
+        <div class="section">
+            <h2 class="section-title">📈 Trends (last {{ trends[0].runs }} runs)</h2>
+            <div class="stats">
+                {% for trend in trends %}
+                <div class="stat-card info">
+                    <div><strong>{{ trend.label }}</strong></div>
+                    <div class="metric">{% if trend.latest is not none %}{{ "%.1f"|format(trend.latest) }}{% else %}-{% endif %}</div>
+                    <svg width="240" height="44" viewBox="-2 -2 244 44" role="img" aria-label="{{ trend.label }} trend">
+                        <polyline points="{{ trend.points }}" fill="none" stroke="#667eea" stroke-width="2"/>
+                    </svg>
+                </div>
+                {% endfor %}
+            </div>
+            {% if duration_regressions %}
+            <div class="failure-item">
+                <div class="failure-tc">Slower than the median of their last {{ regression_window }} runs by more than {{ max_duration_regression|int }}%</div>
+                {% for regression in duration_regressions %}
+                <div class="failure-message">{{ regression.kind }} · {{ regression.name }}: {{ "%.1f"|format(regression.duration_ms) }} ms vs {{ "%.1f"|format(regression.baseline_ms) }} ms (+{{ "%.0f"|format(regression.change_pct) }}%)</div>
+                {% endfor %}
+            </div>
+            {% else %}
+            <p><span class="badge badge-success">No test duration regressions</span></p>
+            {% endif %}
+        </div>
+        {% endif %}
+
         {% if failed_tests %}
         <div class="section">
             <h2 class="section-title">❌ Failed Test Details</h2>
@@ -387,8 +426,48 @@ template = Template("""
 # ---------- CALCULATE PYTEST METRICS ----------
 pytest_success_rate = (pytest_data["summary"]["passed"] / pytest_data["summary"]["total"] * 100) if pytest_data["summary"]["total"] > 0 else 0
 
+# ---------- TREND HISTORY ----------
+trends, duration_regressions = [], []
+try:
+    history = trend_store.connect(history_db)
+    try:
+        coverage = test_plan_data["coverage_stats"]
+        run_id = trend_store.record_run(history, {
+            "newman_requests": total_requests,
+            "newman_assertions": total_assertions,
+            "newman_failed": failed_assertions,
+            "pytest_total": pytest_data["summary"].get("total", 0),
+            "pytest_passed": pytest_data["summary"].get("passed", 0),
+            "pytest_failed": pytest_data["summary"].get("failed", 0),
+            "pytest_duration": pytest_data.get("duration", 0),
+            "newman_response_avg": newman_data["timings"].get("responseAverage"),
+            "plan_total": coverage["total"],
+            "plan_automated": coverage["automated"],
+            "automation_coverage": coverage["automation_coverage"],
+        }, trend_store.test_results(pytest_data["tests"], executions, failures))
+        runs = trend_store.recent_runs(history, TREND_RUNS)
+        duration_regressions = trend_store.duration_regressions(
+            history, run_id, window=REGRESSION_WINDOW, max_regression=MAX_DURATION_REGRESSION)
+    finally:
+        history.close()
+    series = [
+        ("Newman assertions passed (%)", [(r["newman_assertions"] - r["newman_failed"]) / r["newman_assertions"] * 100
+                                          if r["newman_assertions"] else None for r in runs]),
+        ("Pytest passed (%)", [r["pytest_passed"] / r["pytest_total"] * 100 if r["pytest_total"] else None
+                               for r in runs]),
+        ("Automation coverage (%)", [r["automation_coverage"] for r in runs]),
+        ("Pytest duration (s)", [r["pytest_duration"] for r in runs]),
+        ("Newman avg response (ms)", [r["newman_response_avg"] for r in runs]),
+    ]
+    trends = [{"label": label, "points": trend_store.sparkline(values), "latest": values[-1],
+               "runs": len(runs)} for label, values in series]
+    print(f"📈 Run #{run_id} added to {history_db} ({len(duration_regressions)} duration regressions)")
+except Exception as e:
+    print(f"⚠️  Trend history unavailable: {e}")
+
 # ---------- GENERATE ENHANCED REPORT ----------
-html = template.render(
+# Rendered chunk by chunk straight into the file
+report_stream = template.generate(
     timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
     total_requests=total_requests,
     total_assertions=total_assertions,
@@ -398,14 +477,18 @@ html = template.render(
     failed_tests=failed_tests,
     coverage_stats=test_plan_data["coverage_stats"],
     test_plan_df=test_plan_data["df"],
-    newman_data=newman_data,
     pytest_summary=pytest_data["summary"],
     pytest_success_rate=pytest_success_rate,
-    pytest_tests=pytest_data["tests"]
+    pytest_tests=pytest_data["tests"],
+    perf_data=perf_data,
+    trends=trends,
+    duration_regressions=duration_regressions,
+    max_duration_regression=MAX_DURATION_REGRESSION,
+    regression_window=REGRESSION_WINDOW,
 )
 
 with open(output_html, "w", encoding="utf-8") as f:
-    f.write(html)
+    f.writelines(report_stream)
 
 # ---------- SUMMARY ----------
 print(f"\n✅ COMPREHENSIVE TEST REPORT GENERATED!")
@@ -417,6 +500,9 @@ print(f"   Newman API Tests: {passed_assertions}/{total_assertions} passed ({suc
 print(f"   API Endpoints Tested: {total_requests}")
 if pytest_data["summary"]["total"] > 0:
     print(f"   Pytest Unit Tests: {pytest_data['summary']['passed']}/{pytest_data['summary']['total']} passed ({pytest_success_rate:.1f}%)")
+if perf_data and perf_data.get("levels"):
+    peak = max(perf_data["levels"], key=lambda level: level["rps"])
+    print(f"   Load Test Peak: {peak['rps']:.1f} req/s at concurrency {peak['concurrency']} (p95 {peak['latency_ms']['p95']:.1f} ms)")
 if test_plan_data["coverage_stats"]["total"] > 0:
     stats = test_plan_data["coverage_stats"]
     print(f"   Test Plan Coverage: {stats['automated']}/{stats['total']} automated ({stats['automation_coverage']:.1f}%)")
@@ -0,0 +1,154 @@
+"""
+SQLite history of unified-report runs for trend charts and duration regressions.
+
+Every report run appends one ``run`` row (Newman, pytest and test-plan
+counts) and one ``test_result`` row per pytest test and Newman request
+(outcome and duration in ms). test_result is keyed by (test_id, run_id), so
+"last N runs of this test" is an index range scan however long the history
+gets; a second index serves per-run lookups.
+"""
+import sqlite3
+import statistics
+from datetime import datetime
+
+from tc_mapping import failure_source_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS run (
+    id INTEGER PRIMARY KEY,
+    generated_at TEXT NOT NULL,
+    newman_requests INTEGER NOT NULL,
+    newman_assertions INTEGER NOT NULL,
+    newman_failed INTEGER NOT NULL,
+    pytest_total INTEGER NOT NULL,
+    pytest_passed INTEGER NOT NULL,
+    pytest_failed INTEGER NOT NULL,
+    pytest_duration REAL NOT NULL,
+    newman_response_avg REAL,
+    plan_total INTEGER NOT NULL,
+    plan_automated INTEGER NOT NULL,
+    automation_coverage REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS test (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,             -- 'pytest' or 'newman'
+    name TEXT NOT NULL,
+    UNIQUE (kind, name)
+);
+CREATE TABLE IF NOT EXISTS test_result (
+    test_id INTEGER NOT NULL REFERENCES test (id),
+    run_id INTEGER NOT NULL REFERENCES run (id) ON DELETE CASCADE,
+    outcome TEXT NOT NULL,
+    duration_ms REAL,
+    PRIMARY KEY (test_id, run_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS test_result_run_idx ON test_result (run_id);
+"""
+
+# Up to ? prior durations for each test of one run: a LIMITed range scan of
+# the (test_id, run_id) key per test, not a window over the whole history.
+HISTORY_SQL = """
+SELECT current.test_id, past.duration_ms
+FROM test_result AS current
+JOIN test_result AS past ON past.test_id = current.test_id AND past.run_id IN (
+    SELECT run_id FROM test_result
+    WHERE test_id = current.test_id AND run_id < current.run_id AND duration_ms IS NOT NULL
+    ORDER BY run_id DESC LIMIT ?
+)
+WHERE current.run_id = ?
+"""
+
+
+def connect(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def test_results(pytest_tests, executions, failures):
+    """(kind, name, outcome, duration_ms) per pytest test and Newman request."""
+    results = [("pytest", test["nodeid"], test["outcome"], test["duration"] * 1000) for test in pytest_tests]
+    # A request can run more than once (iterations); average its response times.
+    failed = {failure_source_name(failure) for failure in failures}
+    times = {}
+    for execution in executions:
+        times.setdefault(execution["item"]["name"], []).append(execution.get("response_time"))
+    for name, samples in times.items():
+        samples = [sample for sample in samples if sample is not None]
+        results.append(("newman", name, "failed" if name in failed else "passed",
+                        statistics.fmean(samples) if samples else None))
+    return results
+
+
+def record_run(conn, summary, results, generated_at=None):
+    """Append one run; ``summary`` holds the run table's counters. Returns the run id."""
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO run (generated_at, newman_requests, newman_assertions, newman_failed, pytest_total,"
+            " pytest_passed, pytest_failed, pytest_duration, newman_response_avg, plan_total, plan_automated,"
+            " automation_coverage)"
+            " VALUES (:generated_at, :newman_requests, :newman_assertions, :newman_failed, :pytest_total,"
+            " :pytest_passed, :pytest_failed, :pytest_duration, :newman_response_avg, :plan_total,"
+            " :plan_automated, :automation_coverage)",
+            {**summary, "generated_at": generated_at or datetime.now().isoformat(timespec="seconds")},
+        )
+        run_id = cursor.lastrowid
+        conn.executemany("INSERT OR IGNORE INTO test (kind, name) VALUES (?, ?)",
+                         [(kind, name) for kind, name, _, _ in results])
+        ids = {}
+        for kind in {kind for kind, _, _, _ in results}:
+            ids.update(((kind, name), test_id) for test_id, name in
+                       conn.execute("SELECT id, name FROM test WHERE kind = ?", (kind,)))
+        conn.executemany(
+            "INSERT OR REPLACE INTO test_result (test_id, run_id, outcome, duration_ms) VALUES (?, ?, ?, ?)",
+            [(ids[kind, name], run_id, outcome, duration) for kind, name, outcome, duration in results],
+        )
+    return run_id
+
+
+def recent_runs(conn, limit=30):
+    """The last ``limit`` runs, oldest first, as dicts."""
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute("SELECT * FROM run ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.row_factory = None
+    return [dict(row) for row in reversed(rows)]
+
+
+def duration_regressions(conn, run_id, window=10, min_history=3, max_regression=50.0, min_delta_ms=5.0):
+    """
+    Tests of ``run_id`` slower than the median of their previous ``window``
+    runs by more than ``max_regression`` percent and ``min_delta_ms``,
+    slowest-first. Tests with fewer than ``min_history`` prior runs are skipped.
+    """
+    history = {}
+    for test_id, duration in conn.execute(HISTORY_SQL, (window, run_id)):
+        history.setdefault(test_id, []).append(duration)
+    regressions = []
+    for test_id, kind, name, duration in conn.execute(
+            "SELECT r.test_id, t.kind, t.name, r.duration_ms FROM test_result AS r"
+            " JOIN test AS t ON t.id = r.test_id WHERE r.run_id = ? AND r.duration_ms IS NOT NULL", (run_id,)):
+        past = history.get(test_id, [])
+        if len(past) < min_history:
+            continue
+        baseline = statistics.median(past)
+        if duration - baseline > min_delta_ms and duration > baseline * (1 + max_regression / 100):
+            regressions.append({"kind": kind, "name": name, "duration_ms": duration, "baseline_ms": baseline,
+                                "change_pct": (duration / baseline - 1) * 100 if baseline else float("inf")})
+    return sorted(regressions, key=lambda regression: regression["duration_ms"] - regression["baseline_ms"],
+                  reverse=True)
+
+
+def sparkline(values, width=240, height=40):
+    """SVG polyline points for ``values`` scaled into width x height (None skipped)."""
+    points = [(i, value) for i, value in enumerate(values) if value is not None]
+    if not points:
+        return ""
+    low = min(value for _, value in points)
+    high = max(value for _, value in points)
+    span = (high - low) or 1
+    step = width / max(len(values) - 1, 1)
+    return " ".join(f"{i * step:.1f},{height - (value - low) / span * height:.1f}" for i, value in points)